@@ -1,117 +1,100 @@
 """Functions to retrieve available sports hall boookings from BETTER leisure centre websites"""
 
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.support.select import Select
 from selenium.webdriver.common.by import By
-from selenium import webdriver
 
-from geopy.geocoders import Nominatim
-from geopy import distance
+from geopy.exc import GeopyError
 
+from os import environ as ENV
 from functools import partial
-from p_tqdm import p_map
-from time import time
+from typing import Callable
 
-from tools import webwait, webwait_all, get_coordinates
+import numpy as np
+
+from better_http import fetch_dates, split_date_link
+from browser import get_pool
+from scheduler import get_scheduler, collect_into, check_cancelled
+from instrument import span, traced
+from resilience import open_page, retry_page
+from slots import available, centre_activities, merge_slots, slots_from_columns, slots_from_json, slots_to_json
+from cache import get_result, set_result, MISSING
+from directory import nearest_centres, add_search_results
+from tools import webwait, webwait_all, get_coordinates, geocode, wait_for_any_selector, distances_km
+
+BACKENDS = ('selenium', 'http')
+BETTER_LOCATOR_URL = ENV.get('BETTER_LOCATOR_URL', 'https://www.better.org.uk/centre-locator')
+# Date pages read by each task per backend, so busy centres spread over workers. The http
+# backend fetches all the dates of an activity in one concurrent burst instead (None)
+DATES_PER_TASK = {'selenium': 4, 'http': None}
 
 
 def get_distance(home_coords: tuple[float, float], centre_address: str) -> float:
     """Return distance between centre and home"""
-    geolocator = Nominatim(user_agent="aaaa")
-    centre_address = centre_address.replace('\n', ', ')
     try:
-        centre_location = geolocator.geocode(centre_address)
-        if centre_location is not None:
-            centre_coords = (centre_location.latitude,
-                             centre_location.longitude)
-            distance_ = round(distance.geodesic(home_coords,
-                                                centre_coords).km, 3)
+        centre_coords = geocode(centre_address)
+        if centre_coords is not None:
+            distance_ = round(float(distances_km(home_coords, [centre_coords],
+                                                 'vincenty')[0]), 3)
         else:
             distance_ = None
 
-    except:
+    except GeopyError:
         distance_ = None
 
     return distance_
 
 
-def get_activities(driver: WebDriver, timeout: int, retries: int = 5) -> list[dict]:
-    """return a list of activity names in the sports hall"""
-    retry_count = 0
-    while True:
-        try:
-            activity_names = [x.text.lower() for x in
-                              webwait_all(driver, "CSS_SELECTOR",
-                                          "[class^='SubActivityComponent__ActivityName-sc-1mw63if-2']", timeout)]
-            activity_links = [x.get_attribute('href') for x in
-                              webwait_all(driver, "CSS_SELECTOR",
-                                          "[class^='SubActivityComponent__StyledLink-sc-1mw63if-1 bYfPqu']", timeout)]
+def get_activities(driver: WebDriver, timeout: int, retries: int = 5) -> list[dict] | None:
+    """return a list of activity names in the sports hall, None if they could not be read"""
 
-            return [{'name': name, 'link': link} for name, link in zip(activity_names, activity_links)]
+    def read(driver: WebDriver) -> list[dict]:
+        activity_names = [x.text.lower() for x in
+                          webwait_all(driver, "CSS_SELECTOR",
+                                      "[class^='SubActivityComponent__ActivityName-sc-1mw63if-2']", timeout)]
+        activity_links = [x.get_attribute('href') for x in
+                          webwait_all(driver, "CSS_SELECTOR",
+                                      "[class^='SubActivityComponent__StyledLink-sc-1mw63if-1 bYfPqu']", timeout)]
 
-        except (TimeoutError, TimeoutException):
-            retry_count += 1
-            print(
-                f'Retrying link (A) {driver.current_url}, attempt {retry_count}')
-            driver.refresh()
+        return [{'name': name, 'link': link} for name, link in zip(activity_names, activity_links)]
 
-        if retry_count > retries:
-            return []
+    return retry_page(driver, read, retries, (TimeoutError, TimeoutException), 'better.activities')
 
 
 def get_dates_tab(driver: WebDriver, timeout: int, retries: int = 5) -> WebElement | None:
     """Return the dates tab web page element for a given activity"""
 
-    retry_count = 0
-    while True:
-        try:
-            return webwait(driver, "CSS_SELECTOR",
-                           "[class^='DateRibbonComponent__DatesWrapper-sc-p1q1bx-1']", timeout)
-        except (TimeoutError, TimeoutException):
-            retry_count += 1
-            print(
-                f'Retrying link (B) {driver.current_url}, attempt {retry_count}')
-            driver.refresh()
-
-        if retry_count > retries:
-            return None
-
-
-def get_bookings_for_date(driver: WebDriver, timeout: int, retries: int = 5) -> list[str]:
-    """Return a list of booking times available for a given date"""
-
-    found = None
-    start_time = time()
-    retry_count = 0
-    while found is None:
-        times = [x.text.lower() for x in
-                 driver.find_elements(By.CSS_SELECTOR,
-                                      "[class^='ClassCardComponent__ClassTime-sc-1v7d176-3']")]
-
-        if not times:
-            try:
-                driver.find_element(By.CSS_SELECTOR,
-                                    "[class^='ByTimeListComponent__Wrapper-sc-39liwv-1 ByTimeListComponent__NoContentWrapper-sc-39liwv-2']")
-                return []
-            except NoSuchElementException:
-                pass
+    def read(driver: WebDriver) -> WebElement:
+        return webwait(driver, "CSS_SELECTOR",
+                       "[class^='DateRibbonComponent__DatesWrapper-sc-p1q1bx-1']", timeout)
 
-        else:
-            return times
+    return retry_page(driver, read, retries, (TimeoutError, TimeoutException), 'better.dates_tab')
+
+
+def get_bookings_for_date(driver: WebDriver, timeout: int, retries: int = 5) -> list[str] | None:
+    """Return a list of booking times available for a given date,
+    or None if the page did not load"""
 
-        end_time = time()
-        if end_time - start_time > timeout:
-            start_time = time()
-            retry_count += 1
-            print(
-                f'Retrying link (C) {driver.current_url}, attempt {retry_count}')
-            driver.refresh()
+    def read(driver: WebDriver) -> list[str]:
+        found, _ = wait_for_any_selector(driver, {
+            'times': "[class^='ClassCardComponent__ClassTime-sc-1v7d176-3']",
+            'no_content': "[class^='ByTimeListComponent__Wrapper-sc-39liwv-1 ByTimeListComponent__NoContentWrapper-sc-39liwv-2']"},
+            timeout, 'better_bookings')
 
-        if retry_count > retries:
+        if found == 'times':
+            return [x.text.lower() for x in
+                    driver.find_elements(By.CSS_SELECTOR,
+                                         "[class^='ClassCardComponent__ClassTime-sc-1v7d176-3']")]
+
+        if found == 'no_content':
             return []
 
+        raise TimeoutException('neither bookings nor an empty day were shown')
+
+    return retry_page(driver, read, retries, (TimeoutException,), 'better.date_page')
+
 
 def get_prices_for_date(driver: WebDriver, timeout: int) -> list[str]:
     """Return a list of prices for a given date"""
@@ -138,16 +121,20 @@ def initialize_better_dict(centre_name: str, centre_address: str, home_coords: t
                           'Distance': distance, 'Company': 'BETTER'}}
 
 
-def get_valid_activity_links(activities: list[dict], activity: str) -> list[str]:
-    """Return valid activity links that match the user's activity."""
+def get_valid_activities(activities: list[dict], wanted: list[str]) -> list[dict]:
+    """Return activities that match any of the user's activities."""
 
-    return [x['link'] for x in activities if activity.lower() in x['name'].lower()]
+    return [x for x in activities if any(y.lower() in x['name'].lower() for y in wanted)]
 
 
-def get_booking_details_for_date(driver: WebDriver, timeout: int) -> tuple[list[str], list[str], list[str]]:
-    """Extract booking times, prices, and available slots for a given date."""
+def get_booking_details_for_date(driver: WebDriver, timeout: int) -> tuple[list[str], list[str], list[str]] | None:
+    """Extract booking times, prices, and available slots for a given date.
+    Return None if the date page did not load."""
 
     times = get_bookings_for_date(driver, timeout)
+    if times is None:
+        return None
+
     if not times:
         return [], [], []
 
@@ -157,65 +144,165 @@ def get_booking_details_for_date(driver: WebDriver, timeout: int) -> tuple[list[
     return times, prices, spaces_avail
 
 
-def process_dates(driver: WebDriver, timeout: int) -> dict:
-    """Process available dates and return booking details for each date."""
+def filter_available_slots(date: str, times: list[str], prices: list[str], spaces_avail: list[str]) -> np.ndarray:
+    """Return slots of a date with spaces left"""
+
+    return available(slots_from_columns(date, times, prices, spaces_avail))
+
+
+def get_date_links(driver: WebDriver, timeout: int) -> list[str]:
+    """Return links of the date pages of the activity page the driver is on"""
 
     dates_tab = get_dates_tab(driver, timeout)
     if dates_tab is None:
-        return {}
+        return []
 
-    all_dates_links = [x.get_attribute('href') for x in
-                       webwait_all(dates_tab, "TAG_NAME", "a", timeout)
-                       if 'undefined' not in x.get_attribute('href')]
+    return [x.get_attribute('href') for x in
+            webwait_all(dates_tab, "TAG_NAME", "a", timeout)
+            if 'undefined' not in x.get_attribute('href')]
 
-    dates_dict = {}
-    for date_link in all_dates_links:
-        driver.get(date_link)
-        date = date_link.split('/')[-2]
-        times, prices, spaces_avail = get_booking_details_for_date(driver,
-                                                                   timeout)
 
-        if times:
-            valid_indexes = [x for x in range(len(spaces_avail))
-                             if spaces_avail[x] != '0']
-            if len(valid_indexes) != 0:
-                dates_dict[date] = {'Times': [times[i] for i in valid_indexes],
-                                    'Prices': [prices[i] for i in valid_indexes],
-                                    'Spaces': [spaces_avail[i] for i in valid_indexes]}
-    return dates_dict
+def split_cached_dates(date_links: list[str]) -> tuple[np.ndarray, list[str]]:
+    """Return cached slots of the dates with a fresh cached result, and links of the other dates"""
 
+    cached_slots, stale_links = [], []
+    for date_link in date_links:
+        cached = get_result('BETTER', *split_date_link(date_link), MISSING)
+        if cached is MISSING:
+            stale_links.append(date_link)
+        else:
+            cached_slots.append(slots_from_json(cached))
 
-def BETTER_gym_loop(booking_link: str, centre_name: str,
-                    centre_address: str, activity: str,
-                    home_coords: tuple[float, float], timeout: int) -> dict | None:
-    """Returns all available bookings for a given leisure centre booking link"""
+    return merge_slots(*cached_slots), stale_links
 
-    driver = webdriver.Chrome()
-    BETTER_dict = initialize_better_dict(
-        centre_name, centre_address, home_coords)
 
-    driver.get(f"{booking_link}/sports-hall-activities")
+def read_dates(date_links: list[str], timeout: int, backend: str = 'selenium') -> np.ndarray | None:
+    """Read date pages and return available slots of all of them, caching each date read.
+    None if any date page could not be read.
+    With the 'http' backend date pages are fetched concurrently without the browser,
+    which is then only borrowed for dates that could not be read that way"""
+
+    if backend == 'http':
+        with span('better.fetch_dates', dates=len(date_links)):
+            all_details = dict(zip(date_links, fetch_dates(date_links, timeout)))
+    else:
+        all_details = dict.fromkeys(date_links)
+
+    browser_links = [k for k, v in all_details.items() if v is None]
+    if browser_links:
+        with get_pool().driver(profile='BETTER') as driver:
+            for date_link in browser_links:
+                check_cancelled()
+                with span('better.date_page', date=split_date_link(date_link)[2]):
+                    open_page(driver, date_link)
+                    all_details[date_link] = get_booking_details_for_date(driver, timeout)
 
-    activities = get_activities(driver, timeout)
-    valid_activity_links = get_valid_activity_links(activities, activity)
-    if not valid_activity_links:
-        driver.close()
+    all_slots = []
+    for date_link, details in all_details.items():
+        if details is None:
+            continue
+
+        all_slots.append(filter_available_slots(split_date_link(date_link)[2], *details))
+        set_result('BETTER', *split_date_link(date_link), slots_to_json(all_slots[-1]))
+
+    if len(all_slots) < len(all_details):
         return None
 
-    for activity_link in valid_activity_links:
-        driver.get(activity_link)
-        dates_dict = process_dates(driver, timeout)
+    return merge_slots(*all_slots)
+
+
+def plan_better_centre(booking_link: str, activities: list[str], timeout: int,
+                       backend: str = 'selenium') -> tuple[dict | None, list[tuple[str, list[str]]]]:
+    """Find the centre activities matching any of 'activities' and their date pages.
+    Return cached slots keyed by activity name, and (activity name, date links) windows of
+    the dates still to be read, at most DATES_PER_TASK of the backend each, nearest dates
+    first. Activities whose dates could not be found get None. ({}, []) if no activity matches, (None, []) if the
+    activities could not be read"""
+
+    activity_dict, windows = {}, []
+    with span('better.centre', centre=booking_link), get_pool().driver(profile='BETTER') as driver:
+        with span('better.activities'):
+            open_page(driver, f"{booking_link}/sports-hall-activities")
+            found_activities = get_activities(driver, timeout)
+        if found_activities is None:
+            return None, []
+        valid_activities = get_valid_activities(found_activities, activities)
+        if not valid_activities:
+            return {}, []
+
+        for valid_activity in valid_activities:
+            with span('better.activity', centre=booking_link, activity=valid_activity['name']):
+                open_page(driver, valid_activity['link'])
+                date_links = get_date_links(driver, timeout)
+            if not date_links:
+                activity_dict[valid_activity['name']] = None
+                continue
+            activity_dict[valid_activity['name']], stale_links = split_cached_dates(date_links)
+            size = DATES_PER_TASK[backend] or max(1, len(stale_links))
+            windows.extend((valid_activity['name'], stale_links[i:i + size])
+                           for i in range(0, len(stale_links), size))
+
+    # Windows of the nearest dates of every activity go first
+    return activity_dict, sorted(windows, key=lambda x: split_date_link(x[1][0])[2])
+
+
+def scrape_better_window(activity: str, date_links: list[str], timeout: int,
+                         backend: str = 'selenium') -> tuple[str, np.ndarray | None]:
+    """Return activity name and available slots of a window of its date pages,
+    None if any of them could not be read"""
+
+    with span('better.dates', activity=activity, dates=len(date_links)):
+        return activity, read_dates(date_links, timeout, backend)
+
+
+def combine_windows(activity_dict: dict | None, windows: list[tuple[str, np.ndarray | None]]) -> dict | None:
+    """Add slots read by each date window to the slots of its activity. Activities with
+    a window that could not be read in full get None"""
+
+    if activity_dict is None:
+        return None
 
-        if dates_dict:
-            BETTER_dict[centre_name]['Activity'][activity] = dates_dict.copy()
+    for activity, slots in windows:
+        if slots is None or activity_dict[activity] is None:
+            activity_dict[activity] = None
+        else:
+            activity_dict[activity] = merge_slots(activity_dict[activity], slots)
+
+    return activity_dict
+
+
+def scrape_better_centre(booking_link: str, activities: list[str], timeout: int,
+                         backend: str = 'selenium') -> dict | None:
+    """Return available slots of every centre activity matching any of 'activities', keyed by
+    activity name (empty for activities without free slots, None for those that could not be
+    read in full). {} if no activity matches.
+    Date windows are read one after another, see process_centre_bookings to spread them"""
 
-    driver.close()
+    activity_dict, windows = plan_better_centre(booking_link, activities, timeout, backend)
+
+    return combine_windows(activity_dict, [scrape_better_window(*x, timeout, backend)
+                                           for x in windows])
+
+
+def BETTER_gym_loop(booking_link: str, centre_name: str,
+                    centre_address: str, activity: str,
+                    home_coords: tuple[float, float], timeout: int,
+                    backend: str = 'selenium') -> dict | None:
+    """Returns all available bookings for a given leisure centre booking link"""
+
+    activity_dict = scrape_better_centre(booking_link, [activity], timeout, backend)
+    if not activity_dict:
+        return None
+
+    BETTER_dict = initialize_better_dict(
+        centre_name, centre_address, home_coords)
+    BETTER_dict[centre_name].update(centre_activities(activity_dict))
 
     return BETTER_dict
 
 
-def extract_centre_info(driver: WebDriver, timeout: int, max_centres: int) -> tuple[list[str], list[str], list[str]]:
-    """Extract centre names, addresses, and booking links after a search."""
+def extract_centre_info(driver: WebDriver, timeout: int, max_centres: int | None) -> tuple[list[str], list[str], list[str]]:
+    """Extract centre names, addresses, and booking links after a search, all of them if max_centres is None."""
 
     centre_names = [x.text for x in webwait_all(
         driver, "CSS_SELECTOR", "[class^='venue-result-panel__link']", timeout)][:max_centres]
@@ -229,11 +316,10 @@ def extract_centre_info(driver: WebDriver, timeout: int, max_centres: int) -> tu
     return centre_names, centre_addresses, centre_booking_links
 
 
-def search_centres(driver: WebDriver, postcode: str, timeout: int, max_centres: int) -> tuple[list[str], list[str], list[str]]:
+def search_centres(driver: WebDriver, postcode: str, timeout: int, max_centres: int | None) -> tuple[list[str], list[str], list[str]]:
     """Search and return centre names, addresses, and booking links."""
 
-    FindCentre_url = "https://www.better.org.uk/centre-locator"
-    driver.get(FindCentre_url)
+    open_page(driver, BETTER_LOCATOR_URL)
 
     webwait(driver, "NAME", 'venue_search[searchterm]', timeout).send_keys(
         postcode)
@@ -245,25 +331,136 @@ def search_centres(driver: WebDriver, postcode: str, timeout: int, max_centres:
     return extract_centre_info(driver, timeout, max_centres)
 
 
-def process_centre_bookings(centre_names: list[str], centre_addresses: list[str], centre_booking_links: list[str],
-                            activity: str, home_coords: tuple[float, float], timeout: int, cpu_cores: int) -> dict:
-    """Start threads for booking search for each centre and return available bookings."""
+@traced('better.find_centres')
+def find_centres(postcode: str, home_coords: tuple[float, float], timeout: int,
+                 max_centres: int) -> tuple[list[str], list[str], list[str]]:
+    """Return names, addresses and booking links of the closest centres, from the saved
+    centre directory if it is known to hold them, otherwise from the centre locator"""
+
+    nearest = nearest_centres('BETTER', home_coords, max_centres)
+    if nearest is not None:
+        return ([x['name'] for x, _ in nearest], [x['address'] for x, _ in nearest],
+                [x['link'] for x, _ in nearest])
 
-    BETTER_gym_dict = p_map(partial(BETTER_gym_loop, activity=activity, home_coords=home_coords, timeout=timeout),
-                            centre_booking_links, centre_names, centre_addresses, num_cpus=cpu_cores)
+    with get_pool().driver(profile='BETTER') as driver:
+        centre_names, centre_addresses, centre_booking_links = search_centres(driver, postcode,
+                                                                              timeout, None)
 
-    return {k: v for d in BETTER_gym_dict if d is not None for k, v in d.items()}
+    centres, skipped = [], {}
+    for name, address, link in zip(centre_names, centre_addresses, centre_booking_links):
+        coords = geocode(address)
+        if coords is None:
+            skipped[link] = len(centres)
+            continue
+        centres.append({'name': name, 'address': address, 'link': link,
+                        'lat': coords[0], 'lon': coords[1]})
+    if centres or skipped:
+        add_search_results('BETTER', home_coords, centres, key='link', skipped=skipped)
 
+    return centre_names[:max_centres], centre_addresses[:max_centres], centre_booking_links[:max_centres]
 
-def scrape_better_website(postcode: str, activity: str, max_centres: int = 20, cpu_cores: int = 4, timeout: int = 10) -> dict | None:
-    """Main function to collect nearest centres and return available bookings."""
+
+def discover_centres(postcode: str, max_centres: int = 10, timeout: int = 10) -> list[dict]:
+    """Return name, address, booking link and distance of the closest centres"""
 
     home_coords = get_coordinates(postcode)
-    driver = webdriver.Chrome()
+    centre_names, centre_addresses, centre_booking_links = find_centres(postcode, home_coords,
+                                                                        timeout, max_centres)
+
+    return [{'name': name, 'address': address.replace('\n', ', '), 'link': link,
+             'distance': get_distance(home_coords, address)}
+            for name, address, link in zip(centre_names, centre_addresses, centre_booking_links)]
+
 
-    centre_names, centre_addresses, centre_booking_links = search_centres(driver, postcode,
-                                                                          timeout, max_centres)
-    driver.close()
+def list_activities(centre: dict, timeout: int = 10) -> list[str]:
+    """Return names of the sports hall activities of a centre"""
+
+    with get_pool().driver(profile='BETTER') as driver:
+        open_page(driver, f"{centre['link']}/sports-hall-activities")
+
+        return [x['name'] for x in get_activities(driver, timeout) or []]
+
+
+def process_centre_bookings(wanted: dict[str, set[str]], timeout: int, cpu_cores: int, backend: str = 'selenium',
+                            on_result: Callable[[str, dict | None], None] | None = None,
+                            ranks: dict[str, int] | None = None) -> dict[str, dict | None] | None:
+    """Queue booking search for each centre booking link on the shared scheduler, looking for the
+    activities wanted there, and return available bookings by booking link.
+    Date pages of each centre are read in windows spread over every worker, centres with a
+    lower rank (nearer ones) and then nearer dates first.
+    If on_result is given it is called with (link, bookings) as each centre finishes instead"""
+
+    links = list(wanted)
+    plan = partial(plan_better_centre, timeout=timeout, backend=backend)
+    scrape = partial(scrape_better_window, timeout=timeout, backend=backend)
+    activities = [sorted(wanted[x]) for x in links]
+    priorities = [(ranks or {}).get(x, i) for i, x in enumerate(links)]
+    if on_result is not None:
+        get_scheduler(cpu_cores).map_split(plan, scrape, combine_windows, links, activities, desc='BETTER',
+                                           on_result=lambda i, result: on_result(links[i], result),
+                                           priorities=priorities)
+        return None
 
-    return process_centre_bookings(centre_names, centre_addresses, centre_booking_links,
-                                   activity, home_coords, timeout, cpu_cores)
+    results = get_scheduler(cpu_cores).map_split(plan, scrape, combine_windows, links, activities,
+                                                 desc='BETTER', priorities=priorities)
+
+    return dict(zip(links, results))
+
+
+def scrape_better_batch(queries: list[tuple[str, str]], max_centres: int = 20, cpu_cores: int = 4,
+                        timeout: int = 10, backend: str = 'selenium',
+                        on_result: Callable[[int, dict], None] | None = None) -> list[dict] | None:
+    """Return available bookings for each (postcode, activity) query. Every centre needed
+    by any query is visited once, for all the activities wanted there, the centres nearest
+    to any query first.
+    If on_result is given, it is called with (query index, centre dict) as soon as
+    each centre has been searched, with an empty 'Activity' if it has no free slots and the
+    activities that could not be read in full as 'Unread', and nothing is kept or returned.
+    Centres that failed or were stopped are left out"""
+
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown backend {backend}, expected one of {BACKENDS}')
+
+    get_pool(cpu_cores)
+
+    centres, wanted, link_queries, query_coords, ranks = {}, {}, {}, [], {}
+    for i, (postcode, activity) in enumerate(queries):
+        home_coords = get_coordinates(postcode)
+        centre_names, centre_addresses, centre_booking_links = find_centres(postcode, home_coords,
+                                                                            timeout, max_centres)
+        query_coords.append(home_coords)
+        for rank, (name, address, link) in enumerate(zip(centre_names, centre_addresses,
+                                                         centre_booking_links)):
+            centres[link] = (name, address)
+            ranks[link] = min(ranks.get(link, rank), rank)
+            wanted.setdefault(link, set()).add(activity.lower())
+            link_queries.setdefault(link, []).append(i)
+
+    all_results = None
+    if on_result is None:
+        all_results = [{} for _ in queries]
+        on_result = collect_into(all_results)
+
+    def centre_done(link: str, scraped: dict | None) -> None:
+        if scraped is None:
+            return
+
+        for i in link_queries[link]:
+            activity = queries[i][1].lower()
+            centre_dict = initialize_better_dict(*centres[link], query_coords[i])
+            for centre_info in centre_dict.values():
+                centre_info.update(centre_activities({k: v for k, v in scraped.items()
+                                                      if activity in k.lower()}))
+            on_result(i, centre_dict)
+
+    process_centre_bookings(wanted, timeout, cpu_cores, backend, on_result=centre_done, ranks=ranks)
+
+    return all_results
+
+
+def scrape_better_website(postcode: str, activity: str, max_centres: int = 20, cpu_cores: int = 4, timeout: int = 10,
+                          backend: str = 'selenium') -> dict | None:
+    """Main function to collect nearest centres and return available bookings.
+    'backend' selects how date pages are read, one of BACKENDS"""
+
+    return scrape_better_batch([(postcode, activity)], max_centres, cpu_cores, timeout, backend)[0]
@@ -1,76 +1,191 @@
 from os import environ as ENV
-from functools import partial
-from io import StringIO
+from functools import partial, lru_cache
+from typing import Callable
+import threading
 import datetime
 import json
-import time
 
-from selenium.common.exceptions import StaleElementReferenceException, TimeoutException, NoSuchElementException, ElementClickInterceptedException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support.ui import Select
 from selenium.webdriver.common.by import By
-from selenium import webdriver
 
-from geopy import distance
-
-from p_tqdm import p_map
-import pandas as pd
-
-
-from tools import webwait, webwait_all, similar, get_coordinates, scroll_into_view, return_similar_strings
+from lxml import html
+import numpy as np
+
+
+from browser import get_pool
+from scheduler import get_scheduler, collect_into, check_cancelled
+from instrument import span, traced
+from resilience import host_of, open_page, rate_limit
+from slots import centre_activities, merge_slots, slots_from_columns, slots_from_json, slots_to_json
+from directory import nearest_centres, save_directory
+from cache import cache_get, cache_set, get_results, set_results, get_result_dates, set_result_dates
+from tools import (webwait, webwait_all, get_coordinates, scroll_into_view, wait_for_any,
+                   wait_for_any_selector, distances_km, FuzzyIndex)
+
+EA_BOOKING_URL = ENV.get('EA_BOOKING_URL', 'https://profile.everyoneactive.com/booking')
+EA_CENTRES_URL = ENV.get('EA_CENTRES_URL', 'https://www.everyoneactive.com/centre/')
+EA_SESSION_TTL = 4 * 3600  # seconds a shared login is trusted before logging in again
+CENTRE_MATCH_THRESHOLD = 0.5  # minimum trigram similarity for a centre name to match an option
+CENTRE_MATCH_TTL = 30 * 24 * 3600  # seconds a centre name to option match is remembered
+OPTIONS_PER_TASK = 3  # activity options searched by each task, so busy centres spread over workers
+SEARCH_DAYS = 14  # days from today the search covers, as two weeks of the table
+
+CENTRE_SELECT_ID = 'ctl00_MainContent__advanceSearchUserControl_SitesAdvanced'
+END_DATE_ID = 'ctl00_MainContent__advanceSearchUserControl_endDate'
+ACTIVITIES_SELECT_ID = 'ctl00_MainContent__advanceSearchUserControl_Activities'
+
+SEARCH_STATE_JS = """
+var centre = document.getElementById(arguments[0]), endDate = document.getElementById(arguments[1]);
+if (!centre || !endDate) return null;
+return {frame_url: location.href, centre_index: centre.selectedIndex, end_date: endDate.value};
+"""
+
+SEARCH_FORM_READY_JS = """
+var centre = document.getElementById(arguments[0]);
+return !!centre && centre.selectedIndex === arguments[1] && !!document.getElementById(arguments[2]);
+"""
+
+SET_VALUE_JS = """
+var element = document.getElementById(arguments[0]);
+element.value = arguments[1];
+element.dispatchEvent(new Event('change', {bubbles: true}));
+"""
+
+REMOVE_ELEMENT_JS = """
+var element = document.getElementById(arguments[0]);
+if (element) element.remove();
+"""
+
+_session_lock = threading.Lock()
 
 
 def ea_login(driver, timeout):
     """Login to ea account if prompted"""
 
-    try:
-        webwait(driver, 'ID', "CybotCookiebotDialogBodyButtonDecline",
-                timeout).click()
-    except:
-        pass
+    # The cookie banner is blocked by the browser profile, so only dismiss it if it still shows
+    key, element = wait_for_any_selector(driver, {'cookies': '#CybotCookiebotDialogBodyButtonDecline',
+                                                  'login': '#emailAddress'}, timeout, 'ea.login_form')
+    if key == 'cookies':
+        element.click()
 
     webwait(driver, 'ID', "emailAddress", timeout).send_keys(ENV['EMAIL'])
     webwait(driver, 'ID', "password", timeout).send_keys(ENV['EA_PASS'])
     webwait(driver, 'CSS_SELECTOR', 'button[type="submit"]', timeout).click()
 
 
+def ea_session_key() -> str:
+    """Return cache key of the shared session for the configured account"""
+
+    return f"everyone_active:{ENV['EMAIL'].lower()}"
+
+
+def get_all_cookies(driver: WebDriver) -> list[dict]:
+    """Return cookies of every domain, including those of the booking frame"""
+
+    return driver.execute_cdp_cmd('Network.getAllCookies', {})['cookies']
+
+
+def inject_cookies(driver: WebDriver, cookies: list[dict]) -> None:
+    """Add cookies to the browser without having to visit their domain first"""
+
+    cdp_cookies = []
+    for cookie in cookies:
+        cdp_cookie = {k: cookie[k] for k in ('name', 'value', 'domain', 'path',
+                                             'secure', 'httpOnly', 'sameSite')
+                      if k in cookie}
+        if not cookie.get('session', True):
+            cdp_cookie['expires'] = cookie['expires']
+        cdp_cookies.append(cdp_cookie)
+
+    driver.execute_cdp_cmd('Network.setCookies', {'cookies': cdp_cookies})
+
+
+def booking_page_logged_in(driver: WebDriver, timeout: int) -> bool:
+    """Wait for booking page to load, return False if it asks for a login"""
+
+    element = WebDriverWait(driver, timeout).until(EC.any_of(
+        EC.presence_of_element_located((By.ID, "bookingFrame")),
+        EC.presence_of_element_located((By.ID, "emailAddress"))))
+
+    return element.get_attribute('id') == "bookingFrame"
+
+
+def open_booking_page(driver: WebDriver, booking_link: str, timeout: int) -> None:
+    """Open booking page using the session shared by all workers,
+    logging in (and saving the new session) only if it is missing or expired"""
+
+    tried = None
+    while True:
+        with _session_lock:
+            cookies = cache_get('session', ea_session_key())
+            if cookies is None or cookies == tried:
+                with span('ea.login'):
+                    open_page(driver, booking_link)
+                    ea_login(driver, timeout)
+                    webwait(driver, 'ID', "bookingFrame", timeout)
+                cache_set('session', ea_session_key(), get_all_cookies(driver),
+                          EA_SESSION_TTL)
+                return
+
+        with span('ea.restore_session'):
+            inject_cookies(driver, cookies)
+            open_page(driver, booking_link)
+            logged_in = booking_page_logged_in(driver, timeout)
+        if logged_in:
+            return
+
+        tried = cookies
+
+
 def find_master_table(driver: WebDriver, timeout: int = 10) -> WebElement | None | bool:
     """Check if master table is present. Return None if there are no slots are avail,
     return False if the booking is not of table type"""
 
-    start = time.time()
-    while (time.time() - start) <= timeout:
-        try:
-            availability_grid = driver.find_element(
-                By.CLASS_NAME, "masterTable ")
+    found, element = wait_for_any_selector(driver, {'table': '.masterTable',
+                                                    'no_slots': ('.alert.alert-warning', 'no '),
+                                                    'not_table': '.btn.btn-success'},
+                                           timeout, 'find_master_table')
+    if found == 'table':
+        return element
 
-            return availability_grid
+    if found == 'no_slots':
+        return None
 
-        except NoSuchElementException:
-            pass
+    return False
 
-        try:
-            no_slots_msg = driver.find_element(
-                By.CLASS_NAME, "alert.alert-warning").text
-            if no_slots_msg.lower().startswith("no "):
-                return None
 
-        except NoSuchElementException:
-            pass
+def parse_master_table(table_html: str) -> tuple[np.ndarray, list[str], list[str]]:
+    """Parse masterTable html in a single pass. Return availability matrix
+    (1 where the slot is bookable) with its row times and column dates"""
 
-        try:
-            driver.find_element(
-                By.CLASS_NAME, "btn.btn-success ")
-            return False
+    rows = html.fromstring(table_html).iter('tr')
+    header = next(rows, None)
+    if header is None:
+        return np.zeros((0, 0), dtype=np.uint8), [], []
 
-        except NoSuchElementException:
-            pass
+    columns = [' '.join(x.text_content().split()) for x in header.iterchildren('th', 'td')][1:]
 
-    return False
+    index, availability = [], []
+    for row in rows:
+        cells = list(row.iterchildren('th', 'td'))
+        if not cells:
+            continue
+        index.append(' '.join(cells[0].text_content().split()))
+        availability.extend(1 if 'itemavailable' in (x.get('class') or '') else 0
+                            for x in cells[1:len(columns) + 1])
+        availability.extend([0] * (len(columns) + 1 - len(cells)))
+
+    table_data = np.array(availability, dtype=np.uint8).reshape(len(index), len(columns))
 
+    return table_data, index, columns
 
-def read_master_table(driver: WebDriver, timeout: int) -> tuple[list[int] | None,
+
+def read_master_table(driver: WebDriver, timeout: int) -> tuple[np.ndarray | None,
                                                                 list[str] | None,
                                                                 list[str] | None]:
     """Read table of available bookings"""
@@ -81,21 +196,23 @@ def read_master_table(driver: WebDriver, timeout: int) -> tuple[list[int] | None
         return None, None, None
 
     if availability_grid is None:
-        return [], [], []
+        return np.zeros((0, 0), dtype=np.uint8), [], []
+
+    return parse_master_table(availability_grid.get_attribute('outerHTML'))
 
-    rows = webwait_all(availability_grid, 'TAG_NAME', "tr", timeout)[1:]
 
-    table = driver.find_element(By.CLASS_NAME, 'masterTable ')
-    table_html = table.get_attribute('outerHTML')
-    df = pd.read_html(StringIO(table_html))[0]
-    df.set_index('-', inplace=True)
-    index = df.index
-    columns = df.columns
+def join_tables(table_data1: np.ndarray, index1: list[str], columns1: list[str],
+                table_data2: np.ndarray, index2: list[str], columns2: list[str]) -> tuple[np.ndarray, list[str], list[str]]:
+    """Join two consecutive date windows side by side, aligning rows by time"""
 
-    table_data = [
-        [1 if 'itemavailable' in cell.get_attribute('class') else 0
-         for cell in row.find_elements(By.TAG_NAME, 'td')[1:]]
-        for row in rows]
+    columns = [*columns1, *columns2]
+    if index1 == index2:
+        return np.hstack([table_data1, table_data2]), index1, columns
+
+    index = list(dict.fromkeys([*index1, *index2]))
+    table_data = np.zeros((len(index), len(columns)), dtype=np.uint8)
+    table_data[[index.index(x) for x in index1], :len(columns1)] = table_data1
+    table_data[[index.index(x) for x in index2], len(columns1):] = table_data2
 
     return table_data, index, columns
 
@@ -111,6 +228,32 @@ def clean_centre_name(centre_name: str) -> str:
     return cleaned_centre_name.strip()
 
 
+@lru_cache(maxsize=8)
+def get_centre_options_index(centre_options: tuple[str, ...]) -> FuzzyIndex:
+    """Return fuzzy index over centre options, built once per set of options"""
+
+    return FuzzyIndex(centre_options)
+
+
+def match_centre_option(centre_name: str, centre_options: list[str]) -> int | None:
+    """Return index of the centre option best matching centre_name, or None if nothing is
+    similar enough. Matches are remembered between runs"""
+
+    cleaned_centre_name = clean_centre_name(centre_name)
+    option = cache_get('ea_centre_match', cleaned_centre_name)
+
+    if option not in centre_options:
+        matching_centres = get_centre_options_index(tuple(centre_options)).top(
+            cleaned_centre_name, 1, CENTRE_MATCH_THRESHOLD)
+        if not matching_centres:
+            return None
+
+        option = matching_centres[0][0]
+        cache_set('ea_centre_match', cleaned_centre_name, option, CENTRE_MATCH_TTL)
+
+    return centre_options.index(option)
+
+
 def find_search_panel(driver: WebDriver, timeout: int) -> WebElement:
     """Return the search panel object"""
 
@@ -136,18 +279,29 @@ def get_centre_scroll_element(driver: WebDriver, timeout: int) -> WebElement:
                           "ctl00_MainContent__advanceSearchUserControl_SitesAdvanced", timeout))
 
 
-def get_centre_options(driver: WebDriver, adv_search_panel: WebElement, timeout: int) -> tuple[list[str], WebElement]:
+def get_centre_options(driver: WebDriver, adv_search_panel: WebElement, timeout: int) -> tuple[Select | None, list[str] | None]:
     """Return list of centres obtained from centre scroller"""
 
-    while True:
+    def options_loaded(driver: WebDriver) -> tuple[Select, list[str]] | None:
         expand_adv_search_panel(adv_search_panel)
         centre_scroll = get_centre_scroll_element(driver, timeout)
 
         centre_options = [clean_centre_name(x.text.lower())
                           for x in centre_scroll.options]
 
-        if '' not in centre_options:
-            return centre_scroll, centre_options
+        return None if '' in centre_options else (centre_scroll, centre_options)
+
+    _, loaded = wait_for_any(driver, {'loaded': options_loaded}, timeout, 'centre_options')
+
+    return loaded or (None, None)
+
+
+def search_dates() -> list[str]:
+    """Return dates the search covers, for caching a search that found nothing"""
+
+    today = datetime.date.today()
+
+    return [f'{today + datetime.timedelta(days=x):%Y-%m-%d}' for x in range(SEARCH_DAYS)]
 
 
 def select_end_date(driver: WebDriver, timeout: int) -> None:
@@ -156,7 +310,7 @@ def select_end_date(driver: WebDriver, timeout: int) -> None:
     end_date_selector = webwait(
         driver, 'ID', "ctl00_MainContent__advanceSearchUserControl_endDate", timeout)
     end_date = (datetime.date.today() +
-                datetime.timedelta(days=14)).strftime("%d/%m/%Y")
+                datetime.timedelta(days=SEARCH_DAYS)).strftime("%d/%m/%Y")
     end_date_selector.clear()
     end_date_selector.send_keys(end_date)
 
@@ -173,27 +327,24 @@ def get_activity_options(driver: WebDriver, timeout: int) -> tuple[Select, list[
 def search_parameters(driver: WebDriver, adv_search_panel: WebElement, centre_name: str, timeout: int) -> tuple[Select, list[str]]:
     """Fill in the search page with appropriate parameters"""
 
-    start = time.time()
-    while (time.time() - start) <= timeout:
-        try:
-            centre_scroll, centre_options = get_centre_options(driver, adv_search_panel,
-                                                               timeout)
-            cleaned_centre_name = clean_centre_name(centre_name)
-            matching_centres = return_similar_strings(cleaned_centre_name, centre_options,
-                                                      0.6)
-            centre_index = centre_options.index(matching_centres[0][0])
+    def centre_selected(driver: WebDriver) -> tuple[Select, list[str]] | None:
+        centre_scroll, centre_options = get_centre_options(driver, adv_search_panel,
+                                                           timeout)
+        if centre_scroll is None:
+            return None
 
-            centre_scroll.select_by_index(centre_index)
-            select_end_date(driver, timeout)
+        centre_index = match_centre_option(centre_name, centre_options)
+        if centre_index is None:
+            return None
 
-            act_scroll, act_options = get_activity_options(driver, timeout)
+        centre_scroll.select_by_index(centre_index)
+        select_end_date(driver, timeout)
 
-            return act_scroll, act_options
+        return get_activity_options(driver, timeout)
 
-        except (IndexError, StaleElementReferenceException):
-            continue
+    _, selected = wait_for_any(driver, {'selected': centre_selected}, timeout, 'search_parameters')
 
-    return None, None
+    return selected or (None, None)
 
 
 def filter_activity_options(activity: str, options: list[str]) -> list[str]:
@@ -202,13 +353,14 @@ def filter_activity_options(activity: str, options: list[str]) -> list[str]:
     return [x for x in options if activity.lower() in x.lower()]
 
 
+@traced('ea.setup_search_page')
 def setup_search_page(driver: WebDriver, booking_link: str, centre_name: str, login: bool = True, timeout: int = 10) -> Select:
     """Setup EA search page with correct parameters and return scroll object for activity selection"""
 
-    driver.get(booking_link)
-
     if login:
-        ea_login(driver, timeout)
+        open_booking_page(driver, booking_link, timeout)
+    else:
+        open_page(driver, booking_link)
 
     webwait(driver, 'ID', "bookingFrame", timeout)
     driver.switch_to.frame('bookingFrame')
@@ -258,13 +410,19 @@ def find_avail_button(driver: WebDriver) -> tuple[WebElement, str, str] | tuple[
     return None, '', ''
 
 
-def read_bookings(driver: WebDriver, timeout: int = 10) -> tuple[list[int], list[str], list[str]]:
-    """Read table data spanning over 2 weeks"""
+@traced('ea.read_bookings')
+def read_bookings(driver: WebDriver, timeout: int = 10,
+                  read_second_window: bool = True) -> tuple[np.ndarray | None, list[str], list[str]]:
+    """Read table data spanning over 2 weeks, or only the first week if 'read_second_window' is False.
+    No columns if there were no slots, table data None if the bookings are not shown as a table"""
 
     table_data1, index1, columns1 = read_master_table(driver, timeout)
 
     if table_data1 is None:
-        return [], [], []
+        return None, [], []
+
+    if not read_second_window:
+        return table_data1, index1, columns1
 
     date_window_text = webwait(driver, 'ID',
                                "ctl00_MainContent_startDate",
@@ -273,55 +431,33 @@ def read_bookings(driver: WebDriver, timeout: int = 10) -> tuple[list[int], list
     webwait(driver, 'ID',
             "ctl00_MainContent_dateForward1", timeout).click()
 
-    date_window_text2 = date_window_text
+    def date_window_moved(driver: WebDriver) -> bool:
+        text = driver.find_element(By.ID, "ctl00_MainContent_startDate").text
+        return text not in ('', date_window_text)
 
-    while date_window_text2 == date_window_text or date_window_text2 == '':
-        try:
-            date_window_text2 = webwait(
-                driver, 'ID', "ctl00_MainContent_startDate", timeout).text
-        except:
-            continue
+    wait_for_any(driver, {'moved': date_window_moved}, timeout, 'date_window_forward')
 
     table_data2, index2, columns2 = read_master_table(driver, timeout)
 
-    if not table_data1 and not table_data2:
-        return [], [], []
-
-    if table_data1 and not table_data2:
+    if table_data2 is None or not columns2:
         return table_data1, index1, columns1
 
-    if table_data2 and not table_data1:
+    if not columns1:
         return table_data2, index2, columns2
 
-    columns = [*columns1, *columns2]
-    table_data = table_data1.copy()
-    for i, row in enumerate(table_data):
-        row.extend(table_data2[i])
-
-    return table_data, index1, columns
+    return join_tables(table_data1, index1, columns1, table_data2, index2, columns2)
 
 
-def compile_table_data_into_dict(table_data: list[list[int]], index: list[str], columns: list[str]) -> dict:
-    """Convert the nested table data into a easier to use dict object"""
+def compile_table_data_into_dict(table_data: np.ndarray, index: list[str], columns: list[str]) -> dict[str, np.ndarray]:
+    """Convert the table data into slots keyed by table column, for dates with any.
+    The table does not show prices or spaces left, so these are unknown"""
 
     dates_dict = {}
     for col_idx, date in enumerate(columns):
-        times = []
-        prices = []
-        spaces_avail = []
-
-        for row_idx, value in enumerate(table_data):
-            if value[col_idx] == 1:
-                times.append(index[row_idx])
-                prices.append('NaN')
-                spaces_avail.append('NaN')
+        times = [index[row_idx] for row_idx in np.flatnonzero(table_data[:, col_idx])]
 
         if times:
-            dates_dict[date] = {
-                'Times': times,
-                'Prices': prices,
-                'Spaces': spaces_avail
-            }
+            dates_dict[date] = slots_from_columns(date, times)
 
     return dates_dict
 
@@ -329,125 +465,276 @@ def compile_table_data_into_dict(table_data: list[list[int]], index: list[str],
 def click_and_wait_search(driver: WebDriver, timeout: int = 10) -> None:
     """Click search button and wait untill it is finished"""
 
-    start = time.time()
-    while (time.time() - start) <= timeout:
-        try:
-            webwait(driver, 'ID',
-                    "ctl00_MainContent__advanceSearchUserControl__searchBtn",
-                    timeout).click()
-            break
-
-        except ElementClickInterceptedException:
-            pass
+    def click_search(driver: WebDriver) -> bool:
+        driver.find_element(
+            By.ID, "ctl00_MainContent__advanceSearchUserControl__searchBtn").click()
+        return True
 
-    start = time.time()
-    while (time.time() - start) <= timeout:
-        try:
-            search_btn = driver.find_element(
-                By.ID, "ctl00_MainContent__advanceSearchUserControl__searchBtn")
-            if search_btn.get_attribute("disabled") is None:
-                break
-
-        except StaleElementReferenceException:
-            pass
+    wait_for_any(driver, {'clicked': click_search}, timeout, 'click_search')
+    wait_for_any_selector(driver, {'enabled': '#ctl00_MainContent__advanceSearchUserControl__searchBtn:not([disabled])'},
+                          timeout, 'search_finished')
 
 
 def wait_for_slots_table_to_load(driver: WebDriver, timeout: int = 10) -> None:
     """Wait for table with booking slots to load"""
 
-    start = time.time()
-    while (time.time() - start) <= timeout:
-        try:
-            driver.find_element(By.ID, 'slotsGrid')
-            break
+    wait_for_any_selector(driver, {'table': '#slotsGrid'}, timeout, 'slots_table')
 
-        except NoSuchElementException:
-            pass
 
+def option_selected(act_scroll: Select, option: str) -> Callable[[WebDriver], bool]:
+    """Return wait condition that selects option in the activity scroller"""
 
-def loop_through_activities(driver: WebDriver, act_scroll: Select, activity_options: list[str],
-                            centre_name: str, booking_link: str, timeout: int = 10) -> dict[str:str]:
-    """Loop through and scrape info of each activity for a given centre"""
+    def condition(_: WebDriver) -> bool:
+        act_scroll.select_by_visible_text(option)
+        return True
 
-    activity_dict = {}
+    return condition
 
-    for i, option in enumerate(activity_options):
 
-        while True:
-            try:
-                act_scroll.select_by_visible_text(option)
-                break
+def avail_button_for(option: str) -> Callable[[WebDriver], tuple[WebElement, str, str] | None]:
+    """Return wait condition met once the availability button of option shows up"""
 
-            except NoSuchElementException:
-                pass
+    def condition(driver: WebDriver) -> tuple[WebElement, str, str] | None:
+        button = find_avail_button(driver)
+        return button if button[2] == option else None
 
-        click_and_wait_search(driver, timeout)
+    return condition
 
-        no_results = False
-        start = time.time()
-        while (time.time() - start) <= timeout:
 
-            if check_for_no_results(driver):
-                no_results = True
-                break
+def get_cached_activity(centre_name: str, option: str) -> np.ndarray | None:
+    """Return cached slots of an activity option, None unless every date last read is fresh"""
 
-            avail_text_btn, avail_text, activity_text = find_avail_button(
-                driver)
-            if activity_text == option:
-                break
+    known_dates = get_result_dates('Everyone Active', centre_name, option)
+    if not known_dates:
+        return None
+
+    cached = get_results('Everyone Active', centre_name, option, known_dates)
+    if cached is None:
+        return None
+
+    return merge_slots(*map(slots_from_json, cached.values()))
 
-        if no_results or not avail_text.lower() == 'space' or activity_text != option:
-            continue
 
-        avail_text_btn.click()
-        wait_for_slots_table_to_load(driver, timeout)
+def get_search_state(driver: WebDriver) -> dict | None:
+    """Return url of the booking frame and the search form values it was set up with,
+    None if the form is not on the page"""
 
-        table_data, index, columns = read_bookings(driver, timeout)
-        if table_data:
-            dates_dict = compile_table_data_into_dict(
-                table_data, index, columns)
-            activity_dict[option] = dates_dict.copy()
+    return driver.execute_script(SEARCH_STATE_JS, CENTRE_SELECT_ID, END_DATE_ID)
 
-        if not i + 1 == len(activity_options):
-            act_scroll, _ = setup_search_page(driver, booking_link,
-                                              centre_name, False, timeout)
+
+def restore_search_page(driver: WebDriver, state: dict, timeout: int = 10) -> Select | None:
+    """Return scroll object for activity selection with the search form as captured by
+    get_search_state. The form is reused if it is still on the page, otherwise only the
+    booking frame is reloaded and the captured centre and end date filled in again.
+    None if the form could not be restored"""
+
+    with span('ea.restore_search'):
+        if not driver.execute_script(SEARCH_FORM_READY_JS, CENTRE_SELECT_ID, state['centre_index'],
+                                     ACTIVITIES_SELECT_ID):
+            page = driver.find_element(By.TAG_NAME, 'html')
+            rate_limit(host_of(state['frame_url']))
+            driver.execute_script('location.href = arguments[0];', state['frame_url'])
+            WebDriverWait(driver, timeout).until(EC.staleness_of(page))
+            adv_search_panel = find_search_panel(driver, timeout)
+            centre_scroll, _ = get_centre_options(driver, adv_search_panel, timeout)
+            if centre_scroll is None:
+                return None
+
+            centre_scroll.select_by_index(state['centre_index'])
+            driver.execute_script(SET_VALUE_JS, END_DATE_ID, state['end_date'])
+        else:
+            expand_adv_search_panel(find_search_panel(driver, timeout))
+
+        # Drop the table of the previous search so it is not read again for this one
+        driver.execute_script(REMOVE_ELEMENT_JS, 'slotsGrid')
+
+        return get_activity_options(driver, timeout)[0]
+
+
+def loop_through_activities(driver: WebDriver, act_scroll: Select, activity_options: list[str],
+                            centre_name: str, booking_link: str, timeout: int = 10) -> dict[str, np.ndarray | None]:
+    """Loop through and scrape available slots of each activity for a given centre, None for
+    options whose search could not be read. The search page the driver is on is set up once,
+    and restored between searches"""
+
+    activity_dict = {}
+    state = get_search_state(driver)
+    searched = False
+
+    for option in activity_options:
+        check_cancelled()
+
+        with span('ea.activity', centre=centre_name, activity=option):
+            cached = get_cached_activity(centre_name, option)
+            if cached is not None:
+                if len(cached):
+                    activity_dict[option] = cached
+                continue
+
+            if searched:
+                act_scroll = restore_search_page(driver, state, timeout) if state else None
+                if act_scroll is None:
+                    act_scroll, _ = setup_search_page(driver, booking_link,
+                                                      centre_name, False, timeout)
+                    state = get_search_state(driver)
+                if act_scroll is None:
+                    activity_dict[option] = None
+                    continue
+            searched = True
+
+            known_dates = get_result_dates('Everyone Active', centre_name, option)
+            # Dates of the second week stay fresh for longer, so reuse them if we can
+            second_window = known_dates[len(known_dates) // 2:] if known_dates else []
+            cached_second = get_results('Everyone Active', centre_name,
+                                        option, second_window) if second_window else None
+
+            if wait_for_any(driver, {'selected': option_selected(act_scroll, option)},
+                            timeout, 'select_activity')[0] is None:
+                activity_dict[option] = None
+                continue
+
+            click_and_wait_search(driver, timeout)
+
+            found, button = wait_for_any(driver, {'no_results': check_for_no_results,
+                                                  'button': avail_button_for(option)},
+                                         timeout, 'search_results')
+
+            if found is None:
+                activity_dict[option] = None
+                continue
+
+            table_data, index, columns = None, [], []
+            avail_text_btn, avail_text, _ = button if found == 'button' else (None, '', '')
+            if avail_text.lower() == 'space':
+                avail_text_btn.click()
+                wait_for_slots_table_to_load(driver, timeout)
+
+                table_data, index, columns = read_bookings(driver, timeout,
+                                                           cached_second is None)
+                if table_data is None:
+                    activity_dict[option] = None
+                    continue
+
+            # A search without results or bookable slots is cached like one that had some,
+            # as empty dates of the window it covered
+            if not columns:
+                columns = (known_dates[:len(known_dates) // 2] if cached_second is not None
+                           else search_dates())
+            dates_dict = compile_table_data_into_dict(table_data, index, columns) if index else {}
+            set_results('Everyone Active', centre_name, option, columns,
+                        {k: slots_to_json(v) for k, v in dates_dict.items()})
+
+            if cached_second is not None:
+                dates_dict = {k: slots_from_json(v) for k, v in cached_second.items()} | dates_dict
+                columns = [*columns, *second_window]
+            set_result_dates('Everyone Active', centre_name, option, columns)
+
+            if dates_dict:
+                activity_dict[option] = merge_slots(*dates_dict.values())
 
     return activity_dict
 
 
-def ea_gym_loop(centre_name, centre_distance, activity, timeout):
-    """Scrape info from a certain centre"""
+def plan_ea_centre(centre_name: str, activities: list[str],
+                   timeout: int) -> tuple[dict | None, list[tuple[str, list[str]]]]:
+    """Find activity options at a centre matching any of 'activities'. Return bookings of options
+    with fresh cached results, keyed by option, and (centre name, options) chunks of at most
+    OPTIONS_PER_TASK options still to be searched. A single chunk is searched right away
+    on the page already set up. ({}, []) if no option matches, (None, []) if the centre
+    cannot be found"""
 
-    booking_link = 'https://profile.everyoneactive.com/booking'
+    booking_link = EA_BOOKING_URL
 
-    with webdriver.Chrome() as driver:
+    with span('ea.centre', centre=centre_name), get_pool().driver(profile='Everyone Active') as driver:
         act_scroll, act_options = setup_search_page(driver, booking_link,
                                                     centre_name, True, timeout)
 
         if act_scroll is None:
             print(f'{centre_name} cannot be found')
-            driver.close()
-            return None
+            return None, []
 
-        valid_act_options = filter_activity_options(activity, act_options)
+        valid_act_options = list(dict.fromkeys(
+            x for activity in activities for x in filter_activity_options(activity, act_options)))
 
         if not valid_act_options:
-            print(f'{activity} is not available at: {centre_name}')
-            driver.close()
-            return None
+            print(f'{", ".join(activities)} is not available at: {centre_name}')
+            return {}, []
+
+        activity_dict, stale_options = {}, []
+        for option in valid_act_options:
+            cached = get_cached_activity(centre_name, option)
+            if cached is None:
+                stale_options.append(option)
+            elif len(cached):
+                activity_dict[option] = cached
+
+        chunks = [stale_options[i:i + OPTIONS_PER_TASK]
+                  for i in range(0, len(stale_options), OPTIONS_PER_TASK)]
+        if len(chunks) == 1:
+            activity_dict |= loop_through_activities(driver, act_scroll, chunks[0], centre_name,
+                                                     booking_link, timeout)
+            chunks = []
 
-        activity_dict = loop_through_activities(driver, act_scroll,
-                                                valid_act_options, centre_name,
-                                                booking_link, timeout)
+    return activity_dict, [(centre_name, x) for x in chunks]
+
+
+def scrape_ea_options(centre_name: str, options: list[str], timeout: int) -> dict[str, np.ndarray | None]:
+    """Return available bookings of activity options at a centre, searched on a driver of their own,
+    None for options that could not be read"""
+
+    booking_link = EA_BOOKING_URL
+
+    with span('ea.options', centre=centre_name, options=len(options)), \
+            get_pool().driver(profile='Everyone Active') as driver:
+        act_scroll, _ = setup_search_page(driver, booking_link, centre_name, True, timeout)
+        if act_scroll is None:
+            return dict.fromkeys(options)
 
-    if activity_dict == {}:
+        return loop_through_activities(driver, act_scroll, options, centre_name,
+                                       booking_link, timeout)
+
+
+def combine_options(activity_dict: dict | None, chunks: list[dict[str, np.ndarray]]) -> dict | None:
+    """Add bookings found by each chunk of options to those of the centre"""
+
+    if activity_dict is None:
         return None
 
-    return {centre_name: {'Address': 'N/A', 'Activity': activity_dict,
+    for chunk in chunks:
+        activity_dict |= chunk
+
+    return activity_dict
+
+
+def scrape_ea_centre(centre_name: str, activities: list[str], timeout: int) -> dict | None:
+    """Return available bookings of every activity option at a centre matching any of
+    'activities', keyed by option, None for options that could not be read. {} if no option
+    matches, None if the centre cannot be found.
+    Chunks of options are searched one after another, see scrape_ea_batch to spread them"""
+
+    activity_dict, chunks = plan_ea_centre(centre_name, activities, timeout)
+
+    return combine_options(activity_dict, [scrape_ea_options(*x, timeout) for x in chunks])
+
+
+def ea_centre_dict(centre_name: str, centre_distance: float, activity_dict: dict) -> dict:
+    """Return centre info in the format shared by all providers, keeping activities with bookings
+    and listing those that could not be read as 'Unread'"""
+
+    return {centre_name: {'Address': 'N/A',
+                          **centre_activities(activity_dict),
                           'Distance': centre_distance,
                           'Company': 'Everyone Active'}}
 
 
+def ea_gym_loop(centre_name, centre_distance, activity, timeout):
+    """Scrape info from a certain centre"""
+
+    activity_dict = scrape_ea_centre(centre_name, [activity], timeout)
+
+    return ea_centre_dict(centre_name, centre_distance, activity_dict) if activity_dict else None
+
+
 def extract_coords_from_link(link: str) -> str:
     """Get coordinates in the form of '[lat, lon]' embedded in website link"""
 
@@ -465,16 +752,13 @@ def reject_cookies(driver: WebDriver, timeout: int = 5):
         print('Cookies popup not found')
 
 
-def get_all_centre_info(postcode: str, max_centres: int = 10, timeout: int = 10) -> tuple[list, list, list]:
-    """Get name, address and distance of all EA centres and order 
-    in terms of distance and only return closest 'max_centres' centres"""
+@traced('ea.centre_directory')
+def scrape_centre_directory(timeout: int = 10) -> list[dict]:
+    """Return name and coordinates of every EA centre listed on the centre finder"""
 
-    home_coords = get_coordinates(postcode)
+    with get_pool().driver(profile='Everyone Active') as driver:
 
-    with webdriver.Chrome() as driver:
-
-        centres_page = "https://www.everyoneactive.com/centre/"
-        driver.get(centres_page)
+        open_page(driver, EA_CENTRES_URL)
 
         reject_cookies(driver)
 
@@ -486,43 +770,118 @@ def get_all_centre_info(postcode: str, max_centres: int = 10, timeout: int = 10)
                          for x in driver.find_elements(By.CLASS_NAME,
                                                        'centre-finder__results-details-link.link--external')]
 
-    valid_indexes = [centre_coords.index(x)
-                     for x in centre_coords if x != '[, ]']
-    centre_names = [centre_names[x] for x in valid_indexes]
+    return centre_directory(centre_names, centre_coords)
+
+
+def parse_coords(coords: str) -> list[float] | None:
+    """Return [lat, lon] of a coordinates string such as '[51.5, -0.1]', None if the centre
+    has none, e.g. '[, ]'"""
+
+    try:
+        parsed = json.loads(coords)
+    except ValueError:
+        return None
+
+    if not isinstance(parsed, list) or len(parsed) != 2 or \
+            not all(isinstance(x, (int, float)) for x in parsed):
+        return None
+
+    return parsed
+
+
+def centre_directory(centre_names: list[str], centre_coords: list[str]) -> list[dict]:
+    """Return name and coordinates of every centre listed with coordinates"""
+
+    return [{'name': name, 'lat': coords[0], 'lon': coords[1]}
+            for name, coords in zip(centre_names, map(parse_coords, centre_coords))
+            if coords is not None]
 
-    centre_coords = [centre_coords[x] for x in valid_indexes]
-    centre_coords = [json.loads(x) for x in centre_coords]
-    centre_distances = [round(distance.geodesic(home_coords, x).km, 3)
-                        for x in centre_coords]
 
-    ordered_indexes = [x[0] for x in sorted(enumerate(centre_distances),
-                                            key=lambda x: x[1])]
+def get_all_centre_info(postcode: str, max_centres: int = 10, timeout: int = 10) -> tuple[list, list]:
+    """Get name and distance of the closest 'max_centres' EA centres, ordered by distance.
+    The centre list is scraped only when the saved directory is due a refresh"""
 
-    centre_names = [centre_names[x]
-                    for x in ordered_indexes][:max_centres]
-    centre_distances = [centre_distances[x] for x in ordered_indexes]
+    home_coords = get_coordinates(postcode)
+
+    nearest = nearest_centres('Everyone Active', home_coords, max_centres)
+    if nearest is None:
+        save_directory('Everyone Active', {'centres': scrape_centre_directory(timeout),
+                                           'complete': True})
+        nearest = nearest_centres('Everyone Active', home_coords, max_centres)
+
+    centre_names = [x['name'] for x, _ in nearest]
+    centre_distances = [round(float(x), 3) for x in
+                        distances_km(home_coords, [[x['lat'], x['lon']] for x, _ in nearest],
+                                     'vincenty')]
 
     return centre_names, centre_distances
 
 
-def scrape_ea_website(postcode, activity, max_centres=20, cpu_cores=4, timeout=10):
-    """Perform web scraping of EA websites"""
+def discover_centres(postcode: str, max_centres: int = 10, timeout: int = 10) -> list[dict]:
+    """Return name and distance of the closest centres, all booked through EA_BOOKING_URL"""
 
-    all_centre_names, all_centre_distances = get_all_centre_info(postcode,
-                                                                 max_centres, timeout)
+    centre_names, centre_distances = get_all_centre_info(postcode, max_centres, timeout)
 
-    EA_dict = {}
+    return [{'name': name, 'address': 'N/A', 'link': EA_BOOKING_URL, 'distance': centre_distance}
+            for name, centre_distance in zip(centre_names, centre_distances)]
 
-    func = partial(ea_gym_loop, activity=activity, timeout=timeout)
-    results = p_map(func, all_centre_names, all_centre_distances,
-                    num_cpus=cpu_cores)
 
-    for result in results:
-        if result is None:
-            continue
-        EA_dict.update(result)
+def list_activities(centre: dict, timeout: int = 10) -> list[str]:
+    """Return activity options of a centre on the booking search page"""
+
+    with get_pool().driver(profile='Everyone Active') as driver:
+        _, act_options = setup_search_page(driver, EA_BOOKING_URL, centre['name'], True, timeout)
+
+    return act_options or []
+
+
+def scrape_ea_batch(queries: list[tuple[str, str]], max_centres: int = 20, cpu_cores: int = 4,
+                    timeout: int = 10, on_result: Callable[[int, dict], None] | None = None) -> list[dict] | None:
+    """Return available bookings for each (postcode, activity) query. Every centre needed
+    by any query is visited once, for all the activities wanted there, with chunks of
+    its activity options searched on separate drivers, the centres nearest to any query first.
+    If on_result is given, it is called with (query index, centre dict) as soon as
+    each centre has been searched, with an empty 'Activity' if it has no free slots and the
+    options that could not be read as 'Unread', and nothing is kept or returned. Centres that
+    failed or were stopped are left out"""
+
+    get_pool(cpu_cores)
 
-    if not EA_dict:
-        return {}
+    wanted, name_queries, ranks = {}, {}, {}
+    for i, (postcode, activity) in enumerate(queries):
+        centre_names, centre_distances = get_all_centre_info(postcode, max_centres, timeout)
+        for rank, (name, centre_distance) in enumerate(zip(centre_names, centre_distances)):
+            ranks[name] = min(ranks.get(name, rank), rank)
+            wanted.setdefault(name, set()).add(activity.lower())
+            name_queries.setdefault(name, []).append((i, centre_distance))
+
+    all_results = None
+    if on_result is None:
+        all_results = [{} for _ in queries]
+        on_result = collect_into(all_results)
+
+    names = list(wanted)
+
+    def centre_done(index: int, scraped: dict | None) -> None:
+        if scraped is None:
+            return
+
+        name = names[index]
+        for i, centre_distance in name_queries[name]:
+            activity = queries[i][1].lower()
+            activity_dict = {k: v for k, v in scraped.items() if activity in k.lower()}
+            on_result(i, ea_centre_dict(name, centre_distance, activity_dict))
+
+    get_scheduler(cpu_cores).map_split(partial(plan_ea_centre, timeout=timeout),
+                                       partial(scrape_ea_options, timeout=timeout), combine_options,
+                                       names, [sorted(wanted[x]) for x in names],
+                                       desc='Everyone Active', on_result=centre_done,
+                                       priorities=[ranks[x] for x in names])
+
+    return all_results
+
+
+def scrape_ea_website(postcode, activity, max_centres=20, cpu_cores=4, timeout=10):
+    """Perform web scraping of EA websites"""
 
-    return EA_dict
+    return scrape_ea_batch([(postcode, activity)], max_centres, cpu_cores, timeout)[0]
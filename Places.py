@@ -1,284 +1,388 @@
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.wait import WebDriverWait
-from selenium.webdriver.support.select import Select
-from selenium.webdriver.common.by import By
-import selenium.common.exceptions
-from selenium import webdriver
+"""Functions to retrieve available sports hall bookings from Places Leisure centre websites"""
 
-from geopy.geocoders import Nominatim, GoogleV3
-from geopy import distance
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.common.by import By
 
+from os import environ as ENV
 from functools import partial
-from p_tqdm import p_map
-from tqdm import tqdm
-from time import time
+from typing import Callable
+from urllib.parse import urljoin
+
+from lxml import html
 import numpy as np
-import math
 
-from tools import webwait, webwait_all, latlon2metres
+from browser import get_pool
+from scheduler import get_scheduler, collect_into
+from instrument import span, traced
+from resilience import open_page, retry_page
+from slots import available, merge_slots, slots_from_columns, slots_from_json, slots_to_json
+from directory import nearest_centres, save_directory
+from cache import (cache_get, cache_set, result_key, get_results, set_results,
+                   get_result_dates, set_result_dates)
+from tools import webwait, webwait_all, wait_for_any_selector, get_coordinates, distances_km
+
+PLACES_FIND_CENTRE_URL = ENV.get('PLACES_FIND_CENTRE_URL', 'https://www.placesleisure.org/find-centre/')
+TITLES_TTL = 24 * 3600  # seconds the session titles matching an activity are remembered
+
+OPEN_GROUPS_JS = """
+document.querySelectorAll('.activities-group:not(.is-open)').forEach(function (group) { group.click(); });
+"""
+
+# Titles of every session card on the open timetable
+TITLES_JS = """
+return Array.prototype.map.call(document.querySelectorAll('.activities-group__sessions .timetable-card__title'),
+                                function (title) { return title.textContent.trim(); });
+"""
+
+# Reads every day of the timetable in one asynchronous script: opens the info modal of each
+# session whose title matches a wanted activity, waits for its details to show and reads time,
+# price and courts left. Sessions whose details do not show within arguments[1] ms are counted
+# as missed
+SESSIONS_JS = """
+var wanted = arguments[0], waitMs = arguments[1], done = arguments[arguments.length - 1];
+var days = [], cards = [], missed = 0;
+
+function text(element, selector) {
+  var found = element.querySelector(selector);
+  return found ? found.textContent.trim() : '';
+}
+
+function closeModal() {
+  var close = document.querySelector('.modal__close');
+  if (close) close.click();
+}
+
+document.querySelectorAll('.activities-group__sessions').forEach(function (sessions, day) {
+  days.push({date: sessions.dataset.date, sessions: []});
+  sessions.querySelectorAll('.timetable-card').forEach(function (card) {
+    var title = text(card, '.timetable-card__title');
+    if (wanted.some(function (x) { return title.toLowerCase().indexOf(x) >= 0; })) cards.push([day, title, card]);
+  });
+});
+
+function readCard(i) {
+  if (i >= cards.length) {
+    done({days: days, missed: missed});
+    return;
+  }
+
+  var button = cards[i][2].querySelector('.timetable-card__btn');
+  var time = document.querySelector('.session-info__time');
+  if (!button || !time) {
+    missed++;
+    setTimeout(function () { readCard(i + 1); }, 0);
+    return;
+  }
+
+  // Clear the details of the previous session, so only those of this one are read
+  time.textContent = '';
+  button.click();
+  var started = Date.now();
+  (function poll() {
+    var shown = text(document, '.session-info__time');
+    if (shown) {
+      days[cards[i][0]].sessions.push([cards[i][1], shown, text(document, '.session-info__price2'),
+        document.querySelectorAll('.session-info__sublocationgroups [name="sublocationgroup"]').length]);
+    } else if (Date.now() - started < waitMs) {
+      setTimeout(poll, 25);
+      return;
+    } else {
+      missed++;
+    }
+    closeModal();
+    setTimeout(function () { readCard(i + 1); }, 0);
+  })();
+}
+
+readCard(0);
+"""
+
+# Number of session cards whose title matches a wanted activity
+COUNT_SESSIONS_JS = """
+var wanted = arguments[0];
+return Array.prototype.filter.call(document.querySelectorAll('.activities-group__sessions .timetable-card'),
+                                   function (card) {
+  var title = card.querySelector('.timetable-card__title');
+  title = title ? title.textContent.trim().toLowerCase() : '';
+  return wanted.some(function (x) { return title.indexOf(x) >= 0; });
+}).length;
+"""
+
+
+def parse_centre_directory(page: str, base_url: str) -> list[dict]:
+    """Return name, coordinates, address and link of every centre on the centre finder page"""
+
+    centres = []
+    for item in html.fromstring(page).find_class('our-centres__item'):
+        links = item.find_class('b-centre-card__link')
+        addresses = item.find_class('b-centre-card__address')
+        try:
+            lat, lon = float(item.get('data-lat')), float(item.get('data-long'))
+        except (TypeError, ValueError):
+            continue
+        if not links:
+            continue
+
+        centres.append({'name': item.get('data-name'), 'lat': lat, 'lon': lon,
+                        'link': urljoin(base_url, links[0].get('href')),
+                        'address': ' '.join(addresses[0].text_content().split()) if addresses else 'N/A'})
 
+    return centres
 
-def Places_Leisure_loop(link, centre_name, centre_distance, Act, timeout):
-    Places_dict = {}
-    driver = webdriver.Chrome()
 
-    retry_count = 0
-    driver.get(link)
-    while True:
-        try:
-            activities = webwait(driver, 'CLASS_NAME', "activity-locations__list", timeout)
-            break
+@traced('places.centre_directory')
+def scrape_centre_directory(timeout: int = 10) -> list[dict]:
+    """Return every Places centre listed on the centre finder"""
+
+    with get_pool().driver(profile='Places') as driver:
+        open_page(driver, PLACES_FIND_CENTRE_URL)
+        webwait_all(driver, 'CLASS_NAME', 'our-centres__item', timeout)
+
+        return parse_centre_directory(driver.page_source, driver.current_url)
 
-        except:
-            retry_count += 1
-            print(f'Retrying link {link}, attempt {retry_count}')
-            driver.refresh()
 
-    activities_items = webwait_all(
-        activities, 'CLASS_NAME', "activity-locations__list-item", timeout)
+def get_all_centre_info(postcode: str, max_centres: int = 10, timeout: int = 10) -> tuple[list[dict], list[float]]:
+    """Get the closest 'max_centres' Places centres and their distances, ordered by distance.
+    The centre list is scraped only when the saved directory is due a refresh"""
 
-    activities_names = [x.text.lower() for x in webwait_all(
-        activities, 'CLASS_NAME', "activity-locations__link", timeout)]
+    home_coords = get_coordinates(postcode)
+
+    nearest = nearest_centres('Places', home_coords, max_centres)
+    if nearest is None:
+        save_directory('Places', {'centres': scrape_centre_directory(timeout),
+                                  'complete': True})
+        nearest = nearest_centres('Places', home_coords, max_centres)
+
+    centres = [x for x, _ in nearest]
+    if not centres:
+        return [], []
+
+    centre_distances = [round(float(x), 3) for x in
+                        distances_km(home_coords, [[x['lat'], x['lon']] for x in centres], 'vincenty')]
+
+    return centres, centre_distances
+
+
+def open_sports_timetable(driver: WebDriver, timeout: int) -> bool | None:
+    """Open the sports timetable on a centre page. Return False if the centre has none,
+    None if the page could not be read"""
+
+    def read(driver: WebDriver) -> list[str]:
+        webwait(driver, 'CLASS_NAME', 'activity-locations__list', timeout)
+        return [x.text.strip().lower() for x in
+                webwait_all(driver, 'CLASS_NAME', 'activity-locations__list-item', timeout)]
+
+    names = retry_page(driver, read, name='places.activities')
+    if not names:
+        return None
+    if 'sports' not in names:
+        return False
 
-    if 'sports' in activities_names:
-        sports_item = activities_items[activities_names.index('sports')]
+    sports_item = driver.find_elements(By.CLASS_NAME, 'activity-locations__list-item')[names.index('sports')]
+    driver.execute_script("arguments[0].scrollIntoView({block: 'center'}); arguments[0].click();",
+                          sports_item)
 
-    else:
+    found, _ = wait_for_any_selector(driver, {'sessions': '.activities-group__sessions'},
+                                     timeout, 'places_sessions')
+    if found is None:
         return None
 
-    while True:
+    driver.execute_script(OPEN_GROUPS_JS)
+
+    return True
+
+
+def read_sessions(driver: WebDriver, activities: list[str], timeout: int) -> list[dict] | None:
+    """Return {'date', 'sessions'} of every day of the open timetable, with [title, time, price,
+    courts left] of each session whose title contains any of 'activities'. None if the details
+    of any of those sessions did not show within timeout"""
+
+    wanted = [x.lower() for x in activities]
+    with span('places.sessions'):
+        cards = driver.execute_script(COUNT_SESSIONS_JS, wanted)
+        driver.set_script_timeout(timeout * (cards + 1))
         try:
-            cookie_reject = webwait(driver, 'ID', "cookiescript_reject", timeout)
-            cookie_reject.click()
-            break
-
-        except:
-            break
-
-    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", sports_item)
-    sports_item.click()
-
-    activity_days = webwait_all(driver, 'CLASS_NAME', "activity-days__list-item", timeout)
-    activities_days_date_text = [x.text for x in webwait_all(driver, 'CLASS_NAME', "activity-days__date", timeout)]
-    index_1 = [x for x in range(len(activities_days_date_text)) if activities_days_date_text[x].strip() != ''][0]
-
-    activity_days = activity_days[index_1:]
-
-    dates_dict = {}
-
-    for i, activity_day in enumerate(activity_days):
-
-        while True:
-            activities_days_date_text = [x.text for x in
-                                         webwait_all(driver, 'CLASS_NAME', "activity-days__date", timeout)]
-            if activities_days_date_text[i + index_1].strip() == '':
-                webwait(driver, 'CLASS_NAME', "slick-next.slick-arrow", timeout).click()
-
-            else:
-                break
-
-        activity_groups = webwait_all(activity_day, 'CLASS_NAME', "activities-group", timeout)
-        activity_groups.extend(webwait_all(activity_day, 'CLASS_NAME', "activities-group.is-open", timeout))
-
-        for activity_group in activity_groups:
-            try:
-                if activity_group.get_attribute('class').strip() == "activities-group":
-                    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", activity_group)
-                    activity_group.click()
-
-            except:
-                pass
-
-        sessions = webwait_all(activity_day, 'CLASS_NAME', "activities-group__sessions", timeout)
-        session_date = sessions[0].get_attribute('data-date')
-
-        times, prices, spaces_avail = [], [], []
-
-        for session in sessions:
-
-            cards = np.array(webwait_all(session, 'CLASS_NAME', "timetable-card", timeout))
-            info_btns = np.array(
-                webwait_all(
-                    session, 'CLASS_NAME',
-                    "timetable-card__btn.c-btn.c-btn--primary.c-btn--medium.c-btn-hover", timeout))
-
-            titles = np.array([x.text.lower() for x in
-                               webwait_all(session, 'CLASS_NAME', "timetable-card__title", timeout)])
-            valid_indices = np.where(np.char.find(titles, Act.lower()) >= 0)[0]
-            cards = cards[valid_indices]
-            info_btns = info_btns[valid_indices]
-            for card, info_btn in zip(cards, info_btns):
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", card)
-                card.click()
-                info_btn.click()
-
-                court_options = webwait(driver, 'CLASS_NAME', "session-info__sublocationgroups", timeout)
-                courts = webwait_all(court_options, 'NAME', "sublocationgroup", timeout)
-                if not courts:
-                    webwait(driver, 'CLASS_NAME', "modal__close", timeout).click()
-                    continue
-
-                time_ = webwait(driver, 'CLASS_NAME', "session-info__time", timeout).text
-                price = webwait(driver, 'CLASS_NAME', "session-info__price2", timeout).text.split('&')[]
-
-                times.append(time_)
-                prices.append(price)
-                spaces_avail.append(len(courts))
-
-                webwait(driver, 'CLASS_NAME', "modal__close", timeout).click()
-
-        dates_dict[session_date] = {'Times': np.array(times.copy()),
-                                    'Prices': np.array(prices.copy()),
-                                    'Spaces': np.array(spaces_avail.copy())}
-
-    centre_address = centre_address.replace('\n', ', ')
-    Places_dict[centre_name] = {'Address': centre_address, 'Activity': {},
-                                'Distance': centre_distance / 1000, 'Company': 'BETTER'}
-
-    valid_activities_names = np.array(activities_names)[valid_activities_indexes]
-    valid_links = [link + '/' + z.lower().replace(' ', '-') for z in valid_activities_names]
-
-    for activity_link in valid_links:
-        driver.get(activity_link)
-        activity = activity_link.split('/')[-1]
-        retry_count = 0
-        while True:
-            try:
-                dates_tab = WebDriverWait(driver, timeout).until(
-                    EC.presence_of_element_located(
-                        (By.CLASS_NAME, "DateRibbonComponent__DatesWrapper-sc-p1q1bx-1.iDJlaR")
-                    )
-                )
-                break
-            except:
-                retry_count += 1
-                print(f'Retrying link {activity_link}, attempt {retry_count}')
-                driver.refresh()
-
-        all_dates_links = [x.get_attribute('href') for x in WebDriverWait(dates_tab, timeout).until(
-            EC.presence_of_all_elements_located(
-                (By.TAG_NAME, "a")
-            )
-        ) if 'undefined' not in x.get_attribute('href')]
-        dates_dict = {}
-
-        for date_link in tqdm(all_dates_links, total=len(all_dates_links),
-                              desc=f'Searching: {centre_name} - {activity}', disable=True):
-
-            driver.get(date_link)
-            date = date_link.split('/')[-2]
-            found = None
-            start_time = time()
-            retry_count = 0
-            while found is None:
-                try:
-                    times = [x.text.lower() for x in
-                             driver.find_elements(By.CLASS_NAME,
-                                                  "ClassCardComponent__ClassTime-sc-1v7d176-3.jaVGAY")]
-                    if not times:
-                        raise Exception("")
-                    found = True
-                    break
-                except:
-                    pass
-
-                try:
-                    driver.find_element(By.CLASS_NAME,
-                                        "ByTimeListComponent__Wrapper-sc-39liwv-1."
-                                        "ByTimeListComponent__NoContentWrapper-sc-39liwv-2.SqNmL.cUXVSN"
-                                        )
-                    found = False
-                    break
-                except:
-                    pass
-                end_time = time()
-                if end_time - start_time > timeout:
-                    start_time = time()
-                    retry_count += 1
-                    print(f'Retrying link {activity_link}, attempt {retry_count}')
-                    driver.refresh()
-
-            if not found:
-                continue
-
-            prices = [x.text.lower() for x in WebDriverWait(driver, timeout).until(
-                EC.presence_of_all_elements_located(
-                    (By.CLASS_NAME, "ClassCardComponent__Price-sc-1v7d176-14.cUTjXm")
-                )
-            )]
-            spaces_avail = [x.text.lower().split(' ')[0] for x in WebDriverWait(driver, timeout).until(
-                EC.presence_of_all_elements_located(
-                    (By.CLASS_NAME, "ContextualComponent__BookWrap-sc-eu3gk6-1.fiQwml")
-                )
-            )]
-
-            valid_indexes = np.array([x for x in range(len(spaces_avail)) if spaces_avail[x] != '0'])
-            if valid_indexes.size == 0:
-                continue
-
-            dates_dict[date] = {'Times': np.array(times.copy())[valid_indexes],
-                                'Prices': np.array(prices.copy())[valid_indexes],
-                                'Spaces': np.array(spaces_avail.copy())[valid_indexes]}
-
-        Places_dict[centre_name]['Activity'][activity] = dates_dict.copy()
-
-    driver.close()
-    return Places_dict
-
-
-# Function for BETTER gyms/centres
-def Places_Leisure(Loc, Act, max_centres=20, cpu_cores=4, timeout=10):
-    """
-    :param Loc: Location which to search from. Postcodes work best.
-    :param Act: Activity e.g: 'Badminton', 'Basketball'
-    :param max_centres: Take closest 'n' centres from Loc
-    :param cpu_cores: Number of parallel tabs to be open. Each tab is a different centre
-    :param timeout: Maximum wait time for website to load. If slow internet, increase this.
-    :return: dictionary of centres and corresponding info in the following example structure:
-    """
-
-    Places_dict = {}
-
-    geolocator = Nominatim(user_agent="aaaa")
-    home = geolocator.geocode(Loc)
-    home_coords = (home.latitude, home.longitude)
-
-    FindCentre_url = "https://www.placesleisure.org/find-centre/"
-
-    driver = webdriver.Chrome()
-    driver.get(FindCentre_url)
-    centre_elements = np.array(WebDriverWait(driver, timeout).until(
-        EC.presence_of_all_elements_located((By.CLASS_NAME, 'our-centres__item'))))
-    centre_names = np.array([x.get_attribute('data-name') for x in centre_elements])
-    centre_lat_lon = [(float(x.get_attribute('data-lat')), float(x.get_attribute('data-long'))) for x in
-                      centre_elements]
-    centre_distances = np.array([latlon2metres((x[0], x[1]), home_coords) for x in centre_lat_lon])
-    sorted_indices = np.argsort(centre_distances)
-
-    centre_elements = centre_elements[sorted_indices][:max_centres]
-    centre_names = centre_names[sorted_indices][:max_centres]
-    centre_distances = centre_distances[sorted_indices][:max_centres]
-
-    centre_links = [(WebDriverWait(x, timeout).until(
-        EC.presence_of_element_located(
-            (By.CLASS_NAME, 'c-btn.c-btn--primary.b-centre-card__link')
-        )).get_attribute('href')) for x in centre_elements]
-
-    # centre_adresses = [(WebDriverWait(x, timeout).until(
-    #     EC.presence_of_element_located(
-    #         (By.XPATH, 'b-centre-card__address')
-    #     ))).text for x in centre_elements]
-
-    driver.close()
-
-    func = partial(Places_Leisure_loop, Act=Act, timeout=timeout)
-    results = p_map(func, centre_links, centre_names, centre_distances, num_cpus=cpu_cores)
-    for result in results:
-        if result is None:
-            continue
-        Places_dict.update(result)
+            read = driver.execute_async_script(SESSIONS_JS, wanted, int(timeout * 1000))
+        except TimeoutException:
+            print(f'Sessions of {cards} cards were not read in time')
+            return None
 
-    if not Places_dict:
+    if read['missed']:
+        print(f"Details of {read['missed']} of {cards} sessions did not show")
         return None
 
-    return Places_dict
+    return read['days']
+
+
+def sessions_by_title(days: list[dict]) -> dict[str, dict[str, np.ndarray]]:
+    """Return slots with courts left of each session title (lower case), by date"""
+
+    columns = {}
+    for day in days:
+        for title, time_, price, spaces in day['sessions']:
+            column = columns.setdefault(title.lower(), {}).setdefault(day['date'], ([], [], []))
+            for values, value in zip(column, (time_, price, spaces)):
+                values.append(value)
+
+    return {title: {date: available(slots_from_columns(date, *column)) for date, column in dates.items()}
+            for title, dates in columns.items()}
+
+
+def get_cached_centre(link: str, activities: list[str]) -> dict[str, np.ndarray] | None:
+    """Return cached slots of every session title matching 'activities' at a centre,
+    None unless all of them are fresh"""
+
+    activity_dict = {}
+    for activity in activities:
+        titles = cache_get('places_titles', result_key(link, activity))
+        if titles is None:
+            return None
+
+        for title in titles:
+            dates = get_result_dates('Places', link, title)
+            cached = get_results('Places', link, title, dates) if dates else None
+            if cached is None:
+                return None
+            slots = merge_slots(*map(slots_from_json, cached.values()))
+            if len(slots):
+                activity_dict[title] = slots
+
+    return activity_dict
+
+
+def save_centre(link: str, activities: list[str], days: list[dict],
+                titles: dict[str, dict[str, np.ndarray]]) -> None:
+    """Cache slots of every title read from a centre, and which titles match each activity"""
+
+    dates = [x['date'] for x in days]
+    for title, dates_dict in titles.items():
+        set_results('Places', link, title, dates,
+                    {k: slots_to_json(v) for k, v in dates_dict.items() if len(v)})
+        set_result_dates('Places', link, title, dates)
+
+    for activity in activities:
+        cache_set('places_titles', result_key(link, activity),
+                  [x for x in titles if activity.lower() in x], TITLES_TTL)
+
+
+def scrape_places_centre(link: str, activities: list[str], timeout: int) -> dict | None:
+    """Return available slots of every session at a centre whose title matches any of 'activities',
+    keyed by lower case title. {} if the centre has no sports timetable, None if its
+    timetable could not be read"""
+
+    cached = get_cached_centre(link, activities)
+    if cached is not None:
+        return cached
+
+    with span('places.centre', centre=link), get_pool().driver(profile='Places') as driver:
+        open_page(driver, link)
+        opened = open_sports_timetable(driver, timeout)
+        if not opened:
+            return None if opened is None else {}
+
+        days = read_sessions(driver, activities, timeout)
+        if days is None:
+            return None
+
+    titles = sessions_by_title(days)
+    save_centre(link, activities, days, titles)
+
+    activity_dict = {}
+    for title, dates_dict in titles.items():
+        slots = merge_slots(*dates_dict.values())
+        if len(slots):
+            activity_dict[title] = slots
+
+    return activity_dict
+
+
+def places_centre_dict(centre: dict, centre_distance: float, activity_dict: dict) -> dict:
+    """Return centre info in the format shared by all providers, keeping titles with bookings"""
+
+    return {centre['name']: {'Address': centre.get('address', 'N/A'),
+                             'Activity': {k: v for k, v in activity_dict.items() if len(v)},
+                             'Distance': centre_distance, 'Company': 'Places Leisure'}}
+
+
+def places_gym_loop(centre: dict, centre_distance: float, activity: str, timeout: int) -> dict | None:
+    """Scrape info from a certain centre of the directory"""
+
+    activity_dict = scrape_places_centre(centre['link'], [activity], timeout)
+
+    return places_centre_dict(centre, centre_distance, activity_dict) if activity_dict else None
+
+
+def discover_centres(postcode: str, max_centres: int = 10, timeout: int = 10) -> list[dict]:
+    """Return name, address, centre page link and distance of the closest centres"""
+
+    centres, centre_distances = get_all_centre_info(postcode, max_centres, timeout)
+
+    return [{'name': x['name'], 'address': x.get('address', 'N/A'), 'link': x['link'],
+             'distance': centre_distance} for x, centre_distance in zip(centres, centre_distances)]
+
+
+def list_activities(centre: dict, timeout: int = 10) -> list[str]:
+    """Return titles of the sessions on a centre's sports timetable"""
+
+    with get_pool().driver(profile='Places') as driver:
+        open_page(driver, centre['link'])
+        if not open_sports_timetable(driver, timeout):
+            return []
+
+        titles = driver.execute_script(TITLES_JS)
+
+    return sorted(set(titles))
+
+
+def scrape_places_batch(queries: list[tuple[str, str]], max_centres: int = 20, cpu_cores: int = 4,
+                        timeout: int = 10, on_result: Callable[[int, dict], None] | None = None) -> list[dict] | None:
+    """Return available bookings for each (postcode, activity) query. Every centre needed
+    by any query is visited once, for all the activities wanted there, the centres nearest
+    to any query first.
+    If on_result is given, it is called with (query index, centre dict) as soon as
+    each centre has been searched in full, with an empty 'Activity' if it has no free slots,
+    and nothing is kept or returned. Centres that failed or were stopped are left out"""
+
+    get_pool(cpu_cores)
+
+    centres, wanted, name_queries, ranks = {}, {}, {}, {}
+    for i, (postcode, activity) in enumerate(queries):
+        found, centre_distances = get_all_centre_info(postcode, max_centres, timeout)
+        for rank, (centre, centre_distance) in enumerate(zip(found, centre_distances)):
+            name = centre['name']
+            centres[name] = centre
+            ranks[name] = min(ranks.get(name, rank), rank)
+            wanted.setdefault(name, set()).add(activity.lower())
+            name_queries.setdefault(name, []).append((i, centre_distance))
+
+    all_results = None
+    if on_result is None:
+        all_results = [{} for _ in queries]
+        on_result = collect_into(all_results)
+
+    names = list(wanted)
+
+    def centre_done(index: int, scraped: dict | None) -> None:
+        if scraped is None:
+            return
+
+        name = names[index]
+        for i, centre_distance in name_queries[name]:
+            activity = queries[i][1].lower()
+            activity_dict = {k: v for k, v in scraped.items() if activity in k}
+            on_result(i, places_centre_dict(centres[name], centre_distance, activity_dict))
+
+    get_scheduler(cpu_cores).map(partial(scrape_places_centre, timeout=timeout),
+                                 [centres[x]['link'] for x in names],
+                                 [sorted(wanted[x]) for x in names],
+                                 desc='Places', on_result=centre_done,
+                                 priorities=[ranks[x] for x in names])
+
+    return all_results
+
+
+def scrape_places_website(postcode, activity, max_centres=20, cpu_cores=4, timeout=10):
+    """Perform web scraping of Places Leisure websites"""
+
+    return scrape_places_batch([(postcode, activity)], max_centres, cpu_cores, timeout)[0]
@@ -0,0 +1,384 @@
+"""Offline benchmark of the scrapers against synthetic fixtures served by the local fixture server
+
+Run with:  python benchmark.py --latency 0.2 --jitter 0.05 --centres 8 --workers 4
+
+Each suite runs the real scraper functions for '--centres' copies of the fixture centre on the
+shared scheduler, and reports per centre latency, WebDriver commands and CPU, along with the
+RSS and CPU of every worker's browser. The browserless suites ('better-http' and 'parse') also
+run where Chrome is not installed.
+"""
+
+from collections import Counter
+from os import environ as ENV
+import threading
+import datetime
+import argparse
+import tempfile
+import resource
+import json
+import time
+import os
+
+# Scraped results must not be served from the user's cache, so point it at a fresh file
+# before any module that opens it is imported
+ENV.setdefault('SCRAPER_CACHE', os.path.join(tempfile.mkdtemp(prefix='scraper-bench-'),
+                                             'cache.sqlite'))
+ENV.setdefault('EMAIL', 'benchmark@example.com')
+ENV.setdefault('EA_PASS', 'benchmark')
+
+# pylint: disable=wrong-import-position
+from lxml import html
+from selenium.webdriver.remote.webdriver import WebDriver
+
+import better_http
+import browser
+import cache
+import BETTER
+import EA
+import Places
+from fixture_server import serve_fixtures, FIXTURES_DIR
+from scheduler import get_scheduler
+from instrument import enable_tracing, export_trace, trace_summary
+from tools import wait_stats_summary, reset_wait_stats
+
+SUITES = ('better', 'better-http', 'ea', 'places', 'parse')
+BROWSER_SUITES = ('better', 'ea', 'places')
+CENTRE_NAME = 'Test Leisure Centre'
+CENTRE_ADDRESS = '1 Test Street, London, SW1A 1AA'
+HOME_COORDS = (51.5014, -0.1419)
+BETTER_DATES = ('2026-10-19', '2026-10-20', '2026-10-21', '2026-10-22')
+PARSE_ITERATIONS = 200
+
+_commands = threading.local()
+_drivers = []
+_drivers_lock = threading.Lock()
+
+
+def count_command(name: str) -> None:
+    """Add a WebDriver command to the counts of the current worker thread"""
+
+    if not hasattr(_commands, 'counts'):
+        _commands.counts = Counter()
+    _commands.counts[name] += 1
+
+
+def take_command_counts() -> Counter:
+    """Return and reset WebDriver command counts of the current worker thread"""
+
+    counts = getattr(_commands, 'counts', Counter())
+    _commands.counts = Counter()
+
+    return counts
+
+
+def benchmark_driver() -> WebDriver:
+    """Launch headless Chrome whose WebDriver commands are counted per worker thread"""
+
+    driver = browser.new_driver()
+
+    execute = driver.execute
+
+    def counting_execute(driver_command, params=None):
+        count_command(driver_command)
+        return execute(driver_command, params)
+
+    # Elements send their commands through their parent driver, so this counts those too
+    driver.execute = counting_execute
+    with _drivers_lock:
+        _drivers.append(driver)
+
+    return driver
+
+
+def process_tree_usage(pid: int) -> tuple[float | None, float | None]:
+    """Return RSS in MB and CPU seconds of a process and all its descendants, read from /proc.
+    (None, None) where /proc is not available"""
+
+    if not os.path.isdir('/proc'):
+        return None, None
+
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat', encoding='utf-8') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+
+    rss_kb, ticks, todo = 0, 0, [pid]
+    while todo:
+        current = todo.pop()
+        todo.extend(children.get(current, []))
+        try:
+            with open(f'/proc/{current}/stat', encoding='utf-8') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            ticks += int(fields[11]) + int(fields[12])
+            with open(f'/proc/{current}/status', encoding='utf-8') as f:
+                rss_kb += next((int(x.split()[1]) for x in f if x.startswith('VmRSS:')), 0)
+        except (OSError, IndexError, ValueError):
+            continue
+
+    return rss_kb / 1024, ticks / os.sysconf('SC_CLK_TCK')
+
+
+def measure(task: str, fn, *args) -> dict:
+    """Run one centre task on the current worker and return its timings"""
+
+    take_command_counts()
+    wall, cpu = time.perf_counter(), time.thread_time()
+    error = None
+    try:
+        result = fn(*args)
+    except Exception as e:  # pylint: disable=broad-except
+        result, error = None, f'{type(e).__name__}: {e}'.splitlines()[0]
+    commands = take_command_counts()
+
+    return {'task': task, 'worker': threading.current_thread().name,
+            'seconds': time.perf_counter() - wall, 'cpu': time.thread_time() - cpu,
+            'commands': sum(commands.values()), 'command_counts': dict(commands),
+            'found': result is not None, 'error': error}
+
+
+def reset_scraped_results() -> None:
+    """Make every scraped result expire at once, so each task scrapes its centre in full"""
+
+    cache.RESULT_TTLS = ()
+    cache.RESULT_TTL_FAR = 0
+    cache.cache_delete('slots')
+    cache.cache_delete('result_dates')
+    cache.cache_delete('places_titles')
+
+
+def better_task(base_url: str, timeout: int, backend: str):
+    """Return callable scraping the BETTER fixture centre with the given backend"""
+
+    booking_link = f'{base_url}/better/location/test-leisure-centre'
+
+    def task(_):
+        return BETTER.BETTER_gym_loop(booking_link, CENTRE_NAME, CENTRE_ADDRESS, 'badminton',
+                                      HOME_COORDS, timeout, backend)
+
+    return task
+
+
+def better_http_task(base_url: str, timeout: int):
+    """Return callable fetching every BETTER fixture date page without a browser"""
+
+    date_links = [f'{base_url}/better/location/test-leisure-centre/sports-hall-activities/'
+                  f'badminton-40min/{x}/by-time' for x in BETTER_DATES]
+
+    def task(_):
+        return better_http.fetch_dates(date_links, timeout)
+
+    return task
+
+
+def ea_task(timeout: int):
+    """Return callable scraping the Everyone Active fixture centre"""
+
+    def task(_):
+        return EA.ea_gym_loop(CENTRE_NAME, 1.0, 'badminton', timeout)
+
+    return task
+
+
+def places_task(base_url: str, timeout: int):
+    """Return callable scraping the Places fixture centre"""
+
+    centre = {'name': CENTRE_NAME, 'address': CENTRE_ADDRESS,
+              'link': f'{base_url}/places/centre/test-leisure-centre/'}
+
+    def task(_):
+        return Places.places_gym_loop(centre, 1.0, 'badminton', timeout)
+
+    return task
+
+
+def places_days() -> list[dict]:
+    """Return a week of Places sessions like the ones the fixture timetable shows"""
+
+    first = datetime.date(2026, 10, 19)
+    sessions = [('Badminton', '07:00 - 08:00', '9.10'), ('Badminton', '18:00 - 19:00', '11.20'),
+                ('Table Tennis', '19:00 - 20:00', '6.50'), ('Badminton', '20:00 - 21:00', '11.20')]
+
+    return [{'date': f'{first + datetime.timedelta(days=day):%Y-%m-%d}',
+             'sessions': [[*x, (day * 3 + i * 5) % 4] for i, x in enumerate(sessions)]}
+            for day in range(7)]
+
+
+def master_table_html() -> str:
+    """Return a two week masterTable like the one the Everyone Active fixture builds"""
+
+    first = datetime.date(2026, 10, 19)
+    days = [f'{first + datetime.timedelta(days=i):%a %d/%m}' for i in range(14)]
+    rows = ['<tr><th></th>' + ''.join(f'<th>{x}</th>' for x in days) + '</tr>']
+    for hour in range(7, 22):
+        cells = ''.join('<td class="itemavailable"></td>' if (hour * 7 + day * 3) % 4 == 0
+                        else '<td class="itemunavailable"></td>' for day in range(len(days)))
+        rows.append(f'<tr><td>{hour:02d}:00 - {hour + 1:02d}:00</td>{cells}</tr>')
+
+    return f'<table class="masterTable">{"".join(rows)}</table>'
+
+
+def run_parse_suite() -> list[dict]:
+    """Time the page parsers on the synthetic fixture pages, without network or browser"""
+
+    date_page = os.path.join(FIXTURES_DIR, 'better', 'location', 'test-leisure-centre',
+                             'sports-hall-activities', 'badminton-40min', '2026-10-19', 'by-time.html')
+    with open(date_page, encoding='utf-8') as f:
+        page = f.read()
+    table = master_table_html()
+    days = places_days()
+
+    parsers = {'better_http.parse_date_page': lambda: better_http.parse_date_page(page),
+               'EA.parse_master_table': lambda: EA.parse_master_table(table),
+               'EA.compile_table_data_into_dict': lambda: EA.compile_table_data_into_dict(
+                   *EA.parse_master_table(table)),
+               'Places.sessions_by_title': lambda: Places.sessions_by_title(days),
+               'lxml.html.fromstring': lambda: html.fromstring(table)}
+
+    results = []
+    for name, parse in parsers.items():
+        wall, cpu = time.perf_counter(), time.thread_time()
+        for _ in range(PARSE_ITERATIONS):
+            parse()
+        results.append({'task': name, 'worker': threading.current_thread().name,
+                        'seconds': (time.perf_counter() - wall) / PARSE_ITERATIONS,
+                        'cpu': (time.thread_time() - cpu) / PARSE_ITERATIONS,
+                        'commands': 0, 'command_counts': {}, 'found': True, 'error': None})
+
+    return results
+
+
+def run_suite(suite: str, base_url: str, centres: int, workers: int, timeout: int) -> list[dict]:
+    """Run one suite for 'centres' copies of its fixture centre and return per centre timings"""
+
+    if suite == 'parse':
+        return run_parse_suite()
+
+    tasks = {'better': lambda: better_task(base_url, timeout, 'selenium'),
+             'better-http': lambda: better_http_task(base_url, timeout),
+             'ea': lambda: ea_task(timeout),
+             'places': lambda: places_task(base_url, timeout)}
+    task = tasks[suite]()
+
+    reset_scraped_results()
+    names = [f'{suite}#{i}' for i in range(centres)]
+
+    return get_scheduler(workers).map(measure, names, [task] * centres, range(centres), desc=suite)
+
+
+def browser_usage() -> list[dict]:
+    """Return RSS and CPU of every browser launched so far, by chromedriver pid"""
+
+    usage = []
+    with _drivers_lock:
+        drivers = list(_drivers)
+
+    for driver in drivers:
+        process = getattr(driver.service, 'process', None)
+        if process is None:
+            continue
+        rss_mb, cpu = process_tree_usage(process.pid)
+        usage.append({'pid': process.pid, 'rss_mb': rss_mb, 'cpu': cpu})
+
+    return usage
+
+
+def format_results(suite: str, results: list[dict]) -> str:
+    """Return table of per centre timings of a suite with their totals"""
+
+    lines = [f"\n{suite}",
+             f"{'task':<34}{'worker':<14}{'ms':>10}{'cpu ms':>10}{'commands':>10}  status"]
+    for result in results:
+        status = result['error'] or ('ok' if result['found'] else 'nothing found')
+        lines.append(f"{result['task']:<34}{result['worker']:<14}{result['seconds'] * 1000:>10.1f}"
+                     f"{result['cpu'] * 1000:>10.1f}{result['commands']:>10}  {status}")
+
+    if results:
+        seconds = sorted(x['seconds'] for x in results)
+        lines.append(f"{'median / p90 ms':<48}{seconds[len(seconds) // 2] * 1000:>10.1f}"
+                     f"{seconds[min(len(seconds) - 1, int(len(seconds) * 0.9))] * 1000:>10.1f}")
+
+    return '\n'.join(lines)
+
+
+def format_usage(usage: list[dict]) -> str:
+    """Return table of resources used by each worker's browser and by this process"""
+
+    lines = ['\nworkers', f"{'chromedriver pid':<20}{'RSS MB':>10}{'cpu s':>10}"]
+    for worker in usage:
+        rss = 'n/a' if worker['rss_mb'] is None else f"{worker['rss_mb']:.1f}"
+        cpu = 'n/a' if worker['cpu'] is None else f"{worker['cpu']:.2f}"
+        lines.append(f"{worker['pid']:<20}{rss:>10}{cpu:>10}")
+
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    lines.append(f"{'python (max RSS)':<20}{self_usage.ru_maxrss / 1024:>10.1f}"
+                 f"{self_usage.ru_utime + self_usage.ru_stime:>10.2f}")
+
+    return '\n'.join(lines)
+
+
+def main() -> None:
+    """Serve the fixtures, point the scrapers at them and run the chosen suites"""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--suites', default=','.join(SUITES),
+                        help=f"comma separated suites to run, from {', '.join(SUITES)}")
+    parser.add_argument('--centres', type=int, default=4, help='centre tasks per suite')
+    parser.add_argument('--workers', type=int, default=4, help='parallel workers (and browsers)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='maximum random +/- seconds added to latency')
+    parser.add_argument('--timeout', type=int, default=10, help='seconds to wait for page elements')
+    parser.add_argument('--json', metavar='FILE', help='also write all measurements to FILE')
+    parser.add_argument('--trace', metavar='FILE', help='write a Chrome trace of every phase to FILE')
+    options = parser.parse_args()
+
+    suites = [x.strip() for x in options.suites.split(',') if x.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites {', '.join(sorted(unknown))}")
+
+    server, base_url = serve_fixtures(latency=options.latency, jitter=options.jitter)
+    better_http.BETTER_API_URL = f'{base_url}/better/api/activities'
+    BETTER.BETTER_LOCATOR_URL = f'{base_url}/better/centre-locator'
+    EA.EA_BOOKING_URL = f'{base_url}/everyoneactive/booking/'
+    EA.EA_CENTRES_URL = f'{base_url}/everyoneactive/centre/'
+    Places.PLACES_FIND_CENTRE_URL = f'{base_url}/places/find-centre/'
+    cache.cache_set('geocode', ' '.join(CENTRE_ADDRESS.lower().split()), HOME_COORDS, 3600)
+
+    if options.trace:
+        enable_tracing()
+
+    if any(x in BROWSER_SUITES for x in suites):
+        browser.get_pool(options.workers, factory=benchmark_driver)
+
+    report = {'latency': options.latency, 'jitter': options.jitter, 'workers': options.workers,
+              'centres': options.centres, 'suites': {}}
+    try:
+        for suite in suites:
+            reset_wait_stats()
+            results = run_suite(suite, base_url, options.centres, options.workers, options.timeout)
+            report['suites'][suite] = results
+            print(format_results(suite, results))
+            if suite in BROWSER_SUITES:
+                print('\n' + wait_stats_summary())
+
+        report['workers_usage'] = browser_usage()
+        print(format_usage(report['workers_usage']))
+        if options.trace:
+            export_trace(options.trace)
+            print('\n' + trace_summary())
+    finally:
+        browser.close_pool()
+        server.shutdown()
+
+    if options.json:
+        with open(options.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
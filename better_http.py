@@ -0,0 +1,142 @@
+"""Browserless backend fetching BETTER date pages concurrently over HTTP"""
+
+from os import environ as ENV
+import asyncio
+import json
+
+import aiohttp
+from lxml import html
+
+from resilience import get_breaker, host_of, rate_limit
+
+BETTER_API_URL = ENV.get('BETTER_API_URL',
+                         'https://better-admin.org.uk/api/activities')
+BETTER_ORIGIN = ENV.get('BETTER_ORIGIN', 'https://bookings.better.org.uk')
+MAX_CONNECTIONS = 8  # concurrent requests per worker
+
+TIME_CLASS = 'ClassCardComponent__ClassTime-sc-1v7d176-3'
+PRICE_CLASS = 'ClassCardComponent__Price-sc-1v7d176-14'
+BOOK_CLASS = 'ContextualComponent__BookWrap-sc-eu3gk6-1'
+NO_CONTENT_CLASS = 'ByTimeListComponent__NoContentWrapper-sc-39liwv-2'
+
+
+def split_date_link(date_link: str) -> tuple[str, str, str]:
+    """Return venue, activity and date slugs of a date page link
+    e.g. .../location/<venue>/<category>/<activity>/<date>/by-time"""
+
+    parts = date_link.rstrip('/').split('/')
+
+    return parts[-5], parts[-3], parts[-2]
+
+
+def api_url(date_link: str) -> str:
+    """Return link of the JSON the date page hydrates from"""
+
+    venue, activity, date = split_date_link(date_link)
+
+    return f"{BETTER_API_URL}/venue/{venue}/activity/{activity}/times?date={date}"
+
+
+def parse_times_json(data: dict) -> tuple[list[str], list[str], list[str]]:
+    """Return times, prices and spaces from the times API response"""
+
+    times, prices, spaces_avail = [], [], []
+    for slot in data.get('data', []):
+        times.append(f"{slot['starts_at']['format_24_hour']} - "
+                     f"{slot['ends_at']['format_24_hour']}".lower())
+        prices.append(slot['price']['formatted_amount'].lower()[1:])
+        spaces_avail.append(str(slot['spaces']))
+
+    return times, prices, spaces_avail
+
+
+def class_prefix_xpath(prefix: str) -> str:
+    """Return xpath matching elements whose class starts with prefix"""
+
+    return f"//*[starts-with(@class, '{prefix}') or contains(@class, ' {prefix}')]"
+
+
+def parse_date_page(page: str) -> tuple[list[str], list[str], list[str]] | None:
+    """Return times, prices and spaces from a server rendered date page,
+    or None if the page needs JavaScript to show its bookings"""
+
+    tree = html.fromstring(page)
+
+    times = [x.text_content().strip().lower()
+             for x in tree.xpath(class_prefix_xpath(TIME_CLASS))]
+    if not times:
+        if tree.xpath(class_prefix_xpath(NO_CONTENT_CLASS)):
+            return [], [], []
+        return None
+
+    prices = [x.text_content().strip().lower()[1:]
+              for x in tree.xpath(class_prefix_xpath(PRICE_CLASS))]
+    spaces_avail = [x.get('spaces') for x in tree.xpath(class_prefix_xpath(BOOK_CLASS))]
+
+    return times, prices, spaces_avail
+
+
+async def get_text(session: aiohttp.ClientSession, url: str, timeout: int) -> str | None:
+    """Return body of url, or None if the request failed, keeping to the host's rate limit
+    and not requesting hosts whose circuit is open"""
+
+    breaker = get_breaker(host_of(url))
+    if not breaker.allow():
+        return None
+
+    await asyncio.to_thread(rate_limit, host_of(url))
+    try:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status == 429 or response.status >= 500:
+                breaker.record_failure()
+                return None
+            breaker.record_success()
+            if response.status != 200:
+                return None
+            return await response.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        breaker.record_failure()
+        return None
+
+
+async def fetch_date(session: aiohttp.ClientSession, date_link: str,
+                     timeout: int) -> tuple[list[str], list[str], list[str]] | None:
+    """Fetch bookings of one date, preferring the JSON API over the HTML page"""
+
+    text = await get_text(session, api_url(date_link), timeout)
+    if text is not None:
+        try:
+            return parse_times_json(json.loads(text))
+        except (ValueError, KeyError, TypeError):
+            pass
+
+    text = await get_text(session, date_link, timeout)
+    if text is None:
+        return None
+
+    try:
+        return parse_date_page(text)
+    except ValueError:
+        return None
+
+
+async def fetch_dates_async(date_links: list[str],
+                            timeout: int) -> list[tuple[list[str], list[str], list[str]] | None]:
+    """Fetch all date links concurrently over one pooled connection set"""
+
+    connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS)
+    headers = {'Origin': BETTER_ORIGIN, 'Referer': f'{BETTER_ORIGIN}/'}
+    async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+        return await asyncio.gather(*[fetch_date(session, x, timeout)
+                                      for x in date_links])
+
+
+def fetch_dates(date_links: list[str],
+                timeout: int) -> list[tuple[list[str], list[str], list[str]] | None]:
+    """Return times, prices and spaces for every date link, in order.
+    Entries are None where the page could only be read with a browser"""
+
+    if not date_links:
+        return []
+
+    return asyncio.run(fetch_dates_async(date_links, timeout))
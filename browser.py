@@ -0,0 +1,261 @@
+"""Pool of warm Chrome drivers shared by every scraper"""
+
+from contextlib import contextmanager
+from os import environ as ENV
+import threading
+import atexit
+import time
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium import webdriver
+
+from instrument import instrument_driver, span
+
+MAX_USES = 50  # tasks a driver may serve before it is replaced
+MAX_HEAP_MB = 512  # replace driver if page JS heap grows beyond this
+
+HEADLESS = ENV.get('BROWSER_HEADLESS', '1') != '0'
+PAGE_LOAD_STRATEGY = ENV.get('BROWSER_PAGE_LOAD_STRATEGY', 'eager')  # 'normal', 'eager' or 'none'
+WINDOW_SIZE = '1366,1024'
+BLOCKING = ENV.get('BROWSER_BLOCKING', '1') != '0'
+
+# Request url patterns (Network.setBlockedURLs wildcards) never needed to read bookings
+BLOCK_IMAGES = ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico']
+BLOCK_MEDIA = ['*.mp4', '*.webm', '*.mp3', '*.m4a', '*.ogg']
+BLOCK_FONTS = ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot', '*fonts.googleapis.com*',
+               '*fonts.gstatic.com*', '*use.typekit.net*']
+BLOCK_TRACKERS = ['*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+                  '*connect.facebook.net*', '*hotjar.com*', '*clarity.ms*', '*bat.bing.com*',
+                  '*tiktok.com*', '*linkedin.com/px*', '*newrelic.com*', '*nr-data.net*']
+BLOCK_COOKIE_BANNERS = ['*consent.cookiebot.com*', '*consentcdn.cookiebot.com*', '*cookie-script.com*',
+                        '*cdn.cookielaw.org*', '*onetrust.com*']
+
+BLOCK_SHARED = BLOCK_IMAGES + BLOCK_MEDIA + BLOCK_FONTS + BLOCK_TRACKERS + BLOCK_COOKIE_BANNERS
+
+# Patterns blocked while a driver works for each provider. Every provider blocks the same
+# patterns for now, none of the sites has been found to need any of them; the entries
+# are kept apart so one site can be tuned without changing the others
+BROWSER_PROFILES = {
+    'default': [],
+    'BETTER': BLOCK_SHARED,
+    'Everyone Active': BLOCK_SHARED,
+    'Places': BLOCK_SHARED,
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def chrome_options(headless: bool = HEADLESS, page_load_strategy: str = PAGE_LOAD_STRATEGY) -> webdriver.ChromeOptions:
+    """Return options every scraper browser is launched with"""
+
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument('--headless=new')
+    options.add_argument(f'--window-size={WINDOW_SIZE}')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--disable-background-networking')
+    options.add_argument('--mute-audio')
+    options.page_load_strategy = page_load_strategy
+
+    return options
+
+
+def new_driver(headless: bool = HEADLESS, page_load_strategy: str = PAGE_LOAD_STRATEGY) -> WebDriver:
+    """Launch a new Chrome driver, headless and not waiting for subresources by default"""
+
+    return webdriver.Chrome(options=chrome_options(headless, page_load_strategy))
+
+
+def block_urls(driver: WebDriver, patterns: list[str]) -> None:
+    """Make the browser fail every request matching any of the wildcard patterns"""
+
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+
+
+def get_heap_mb(driver: WebDriver) -> float:
+    """Return JS heap used by the current page in MB"""
+
+    heap = driver.execute_script(
+        "return window.performance.memory ? window.performance.memory.usedJSHeapSize : 0;")
+
+    return (heap or 0) / 2 ** 20
+
+
+def reset_driver(driver: WebDriver) -> None:
+    """Close extra tabs, leave any frame and clear cookies so the driver can be reused"""
+
+    driver.switch_to.default_content()
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+
+    driver.switch_to.window(handles[0])
+    driver.get('about:blank')
+    driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+
+
+def quit_driver(driver: WebDriver) -> None:
+    """Quit driver, ignoring drivers that have already crashed"""
+
+    try:
+        driver.quit()
+    except WebDriverException:
+        pass
+
+
+class BrowserPool:
+    """Hand out warm drivers to workers, resetting them between tasks and
+    replacing any that crash, grow too large or have served 'max_uses' tasks"""
+
+    def __init__(self, size: int, factory=new_driver, max_uses: int = MAX_USES,
+                 max_heap_mb: float = MAX_HEAP_MB):
+        self.size = size
+        self.factory = factory
+        self.max_uses = max_uses
+        self.max_heap_mb = max_heap_mb
+        self._idle = []
+        self._uses = {}
+        self._profiles = {}
+        self._count = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def acquire(self, timeout: float | None = None, profile: str = 'default') -> WebDriver:
+        """Return an idle driver, launching a new one if the pool is not full,
+        set up to block the requests of the provider's entry in BROWSER_PROFILES"""
+
+        driver = self._take(timeout)
+        with self._cond:
+            current = self._profiles.get(driver, 'default')
+        if not BLOCKING or current == profile:
+            return driver
+
+        try:
+            block_urls(driver, BROWSER_PROFILES[profile])
+        except WebDriverException:
+            self.discard(driver)
+            raise
+        with self._cond:
+            self._profiles[driver] = profile
+
+        return driver
+
+    def _take(self, timeout: float | None) -> WebDriver:
+        """Return an idle driver or a newly launched one, waiting for a free slot"""
+
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError('Browser pool is closed')
+                if self._idle:
+                    return self._idle.pop()
+                if self._count < self.size:
+                    self._count += 1
+                    break
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError('No browser became free in time')
+                self._cond.wait(remaining)
+
+        try:
+            with span('browser.launch'):
+                driver = instrument_driver(self.factory())
+        except BaseException:
+            with self._cond:
+                self._count -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._uses[driver] = 0
+
+        return driver
+
+    def release(self, driver: WebDriver, broken: bool = False) -> None:
+        """Return driver to the pool, or replace it if it is no longer fit for use"""
+
+        with self._cond:
+            self._uses[driver] = self._uses.get(driver, 0) + 1
+            worn_out = self._closed or self._uses[driver] >= self.max_uses
+
+        if not broken and not worn_out:
+            try:
+                with span('browser.reset'):
+                    worn_out = get_heap_mb(driver) > self.max_heap_mb
+                    if not worn_out:
+                        reset_driver(driver)
+            except WebDriverException:
+                broken = True
+
+        if broken or worn_out:
+            self.discard(driver)
+            return
+
+        with self._cond:
+            self._idle.append(driver)
+            self._cond.notify()
+
+    def discard(self, driver: WebDriver) -> None:
+        """Quit driver and free its slot in the pool"""
+
+        with self._cond:
+            self._profiles.pop(driver, None)
+            if self._uses.pop(driver, None) is not None:
+                self._count -= 1
+            self._cond.notify()
+        quit_driver(driver)
+
+    @contextmanager
+    def driver(self, timeout: float | None = None, profile: str = 'default'):
+        """Context manager lending a driver set up for a provider for the duration of a task"""
+
+        driver = self.acquire(timeout, profile)
+        try:
+            yield driver
+        except WebDriverException:
+            self.release(driver, broken=True)
+            raise
+        except BaseException:
+            self.release(driver)
+            raise
+        self.release(driver)
+
+    def close(self) -> None:
+        """Quit every idle driver, drivers still in use are quit on release"""
+
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+
+        for driver in idle:
+            self.discard(driver)
+
+
+def get_pool(size: int = 4, factory=None) -> BrowserPool:
+    """Return the process wide browser pool, growing it to at least 'size' drivers.
+    'factory' launches the pool's drivers, it only applies when the pool is created"""
+
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(size, factory or new_driver)
+            atexit.register(close_pool)
+        _pool.size = max(_pool.size, size)
+
+        return _pool
+
+
+def close_pool() -> None:
+    """Quit all drivers in the process wide pool"""
+
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
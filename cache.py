@@ -0,0 +1,167 @@
+"""On-disk key/value cache shared by every scraper process and thread"""
+
+from os import environ as ENV
+import threading
+import datetime
+import sqlite3
+import json
+import time
+import os
+
+from slots import parse_date
+
+CACHE_PATH = ENV.get('SCRAPER_CACHE',
+                     os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  '.cache', 'scraper.sqlite'))
+
+MISSING = object()
+
+# Scraped results stay fresh for less time the closer their date is to today,
+# as (days ahead, seconds) pairs checked in order
+RESULT_TTLS = ((1, 15 * 60), (7, 60 * 60))
+RESULT_TTL_FAR = 3 * 3600
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    expires REAL NOT NULL,
+    PRIMARY KEY (namespace, key));
+CREATE TABLE IF NOT EXISTS rate_limits (
+    host TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL);
+"""
+
+_local = threading.local()
+
+
+def connect(path: str, schema: str) -> sqlite3.Connection:
+    """Return a connection to an SQLite database created with 'schema' if needed,
+    one per thread and process"""
+
+    connections = getattr(_local, 'connections', None)
+    if connections is None or _local.pid != os.getpid():
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+
+    if path not in connections:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(schema)
+        connections[path] = conn
+
+    return connections[path]
+
+
+def get_connection(path: str = CACHE_PATH) -> sqlite3.Connection:
+    """Return a connection to the cache database, one per thread and process"""
+
+    return connect(path, CACHE_SCHEMA)
+
+
+def cache_get(namespace: str, key: str, default=None, path: str = CACHE_PATH):
+    """Return cached value for key, or default if it is missing or expired"""
+
+    row = get_connection(path).execute(
+        'SELECT value, expires FROM cache WHERE namespace = ? AND key = ?',
+        (namespace, key)).fetchone()
+
+    if row is None or row[1] < time.time():
+        return default
+
+    return json.loads(row[0])
+
+
+def cache_set(namespace: str, key: str, value, ttl: float, path: str = CACHE_PATH) -> None:
+    """Store a JSON serialisable value for 'ttl' seconds"""
+
+    get_connection(path).execute(
+        'INSERT OR REPLACE INTO cache (namespace, key, value, expires) VALUES (?, ?, ?, ?)',
+        (namespace, key, json.dumps(value), time.time() + ttl))
+
+
+def cache_delete(namespace: str, key: str | None = None, path: str = CACHE_PATH) -> None:
+    """Remove a single key, or every key of a namespace if key is None"""
+
+    if key is None:
+        get_connection(path).execute(
+            'DELETE FROM cache WHERE namespace = ?', (namespace,))
+    else:
+        get_connection(path).execute(
+            'DELETE FROM cache WHERE namespace = ? AND key = ?', (namespace, key))
+
+
+def result_ttl(date: str) -> float:
+    """Return seconds a scraped result for date stays fresh"""
+
+    day = parse_date(date)
+    if day is None:
+        return RESULT_TTLS[0][1]
+
+    days_ahead = (day - datetime.date.today()).days
+    for max_days, ttl in RESULT_TTLS:
+        if days_ahead <= max_days:
+            return ttl
+
+    return RESULT_TTL_FAR
+
+
+def result_key(*parts: str) -> str:
+    """Return cache key of a scraped result, e.g. provider, centre, activity and date"""
+
+    return '|'.join(parts)
+
+
+def get_result(provider: str, centre: str, activity: str, date: str, default=None):
+    """Return available slots of a date, as slots_to_json rows, if still fresh
+    ([] if it had none), else default"""
+
+    return cache_get('slots', result_key(provider, centre, activity, date), default)
+
+
+def set_result(provider: str, centre: str, activity: str, date: str, slots: list[list]) -> None:
+    """Store available slots of a date as slots_to_json rows, use [] for a date without any"""
+
+    cache_set('slots', result_key(provider, centre, activity, date), slots, result_ttl(date))
+
+
+def get_results(provider: str, centre: str, activity: str, dates: list[str]) -> dict | None:
+    """Return dict of available slots rows by date for dates that had any,
+    or None if any date is stale"""
+
+    dates_dict = {}
+    for date in dates:
+        slots = get_result(provider, centre, activity, date, MISSING)
+        if slots is MISSING:
+            return None
+        if slots:
+            dates_dict[date] = slots
+
+    return dates_dict
+
+
+def set_results(provider: str, centre: str, activity: str, dates: list[str], dates_dict: dict) -> None:
+    """Store every date read for an activity, dates missing from dates_dict had no slots"""
+
+    for date in dates:
+        set_result(provider, centre, activity, date, dates_dict.get(date, []))
+
+
+def get_result_dates(provider: str, centre: str, activity: str) -> list[str] | None:
+    """Return dates shown for an activity when it was last scraped"""
+
+    return cache_get('result_dates', result_key(provider, centre, activity))
+
+
+def set_result_dates(provider: str, centre: str, activity: str, dates: list[str]) -> None:
+    """Remember dates shown for an activity until the end of today, when they move on a day"""
+
+    tomorrow = datetime.datetime.combine(datetime.date.today() + datetime.timedelta(days=1),
+                                         datetime.time())
+
+    cache_set('result_dates', result_key(provider, centre, activity), dates,
+              tomorrow.timestamp() - time.time())
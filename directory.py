@@ -0,0 +1,166 @@
+"""Locally persisted directory of leisure centres per provider, indexed for nearest centre lookups"""
+
+import threading
+import math
+import time
+
+import numpy as np
+
+from cache import cache_get, cache_set
+from tools import distances_km
+
+DIRECTORY_TTL = 7 * 24 * 3600  # seconds before a provider's centre list is scraped again
+CELL_DEGREES = 0.25  # size of grid cells the centres are bucketed into
+KM_PER_DEGREE = 111.19
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class CentreIndex:
+    """Grid index over centre coordinates answering nearest-K queries
+    by searching rings of cells outwards from the query point"""
+
+    def __init__(self, centres: list[dict]):
+        self.centres = centres
+        self.coords = np.array([[x['lat'], x['lon']] for x in centres], dtype=float).reshape(-1, 2)
+        self.grid = {}
+        for i, centre in enumerate(centres):
+            self.grid.setdefault(self.cell(centre['lat'], centre['lon']), []).append(i)
+
+        rows = [x[0] for x in self.grid] or [0]
+        cols = [x[1] for x in self.grid] or [0]
+        self.extent = (min(rows), max(rows), min(cols), max(cols))
+
+    @staticmethod
+    def cell(lat: float, lon: float) -> tuple[int, int]:
+        """Return grid cell containing a coordinate"""
+
+        return math.floor(lat / CELL_DEGREES), math.floor(lon / CELL_DEGREES)
+
+    def ring(self, row: int, col: int, radius: int) -> list[int]:
+        """Return centres in cells exactly 'radius' cells away from (row, col)"""
+
+        if radius == 0:
+            return self.grid.get((row, col), [])
+
+        found = []
+        for i in range(-radius, radius + 1):
+            for cell in [(row - radius, col + i), (row + radius, col + i)]:
+                found.extend(self.grid.get(cell, []))
+            if abs(i) != radius:
+                for cell in [(row + i, col - radius), (row + i, col + radius)]:
+                    found.extend(self.grid.get(cell, []))
+
+        return found
+
+    def nearest(self, lat_lon: tuple[float, float], k: int) -> list[tuple[dict, float]]:
+        """Return up to k (centre, distance in km) pairs closest to lat_lon, nearest first"""
+
+        lat, lon = lat_lon
+        row, col = self.cell(lat, lon)
+        min_row, max_row, min_col, max_col = self.extent
+        max_radius = max(abs(row - min_row), abs(row - max_row),
+                         abs(col - min_col), abs(col - max_col))
+
+        candidates, distances = [], np.empty(0)
+        for radius in range(max_radius + 1):
+            ring = self.ring(row, col, radius)
+            if ring:
+                candidates.extend(ring)
+                distances = np.concatenate([distances, distances_km(lat_lon, self.coords[ring])])
+            if len(candidates) < k:
+                continue
+
+            # Anything outside the searched square is at least this far away
+            cell_km = CELL_DEGREES * KM_PER_DEGREE * math.cos(
+                math.radians(min(89.0, abs(lat) + (radius + 1) * CELL_DEGREES)))
+            if np.partition(distances, k - 1)[k - 1] <= radius * cell_km:
+                break
+
+        order = np.argsort(distances, kind='stable')[:k]
+
+        return [(self.centres[candidates[i]], float(distances[i])) for i in order]
+
+
+def load_directory(provider: str) -> dict | None:
+    """Return saved directory of a provider, None if it is missing or due a refresh.
+    A directory holds 'centres' (dicts with at least 'name', 'lat' and 'lon'), whether
+    it is 'complete' and, if not, the 'searches' ([lat, lon, radius km]) it was built from"""
+
+    return cache_get('directory', provider)
+
+
+def save_directory(provider: str, directory: dict) -> None:
+    """Save directory of a provider until it is due a refresh"""
+
+    cache_set('directory', provider, directory, DIRECTORY_TTL)
+    with _indexes_lock:
+        _indexes[provider] = (time.time(), directory, CentreIndex(directory['centres']))
+
+
+def get_directory_index(provider: str) -> tuple[dict | None, CentreIndex | None]:
+    """Return directory of a provider with its index, built once per process"""
+
+    with _indexes_lock:
+        if provider in _indexes and time.time() - _indexes[provider][0] < DIRECTORY_TTL:
+            return _indexes[provider][1:]
+
+    directory = load_directory(provider)
+    if directory is None:
+        return None, None
+
+    index = CentreIndex(directory['centres'])
+    with _indexes_lock:
+        _indexes[provider] = (time.time(), directory, index)
+
+    return directory, index
+
+
+def nearest_centres(provider: str, lat_lon: tuple[float, float], k: int) -> list[tuple[dict, float]] | None:
+    """Return the k centres of a provider closest to lat_lon with their distance in km.
+    Return None if the saved directory is missing, or was built from searches that
+    do not guarantee these are the closest centres"""
+
+    directory, index = get_directory_index(provider)
+    if directory is None:
+        return None
+
+    nearest = index.nearest(lat_lon, k)
+    if directory.get('complete'):
+        return nearest
+
+    if len(nearest) < k:
+        return None
+
+    # Every centre within radius of a search origin was found by that search
+    needed = nearest[-1][1]
+    searches = np.array(directory.get('searches', []), dtype=float).reshape(-1, 3)
+    if np.any(distances_km(lat_lon, searches[:, :2]) + needed <= searches[:, 2]):
+        return nearest
+
+    return None
+
+
+def add_search_results(provider: str, origin: tuple[float, float], centres: list[dict], key: str = 'name',
+                       skipped: dict[str, int] | None = None) -> None:
+    """Merge centres found by a search around origin into a provider's partial directory.
+    'centres' are those with coordinates, in the order the search listed them, nearest first.
+    'skipped' maps keys of centres that could not be placed to how many centres were listed
+    before them. The search only vouches for the area up to the first one skipped, so
+    lookups further out search again, and try to place them again"""
+
+    directory, _ = get_directory_index(provider)
+    directory = directory or {'centres': [], 'searches': [], 'complete': False}
+
+    merged = {x[key]: x for x in directory['centres']}
+    merged.update({x[key]: x for x in centres})
+    if skipped:
+        print(f"{provider} centres left out of the directory, without coordinates: "
+              f"{', '.join(skipped)}")
+        centres = centres[:min(skipped.values())]
+    radius = float(distances_km(origin, [[x['lat'], x['lon']] for x in centres]).max(initial=0))
+
+    save_directory(provider, {'centres': list(merged.values()),
+                              'searches': [*directory['searches'], [*origin, radius]],
+                              'complete': False})
@@ -0,0 +1,99 @@
+"""Local stand-in for the leisure centre websites, serving the synthetic pages in 'fixtures/'
+
+Run with:  python fixture_server.py --port 8000 --latency 0.2 --jitter 0.1
+"""
+
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import urlsplit, unquote
+import mimetypes
+import threading
+import argparse
+import random
+import time
+import os
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def fixture_path(url_path: str, root: str = FIXTURES_DIR) -> str | None:
+    """Return fixture file served for a request path, e.g.
+    '/a/b?date=1' -> 'a/b__date=1.json', '/a/b/' -> 'a/b/index.html'"""
+
+    parts = urlsplit(url_path)
+    path = os.path.normpath(unquote(parts.path)).lstrip('/\\')
+    if path.startswith('..'):
+        return None
+
+    base = os.path.join(root, path)
+    if parts.query:
+        base = f"{base}__{unquote(parts.query).replace('/', '_')}"
+
+    for candidate in [base, base + '.html', base + '.json', os.path.join(base, 'index.html')]:
+        if os.path.isfile(candidate):
+            return candidate
+
+    return None
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Serve fixture files after a configurable delay"""
+
+    def do_GET(self):
+        latency, jitter = self.server.latency, self.server.jitter
+        if latency or jitter:
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+
+        path = fixture_path(self.path, self.server.root)
+        if path is None:
+            self.send_error(404)
+            return
+
+        with open(path, 'rb') as f:
+            body = f.read()
+
+        self.send_response(200)
+        content_type = mimetypes.guess_type(path)[0] or 'text/html'
+        if content_type.startswith('text/') or content_type.endswith('javascript'):
+            content_type += '; charset=utf-8'
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def serve_fixtures(port: int = 0, latency: float = 0.0, jitter: float = 0.0, root: str = FIXTURES_DIR,
+                   verbose: bool = False) -> tuple[ThreadingHTTPServer, str]:
+    """Start fixture server in a background thread and return it with its base url"""
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), FixtureHandler)
+    server.daemon_threads = True
+    server.latency, server.jitter = latency, jitter
+    server.root, server.verbose = root, verbose
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='maximum random +/- seconds added to latency')
+    options = parser.parse_args()
+
+    fixture_server, base_url = serve_fixtures(options.port, options.latency, options.jitter,
+                                              verbose=True)
+    print(f'Serving {FIXTURES_DIR} at {base_url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fixture_server.shutdown()
@@ -0,0 +1,26 @@
+// Stand-in for the BETTER booking app: hydrates a date page from the times API,
+// showing the no content message when the API has nothing for the date
+(function () {
+  var parts = window.location.pathname.replace(/\/$/, '').split('/');
+  var venue = parts[parts.length - 5], activity = parts[parts.length - 3], date = parts[parts.length - 2];
+  var root = document.getElementById('root');
+
+  function render(slots) {
+    if (!slots.length) {
+      root.innerHTML = '<div class="ByTimeListComponent__Wrapper-sc-39liwv-1 ByTimeListComponent__NoContentWrapper-sc-39liwv-2 SqNmL cUXVSN">No sessions available</div>';
+      return;
+    }
+    root.innerHTML = '<div class="ByTimeListComponent__Wrapper-sc-39liwv-1 fRLwqK">' + slots.map(function (slot) {
+      return '<div class="ClassCardComponent__Wrapper-sc-1v7d176-0 kDfMZx">' +
+        '<span class="ClassCardComponent__ClassTime-sc-1v7d176-3 jaVGAY">' + slot.starts_at.format_24_hour + ' - ' + slot.ends_at.format_24_hour + '</span>' +
+        '<span class="ClassCardComponent__Price-sc-1v7d176-14 jumCLU">' + slot.price.formatted_amount + '</span>' +
+        '<div class="ContextualComponent__BookWrap-sc-eu3gk6-1 buJCkX" spaces="' + slot.spaces + '"><a href="#">' + slot.spaces + ' spaces available</a></div>' +
+        '</div>';
+    }).join('') + '</div>';
+  }
+
+  fetch('/better/api/activities/venue/' + venue + '/activity/' + activity + '/times?date=' + date)
+    .then(function (response) { return response.ok ? response.json() : {data: []}; })
+    .then(function (json) { render(json.data || []); })
+    .catch(function () { render([]); });
+})();
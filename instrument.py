@@ -0,0 +1,243 @@
+"""Timing of scraper phases per centre and activity, exported as a Chrome trace and a summary table
+
+Tracing is off, and costs next to nothing, until enable_tracing() is called (main.py --trace)
+or the SCRAPER_TRACE environment variable names a file to write the trace to at exit.
+Traces open in chrome://tracing or https://ui.perfetto.dev"""
+
+from contextlib import contextmanager
+from collections import Counter
+from functools import wraps
+from os import environ as ENV
+import threading
+import atexit
+import json
+import time
+import os
+
+TRACE_PATH = ENV.get('SCRAPER_TRACE')
+CPU_SAMPLE_INTERVAL = 0.5  # seconds between samples of each thread's CPU time
+
+_enabled = False
+_events = []
+_stats = {}
+_counters = Counter()
+_thread_names = {}
+_lock = threading.Lock()
+_origin = time.perf_counter()
+_sampler_stop = threading.Event()
+
+
+def tracing_enabled() -> bool:
+    """Return whether phases are being recorded"""
+
+    return _enabled
+
+
+def enable_tracing(sample_cpu: bool = True) -> None:
+    """Start recording phases, counters and, if sample_cpu, the CPU use of every thread"""
+
+    global _enabled
+    with _lock:
+        if _enabled:
+            return
+        _enabled = True
+
+    if sample_cpu and hasattr(time, 'pthread_getcpuclockid'):
+        _sampler_stop.clear()
+        threading.Thread(target=sample_cpu_loop, name='cpu_sampler', daemon=True).start()
+
+
+def disable_tracing() -> None:
+    """Stop recording, keeping what was recorded so far"""
+
+    global _enabled
+    _enabled = False
+    _sampler_stop.set()
+
+
+def reset_tracing() -> None:
+    """Forget all recorded events, phase timings and counters"""
+
+    with _lock:
+        _events.clear()
+        _stats.clear()
+        _counters.clear()
+        _thread_names.clear()
+
+
+def timestamp_us(seconds: float) -> float:
+    """Return trace timestamp in microseconds of a time.perf_counter() reading"""
+
+    return (seconds - _origin) * 1e6
+
+
+def add_event(event: dict) -> None:
+    """Append a trace event of the current thread, naming the thread the first time it is seen"""
+
+    thread = threading.current_thread()
+    event = {'pid': os.getpid(), 'tid': thread.ident, **event}
+    with _lock:
+        if thread.ident not in _thread_names:
+            _thread_names[thread.ident] = thread.name
+            _events.append({'ph': 'M', 'name': 'thread_name', 'pid': event['pid'],
+                            'tid': thread.ident, 'args': {'name': thread.name}})
+        _events.append(event)
+
+
+def add_span(name: str, start: float, seconds: float, cpu: float | None = None,
+             category: str = 'phase', args: dict | None = None) -> None:
+    """Record a finished phase that started at time.perf_counter() 'start' and took 'seconds'"""
+
+    if not _enabled:
+        return
+
+    args = dict(args or {})
+    if cpu is not None:
+        args['cpu_ms'] = round(cpu * 1000, 3)
+    add_event({'ph': 'X', 'name': name, 'cat': category, 'ts': timestamp_us(start),
+               'dur': seconds * 1e6, 'args': args})
+
+    with _lock:
+        stats = _stats.setdefault(name, {'calls': 0, 'total': 0.0, 'max': 0.0, 'cpu': 0.0})
+        stats['calls'] += 1
+        stats['total'] += seconds
+        stats['max'] = max(stats['max'], seconds)
+        stats['cpu'] += cpu or 0.0
+
+
+@contextmanager
+def span(name: str, category: str = 'phase', **args):
+    """Time the enclosed block as a phase, e.g. span('ea.activity', centre=..., activity=...)"""
+
+    if not _enabled:
+        yield
+        return
+
+    start, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        add_span(name, start, time.perf_counter() - start, time.thread_time() - cpu, category, args)
+
+
+def traced(name: str | None = None, category: str = 'phase'):
+    """Decorator timing every call of a function as a phase"""
+
+    def decorator(fn):
+        phase = name or f'{fn.__module__}.{fn.__name__}'
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with span(phase, category):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add n to a counter such as 'retries' or 'timeouts'"""
+
+    if not _enabled:
+        return
+
+    with _lock:
+        _counters[name] += n
+        total = _counters[name]
+    add_event({'ph': 'C', 'name': name, 'ts': timestamp_us(time.perf_counter()),
+               'args': {'count': total}})
+
+
+def instrument_driver(driver):
+    """Count and time every WebDriver command the driver (or any of its elements) sends"""
+
+    execute = driver.execute
+
+    def traced_execute(driver_command, params=None):
+        if not _enabled:
+            return execute(driver_command, params)
+
+        start = time.perf_counter()
+        try:
+            return execute(driver_command, params)
+        finally:
+            seconds = time.perf_counter() - start
+            with _lock:
+                _counters['webdriver_commands'] += 1
+                _counters[f'webdriver.{driver_command}'] += 1
+            add_span(f'webdriver.{driver_command}', start, seconds, category='webdriver')
+
+    driver.execute = traced_execute
+
+    return driver
+
+
+def sample_cpu_loop() -> None:
+    """Record the share of a CPU each thread used since the previous sample, until stopped"""
+
+    previous = {}
+    while _enabled:
+        sample = {}
+        for thread in threading.enumerate():
+            try:
+                cpu = time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+            except (OSError, TypeError, ValueError):
+                continue
+            if thread.ident in previous:
+                sample[thread.name] = round(100 * (cpu - previous[thread.ident]) / CPU_SAMPLE_INTERVAL, 1)
+            previous[thread.ident] = cpu
+
+        if sample:
+            add_event({'ph': 'C', 'name': 'cpu %', 'ts': timestamp_us(time.perf_counter()),
+                       'args': sample})
+        if _sampler_stop.wait(CPU_SAMPLE_INTERVAL):
+            return
+
+
+def export_trace(path: str) -> None:
+    """Write recorded events as Chrome trace JSON"""
+
+    with _lock:
+        events = list(_events)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def trace_summary() -> str:
+    """Return table of recorded phases, slowest total first, followed by the counters"""
+
+    lines = [f"{'phase':<40}{'calls':>7}{'total s':>10}{'mean s':>9}{'max s':>8}{'cpu s':>8}"]
+    with _lock:
+        phases = sorted(_stats.items(), key=lambda x: -x[1]['total'])
+        counters = sorted(_counters.items(), key=lambda x: -x[1])
+
+    for name, stats in phases:
+        lines.append(f"{name[:39]:<40}{stats['calls']:>7}{stats['total']:>10.3f}"
+                     f"{stats['total'] / stats['calls']:>9.3f}{stats['max']:>8.3f}{stats['cpu']:>8.3f}")
+
+    if counters:
+        lines.append('')
+        lines.append(f"{'counter':<40}{'count':>7}")
+        lines.extend(f"{name[:39]:<40}{value:>7}" for name, value in counters)
+
+    return '\n'.join(lines)
+
+
+def write_trace_at_exit(path: str) -> None:
+    """Export the trace and print its summary when the process exits"""
+
+    def write() -> None:
+        export_trace(path)
+        print(trace_summary())
+        print(f'Trace written to {path}')
+
+    atexit.register(write)
+
+
+if TRACE_PATH:
+    enable_tracing()
+    write_trace_at_exit(TRACE_PATH)
@@ -1,85 +1,105 @@
-"""Script to run search for all bookings (BETTER and Everyone Active leisure centres) available for specific sports hall activity"""
+"""Script to run search for all bookings (BETTER, Everyone Active and Places Leisure centres) available for specific sports hall activity"""
 
+from concurrent.futures import ThreadPoolExecutor
 from os import environ as ENV
 from multiprocessing import cpu_count
+import argparse
+import csv
 
 from dotenv import load_dotenv
 
-from BETTER import scrape_better_website
-from EA import scrape_ea_website
-
-
-def write_save_avail(data, home, act):
-    """Save all booking information to text file"""
-    if data is None:
-        print('dict is empty')
-        return
-
-    with open(f"Available {act} slots.txt", "w+") as f:
-        f.write(f"Home Address: {home}\n")
-        f.write(f"Activity: {act}\n")
-        for centre_name, centre_info in data:
-            f.write(
-                "\n=============================================================\n")
-            f.write("\n\n" + centre_name + ":\n")
-            f.write("---------------------------\n")
-            f.write(f"Company: {centre_info['Company']}\n")
-            f.write(f"Address: {centre_info['Address']}\n")
-            if centre_info['Distance'] is None:
-                f.write(f"Distance: Not Found")
-            else:
-                f.write(f"Distance: {centre_info['Distance']}km\n")
-            for activity in list(centre_info['Activity'].keys()):
-                f.write("\n\n-->" + activity + ":")
-                for date in list(centre_info['Activity'][activity].keys()):
-                    f.write("\n   " + date + ":")
-
-                    f.write("\n       " + "Times:  ")
-                    for time in centre_info['Activity'][activity][date]['Times']:
-                        str_len_time = len(time) + 1
-                        f.write(time + " | ")
-
-                    f.write("\n       " + "Prices: ")
-                    for price in centre_info['Activity'][activity][date]['Prices']:
-                        str_len_price = len(price)
-                        spaces = str_len_time - str_len_price - 1
-                        f.write("£" + price + " " * int(spaces) + "| ")
-
-                    f.write("\n       " + "Spaces: ")
-                    for courts in centre_info['Activity'][activity][date]['Spaces']:
-                        str_len_space = len(courts)
-                        spaces = str_len_time - str_len_space
-                        f.write(courts + " " * int(spaces) + "| ")
+from providers import get_providers
+from scheduler import get_scheduler
+from report import ReportStream, report_path
+from store import save_centres
+from instrument import enable_tracing, write_trace_at_exit
+
+
+def read_queries(path: str) -> list[tuple[str, str]]:
+    """Read (postcode, activity) queries from a csv file with one 'postcode,activity' per line.
+    Blank lines and lines starting with '#' are skipped"""
+
+    with open(path, newline='', encoding='utf-8') as f:
+        return [(row[0].strip(), row[1].strip()) for row in csv.reader(f)
+                if len(row) >= 2 and not row[0].strip().startswith('#')]
 
 
 if __name__ == '__main__':
 
     load_dotenv()
 
-    postcode = ENV['POSTCODE']
-    activity = ENV['ACTIVITY']
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch', metavar='FILE',
+                        help="csv file of 'postcode,activity' queries to run together, "
+                             "instead of POSTCODE and ACTIVITY from the environment")
+    parser.add_argument('--providers', metavar='NAMES', default=ENV.get('PROVIDERS'),
+                        help="comma separated providers to search, from better, ea and places "
+                             "(default: all, or the PROVIDERS environment variable)")
+    parser.add_argument('--list', choices=('centres', 'activities'),
+                        help="print the nearest centres of each provider, or their activities, "
+                             "instead of searching for bookings")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="time every scraping phase and write a Chrome trace to FILE, "
+                             "printing a summary at the end")
+    args = parser.parse_args()
+
+    try:
+        providers = get_providers(args.providers)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.trace:
+        enable_tracing()
+        write_trace_at_exit(args.trace)
+
+    if args.batch:
+        queries = read_queries(args.batch)
+    elif args.list:
+        queries = [(ENV['POSTCODE'], '')]
+    else:
+        queries = [(ENV['POSTCODE'], ENV['ACTIVITY'])]
 
     """
     If you have slower internet or computer please either reduce 'cpu_cores' or increase 'timeout'
     
     --> max_centres - Search upto this many closest centres.
-    --> cpu_cores - Number of parallel browsers that can be open at the same time
+    --> cpu_cores - Number of parallel browsers that can be open at the same time, shared by all providers
     --> timeout - maximum time script waits for html elements to load.
+    --> backend - 'selenium' reads BETTER date pages in the browser, 'http' fetches them concurrently without it.
     """
-    better_dict, ea_dict = {}, {}
-    better_dict = scrape_better_website(postcode, activity, max_centres=5,
-                                        cpu_cores=cpu_count(), timeout=10)
-    ea_dict = scrape_ea_website(postcode, activity, max_centres=5,
-                                cpu_cores=cpu_count(), timeout=10)
-
-    all_dict = {}
-    for i in [better_dict, ea_dict]:
-        all_dict = all_dict | i
-
-    dict_list = [x for x in all_dict.items()]
-    dict_list_sorted = sorted(dict_list,
-                              key=lambda x: x[1]['Distance']
-                              if x[1]['Distance']
-                              is not None else 99999)
-
-    write_save_avail(dict_list_sorted, postcode, activity)
+    cpu_cores = cpu_count()
+
+    if args.list:
+        for postcode in dict.fromkeys(x[0] for x in queries):
+            print(f'Centres near {postcode}:')
+            for provider in providers:
+                for centre in provider.discover_centres(postcode, max_centres=5, timeout=10):
+                    print(f"  {provider.company}: {centre['name']} ({centre['distance']}km)")
+                    if args.list == 'activities':
+                        print(f"    {', '.join(provider.list_activities(centre, timeout=10)) or 'None found'}")
+        raise SystemExit
+
+    get_scheduler(cpu_cores)
+
+    # Centres are written to each query's report as they finish, then sorted at the end
+    streams = [ReportStream(postcode, activity, report_path(postcode, activity, bool(args.batch)))
+               for postcode, activity in queries]
+
+    def on_result(index, centre_dict):
+        streams[index].add(centre_dict)
+        save_centres(*queries[index], centre_dict)
+
+    # Providers run side by side, their centre tasks share the scheduler's workers. A provider
+    # that fails is reported and the others' centres still make it into the reports
+    try:
+        with ThreadPoolExecutor(len(providers), thread_name_prefix='provider') as executor:
+            futures = {executor.submit(x.fetch, queries, max_centres=5, cpu_cores=cpu_cores,
+                                       timeout=10, on_result=on_result): x for x in providers}
+            for future, provider in futures.items():
+                try:
+                    future.result()
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    print(f'{provider.company} search failed: {type(e).__name__}: {e}')
+    finally:
+        for stream in streams:
+            stream.finish()
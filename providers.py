@@ -0,0 +1,79 @@
+"""Registry of booking providers. A provider module, and the browser and geocoding libraries
+it needs, is only imported once the provider is used, so runs selecting a few providers
+never load the others"""
+
+from importlib import import_module
+from os import environ as ENV
+from typing import Callable
+import threading
+
+
+class Provider:
+    """A booking provider behind the interface shared by all of them:
+    discover_centres(postcode, max_centres, timeout) -> [{'name', 'address', 'link', 'distance'}]
+    list_activities(centre, timeout) -> [activity name]
+    and a batch function fetching availability for (postcode, activity) queries.
+    'env_options' maps extra batch arguments to (environment variable, default)"""
+
+    def __init__(self, name: str, company: str, module_name: str, batch_name: str,
+                 env_options: dict[str, tuple[str, str]] | None = None):
+        self.name = name
+        self.company = company
+        self.module_name = module_name
+        self.batch_name = batch_name
+        self.env_options = env_options or {}
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def module(self):
+        """Return the provider module, importing it on first use"""
+
+        with self._lock:
+            if self._module is None:
+                self._module = import_module(self.module_name)
+
+            return self._module
+
+    def discover_centres(self, postcode: str, max_centres: int = 10, timeout: int = 10) -> list[dict]:
+        """Return the closest 'max_centres' centres to postcode, ordered by distance"""
+
+        return self.module.discover_centres(postcode, max_centres, timeout)
+
+    def list_activities(self, centre: dict, timeout: int = 10) -> list[str]:
+        """Return names of the activities that can be booked at a centre"""
+
+        return self.module.list_activities(centre, timeout)
+
+    def fetch(self, queries: list[tuple[str, str]], max_centres: int = 20, cpu_cores: int = 4,
+              timeout: int = 10, on_result: Callable[[int, dict], None] | None = None) -> list[dict] | None:
+        """Return available bookings for each (postcode, activity) query, or call on_result with
+        (query index, centre dict) as each centre is done, as the provider's batch function does"""
+
+        options = {k: ENV.get(var, default) for k, (var, default) in self.env_options.items()}
+
+        return getattr(self.module, self.batch_name)(queries, max_centres=max_centres, cpu_cores=cpu_cores,
+                                                     timeout=timeout, on_result=on_result, **options)
+
+
+PROVIDERS = {x.name: x for x in (
+    Provider('better', 'BETTER', 'BETTER', 'scrape_better_batch',
+             {'backend': ('BETTER_BACKEND', 'selenium')}),
+    Provider('ea', 'Everyone Active', 'EA', 'scrape_ea_batch'),
+    Provider('places', 'Places Leisure', 'Places', 'scrape_places_batch'),
+)}
+
+
+def get_providers(names: str | None = None) -> list[Provider]:
+    """Return providers named in a comma separated list, all of them if names is empty.
+    Raise ValueError for unknown names"""
+
+    if not names:
+        return list(PROVIDERS.values())
+
+    selected = list(dict.fromkeys(x.strip().lower() for x in names.split(',') if x.strip()))
+    unknown = [x for x in selected if x not in PROVIDERS]
+    if unknown:
+        raise ValueError(f"Unknown providers {', '.join(unknown)}, expected some of {', '.join(PROVIDERS)}")
+
+    return [PROVIDERS[x] for x in selected]
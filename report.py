@@ -0,0 +1,150 @@
+"""Writing found bookings to text reports, streamed centre by centre as providers finish them"""
+
+import threading
+import json
+import os
+
+from slots import (slot_days, slots_on, format_time_range, format_price, format_spaces,
+                   slots_to_json, slots_from_json)
+
+
+def report_path(postcode: str, act: str, batch: bool) -> str:
+    """Return file name of the report for a query"""
+
+    if batch:
+        return f"Available {act} slots ({postcode}).txt"
+
+    return f"Available {act} slots.txt"
+
+
+def stream_path(path: str) -> str:
+    """Return file name of the JSONL stream kept next to a report"""
+
+    return os.path.splitext(path)[0] + '.jsonl'
+
+
+def distance_key(centre: tuple[str, dict]) -> float:
+    """Sort key putting centres without a distance last"""
+
+    return centre[1]['Distance'] if centre[1]['Distance'] is not None else 99999
+
+
+def sort_by_distance(*provider_dicts: dict) -> list[tuple[str, dict]]:
+    """Merge centre dicts of all providers and order centres by distance"""
+
+    all_dict = {}
+    for i in provider_dicts:
+        all_dict = all_dict | i
+
+    return sorted(all_dict.items(), key=distance_key)
+
+
+def format_header(home: str, act: str) -> str:
+    """Return report lines naming the query"""
+
+    return f"Home Address: {home}\nActivity: {act}\n"
+
+
+def format_centre(centre_name: str, centre_info: dict) -> str:
+    """Return report section listing the bookings of one centre"""
+
+    lines = ["\n=============================================================\n",
+             "\n\n" + centre_name + ":\n",
+             "---------------------------\n",
+             f"Company: {centre_info['Company']}\n",
+             f"Address: {centre_info['Address']}\n"]
+    if centre_info['Distance'] is None:
+        lines.append("Distance: Not Found")
+    else:
+        lines.append(f"Distance: {centre_info['Distance']}km\n")
+
+    for activity, slots in centre_info['Activity'].items():
+        lines.append("\n\n-->" + activity + ":")
+        for day in slot_days(slots):
+            day_slots = slots_on(slots, day)
+            times = [format_time_range(x) for x in day_slots]
+            widths = [len(x) for x in times]
+            lines.append(f"\n   {day:%a %d %b %Y}:")
+            lines.append("\n       Times:  " + ''.join(f"{x} | " for x in times))
+            lines.append("\n       Prices: " + ''.join(
+                f"{format_price(x):<{w}} | " for x, w in zip(day_slots['price'], widths)))
+            lines.append("\n       Spaces: " + ''.join(
+                f"{format_spaces(x):<{w}} | " for x, w in zip(day_slots['spaces'], widths)))
+
+    return ''.join(lines)
+
+
+def write_save_avail(data, home, act, path=None):
+    """Save all booking information to text file"""
+    if data is None:
+        print('dict is empty')
+        return
+
+    with open(path or f"Available {act} slots.txt", "w+", encoding="utf-8") as f:
+        f.write(format_header(home, act))
+        for centre_name, centre_info in data:
+            f.write(format_centre(centre_name, centre_info))
+
+
+def centre_to_json(centre_name: str, centre_info: dict) -> dict:
+    """Return a centre as a JSON serialisable dict, with slots as slots_to_json rows"""
+
+    return {'Centre': centre_name, **centre_info,
+            'Activity': {k: slots_to_json(v) for k, v in centre_info['Activity'].items()}}
+
+
+def centre_from_json(data: dict) -> tuple[str, dict]:
+    """Return (name, centre info) of a centre saved with centre_to_json"""
+
+    centre_info = dict(data)
+    centre_name = centre_info.pop('Centre')
+    centre_info['Activity'] = {k: slots_from_json(v) for k, v in centre_info['Activity'].items()}
+
+    return centre_name, centre_info
+
+
+class ReportStream:
+    """Append centres to a JSONL stream and the text report as soon as they are found,
+    then rewrite the report ordered by distance once every provider has finished"""
+
+    def __init__(self, home: str, act: str, path: str):
+        self.home, self.act, self.path = home, act, path
+        self.jsonl_path = stream_path(path)
+        self._lock = threading.Lock()
+
+        with open(self.jsonl_path, 'w', encoding='utf-8'):
+            pass
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(format_header(home, act))
+
+    def add(self, centre_dict: dict | None) -> None:
+        """Write centres with bookings of a {name: centre info} dict, safe to call from any thread"""
+
+        centre_dict = {k: v for k, v in (centre_dict or {}).items() if v['Activity']}
+        if not centre_dict:
+            return
+
+        with self._lock:
+            with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                for centre_name, centre_info in centre_dict.items():
+                    f.write(json.dumps(centre_to_json(centre_name, centre_info)) + '\n')
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for centre_name, centre_info in centre_dict.items():
+                    f.write(format_centre(centre_name, centre_info))
+
+    def read(self) -> list[tuple[str, dict]]:
+        """Return centres written so far, in the order they were found"""
+
+        centres = []
+        with open(self.jsonl_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    centres.append(centre_from_json(json.loads(line)))
+
+        return centres
+
+    def finish(self) -> None:
+        """Rewrite the report with centres ordered by distance"""
+
+        with self._lock:
+            write_save_avail(sorted(self.read(), key=distance_key), self.home, self.act, self.path)
@@ -0,0 +1,233 @@
+"""Retries with backoff, per-host circuit breakers and request rate limits shared by every
+scraper process, so a slow or failing site is not asked for more while it struggles"""
+
+from os import environ as ENV
+from typing import Callable
+from urllib.parse import urlsplit
+import threading
+import random
+import time
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from cache import get_connection
+from instrument import count, span
+from scheduler import check_cancelled
+
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5  # seconds the first retry waits at most, doubled for each further retry
+BACKOFF_MAX = 10.0  # longest wait between retries
+FAILURE_THRESHOLD = 5  # failures in a row that open the circuit of a host
+OPEN_SECONDS = 30.0  # seconds an open circuit turns calls away before letting one through
+
+# (requests per second, burst) allowed per host over every process, None for no limit
+DEFAULT_RATE_LIMIT = (float(ENV.get('SCRAPER_RATE_LIMIT', 4)), 8)
+RATE_LIMITS = {
+    'nominatim.openstreetmap.org': (1.0, 1),  # usage policy allows one request a second
+    '127.0.0.1': None,
+    'localhost': None,
+}
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitBreaker:
+    """Turn calls to a host away after FAILURE_THRESHOLD failures in a row,
+    letting one call through every OPEN_SECONDS to see if it has recovered"""
+
+    def __init__(self, host: str, failure_threshold: int = FAILURE_THRESHOLD,
+                 open_seconds: float = OPEN_SECONDS):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.failures = 0
+        self.opened = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Return whether a call may go ahead"""
+
+        with self._lock:
+            if self.opened is None:
+                return True
+
+            if time.monotonic() - self.opened >= self.open_seconds:
+                self.opened = time.monotonic()
+                return True
+
+            return False
+
+    def reopens_in(self) -> float:
+        """Return seconds until an open circuit lets a call through again, 0 if it is closed"""
+
+        with self._lock:
+            if self.opened is None:
+                return 0.0
+
+            return max(0.0, self.opened + self.open_seconds - time.monotonic())
+
+    def record_success(self) -> None:
+        """Close the circuit after a call succeeded"""
+
+        with self._lock:
+            self.failures = 0
+            self.opened = None
+
+    def record_failure(self) -> None:
+        """Count a failed call, opening the circuit once there are too many in a row"""
+
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold and self.opened is None:
+                self.opened = time.monotonic()
+                count('circuit_opened')
+                print(f'{self.host} keeps failing, pausing requests for {self.open_seconds:g}s')
+
+
+def host_of(url: str) -> str:
+    """Return host name of a url"""
+
+    return urlsplit(url).hostname or ''
+
+
+def get_breaker(host: str) -> CircuitBreaker:
+    """Return the circuit breaker of a host, shared by every thread of this process"""
+
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+
+        return _breakers[host]
+
+
+def wait_for_circuit(breaker: CircuitBreaker) -> None:
+    """Wait until the circuit of a host lets a call through. Raise TaskCancelled if the task
+    waiting is cancelled or runs past its time limit meanwhile"""
+
+    if breaker.allow():
+        return
+
+    count('circuit_waits')
+    with span('circuit_wait', host=breaker.host):
+        while not breaker.allow():
+            check_cancelled()
+            time.sleep(min(1.0, max(0.01, breaker.reopens_in())))
+
+
+def take_token(host: str, rate: float, burst: int) -> float:
+    """Take a request token of a host from the bucket in the cache database, shared by every
+    process. Return seconds to wait before using it, 0 if one was free"""
+
+    conn = get_connection()
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT tokens, updated FROM rate_limits WHERE host = ?',
+                           (host,)).fetchone()
+        tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+        tokens -= 1
+        conn.execute('INSERT OR REPLACE INTO rate_limits (host, tokens, updated) VALUES (?, ?, ?)',
+                     (host, tokens, now))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+    return max(0.0, -tokens / rate)
+
+
+def rate_limit(host: str) -> None:
+    """Wait until a request to host fits within its rate limit"""
+
+    limit = RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT)
+    if limit is None:
+        return
+
+    wait = take_token(host, *limit)
+    if wait:
+        count('rate_limited')
+        with span('rate_limit', host=host):
+            time.sleep(wait)
+
+
+def backoff(attempt: int) -> None:
+    """Sleep before retry number attempt + 1: a random time up to BACKOFF_BASE * 2 ** attempt
+    seconds (capped at BACKOFF_MAX), so workers retrying the same host spread out"""
+
+    check_cancelled()
+    time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+    check_cancelled()
+
+
+def retry_call(fn: Callable, host: str, retries: int = MAX_RETRIES,
+               retry_on: tuple[type[Exception], ...] = (Exception,), name: str = 'call'):
+    """Return fn(), called once host's rate limit and circuit allow and retried with backoff on
+    the retry_on exceptions. Raise the last failure"""
+
+    breaker = get_breaker(host)
+    for attempt in range(retries + 1):
+        wait_for_circuit(breaker)
+        rate_limit(host)
+        try:
+            result = fn()
+        except retry_on as e:
+            breaker.record_failure()
+            if attempt == retries:
+                raise
+            count('retries')
+            print(f'Retrying {name} ({type(e).__name__}), attempt {attempt + 1}')
+            backoff(attempt)
+        else:
+            breaker.record_success()
+            return result
+
+    return None
+
+
+def open_page(driver: WebDriver, url: str) -> None:
+    """Load url once its host's rate limit allows, waiting first while the host's circuit is
+    open. Only a page that fails to load counts as a failure of the host"""
+
+    breaker = get_breaker(host_of(url))
+    wait_for_circuit(breaker)
+    rate_limit(host_of(url))
+    try:
+        driver.get(url)
+    except WebDriverException:
+        breaker.record_failure()
+        raise
+
+    breaker.record_success()
+
+
+def retry_page(driver: WebDriver, read: Callable[[WebDriver], object], retries: int = MAX_RETRIES,
+               retry_on: tuple[type[Exception], ...] = (TimeoutException,), name: str = 'page',
+               default=None):
+    """Return read(driver) for the page the driver is on, reloading the page with backoff
+    while read raises one of retry_on. Return default once retries run out. A read that
+    fails on a page that loaded is not held against the host, only reloads that fail are"""
+
+    url = driver.current_url
+    breaker = get_breaker(host_of(url))
+    for attempt in range(retries + 1):
+        if attempt:
+            backoff(attempt - 1)
+            wait_for_circuit(breaker)
+            rate_limit(host_of(url))
+            count('retries')
+            print(f'Retrying {name} {url}, attempt {attempt}')
+            try:
+                driver.refresh()
+            except WebDriverException:
+                breaker.record_failure()
+                raise
+            breaker.record_success()
+
+        try:
+            return read(driver)
+        except retry_on:
+            continue
+
+    return default
@@ -0,0 +1,311 @@
+"""Scheduler running the scraping tasks of every provider under one concurrency limit"""
+
+from concurrent.futures import Future, as_completed, FIRST_COMPLETED
+from concurrent.futures import wait as wait_futures
+from os import environ as ENV
+from typing import Callable
+import itertools
+import threading
+import atexit
+import heapq
+import time
+
+from tqdm import tqdm
+
+TASK_TIME_LIMIT = float(ENV.get('SCRAPER_TASK_TIME_LIMIT', 300))  # seconds a mapped task may run
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+_current = threading.local()
+
+
+class TaskCancelled(Exception):
+    """Raised inside a task that was cancelled or ran past its time limit"""
+
+
+class Task:
+    """A queued call and the future its result is set on"""
+
+    def __init__(self, fn, args: tuple, kwargs: dict, time_limit: float | None):
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+        self.time_limit = time_limit
+        self.future = Future()
+        self.deadline = None
+        self.cancelled = False
+
+    def run(self) -> None:
+        """Run the call on this thread, unless the future was cancelled while queued"""
+
+        if not self.future.set_running_or_notify_cancel():
+            return
+
+        if self.time_limit is not None:
+            self.deadline = time.monotonic() + self.time_limit
+        _current.task = self
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except BaseException as e:  # pylint: disable=broad-exception-caught
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+        finally:
+            _current.task = None
+
+    def check(self) -> None:
+        """Raise TaskCancelled if the task was cancelled or is past its time limit"""
+
+        if self.cancelled:
+            raise TaskCancelled('task was cancelled')
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise TaskCancelled(f'task ran past its {self.time_limit:g}s time limit')
+
+
+def check_cancelled() -> None:
+    """Stop the task running on this thread, by raising TaskCancelled, if it was cancelled or
+    is past its time limit. Called from waits and retry loops, does nothing outside tasks"""
+
+    task = getattr(_current, 'task', None)
+    if task is not None:
+        task.check()
+
+
+def priority_key(priority) -> tuple:
+    """Return priority as a tuple, so numbers and tuples of different callers compare"""
+
+    return priority if isinstance(priority, tuple) else (priority,)
+
+
+class Scheduler:
+    """Run tasks submitted by any provider on a shared set of worker threads,
+    so at most 'max_workers' tasks (and browsers) are busy at any time.
+    Queued tasks wait in one priority queue, lowest priority first and in order of
+    submission among equals, and every idle worker takes the next task from it"""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._queue = []  # heap of (priority, sequence number, task)
+        self._sequence = itertools.count()
+        self._running = set()
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._workers = [threading.Thread(target=self._work, name=f'scraper_{i}', daemon=True)
+                         for i in range(max_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def _work(self) -> None:
+        """Run queued tasks until the scheduler is shut down and the queue is empty"""
+
+        while True:
+            with self._condition:
+                while not self._queue and not self._shutdown:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                _, _, task = heapq.heappop(self._queue)
+                self._running.add(task)
+
+            try:
+                task.run()
+            finally:
+                with self._condition:
+                    self._running.discard(task)
+
+    def submit(self, fn, *args, priority=0, time_limit: float | None = None, **kwargs) -> Future:
+        """Queue a task and return its future. Tasks with a lower priority, a number or a tuple,
+        start first. A task running longer than time_limit seconds is stopped at its next
+        check_cancelled()"""
+
+        task = Task(fn, args, kwargs, time_limit)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError('cannot submit tasks after shutdown')
+            heapq.heappush(self._queue, (priority_key(priority), next(self._sequence), task))
+            self._condition.notify()
+
+        return task.future
+
+    def cancel(self, future: Future) -> bool:
+        """Cancel a task, dropping it if still queued or stopping it at its next check_cancelled()
+        if running. Return False if it had already finished"""
+
+        if future.cancel():
+            return True
+
+        with self._condition:
+            for task in self._running:
+                if task.future is future:
+                    task.cancelled = True
+                    return True
+
+        return False
+
+    def map(self, fn, *iterables, desc: str | None = None,
+            on_result: Callable[[int, object], None] | None = None,
+            priorities: list | None = None,
+            time_limit: float | None = TASK_TIME_LIMIT) -> list | None:
+        """Run fn over the zipped iterables, showing progress, and return results in order.
+        Items are started in order of 'priorities' if given. Items that raise, are cancelled
+        or run past time_limit are reported by their first argument and give None. If
+        on_result is given it is called with (index, result) as each task finishes instead,
+        and nothing is returned"""
+
+        items = list(zip(*iterables))
+        priorities = range(len(items)) if priorities is None else priorities
+        futures = {self.submit(fn, *args, priority=priority, time_limit=time_limit): i
+                   for i, (args, priority) in enumerate(zip(items, priorities))}
+        results = [None] * len(items)
+        for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+            results[futures[future]] = task_result(future, items[futures[future]][0])
+            if on_result is not None:
+                on_result(futures[future], results[futures[future]])
+
+        if on_result is not None:
+            return None
+
+        return results
+
+    def map_split(self, split, work, combine, *iterables, desc: str | None = None,
+                  on_result: Callable[[int, object], None] | None = None,
+                  priorities: list | None = None,
+                  time_limit: float | None = TASK_TIME_LIMIT) -> list | None:
+        """Like map, for items whose work can be split: split(*args) returns (partial result,
+        list of argument tuples for work). Those subtasks are queued as soon as their item is
+        split, so one large item spreads over every worker, and the result of the item is
+        combine(partial result, results of its subtasks in order). Subtasks of an item go
+        ahead of later items, in the order split returned them. Items whose split or any
+        subtask raises, is cancelled or runs past time_limit are reported and give None, and
+        their other subtasks are cancelled, so a result is only combined from complete work"""
+
+        items = list(zip(*iterables))
+        priorities = list(range(len(items)) if priorities is None else priorities)
+        results = [None] * len(items)
+        partials, outputs, remaining = {}, {}, {}
+        pending = {self.submit(split, *args, priority=(*priority_key(priority), -1),
+                               time_limit=time_limit): (i, None)
+                   for i, (args, priority) in enumerate(zip(items, priorities))}
+
+        with tqdm(total=len(items), desc=desc) as progress:
+            def finish(i: int, result) -> None:
+                progress.update()
+                if on_result is not None:
+                    on_result(i, result)
+                else:
+                    results[i] = result
+
+            while pending:
+                done, _ = wait_futures(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, j = pending.pop(future)
+                    if j is not None:
+                        if i not in remaining:  # a sibling subtask already failed
+                            continue
+                        if task_stopped(future, items[i][0]):
+                            del partials[i], outputs[i], remaining[i]
+                            for sibling, (k, _) in pending.items():
+                                if k == i:
+                                    self.cancel(sibling)
+                            finish(i, None)
+                            continue
+                        outputs[i][j] = future.result()
+                        remaining[i] -= 1
+                        if not remaining[i]:
+                            done_outputs = outputs.pop(i)
+                            finish(i, combine(partials.pop(i), [done_outputs[x] for x in sorted(done_outputs)]))
+                        continue
+
+                    split_result = task_result(future, items[i][0])
+                    if split_result is None:
+                        finish(i, None)
+                        continue
+
+                    partial_result, subtasks = split_result
+                    if not subtasks:
+                        finish(i, combine(partial_result, []))
+                        continue
+
+                    partials[i], outputs[i], remaining[i] = partial_result, {}, len(subtasks)
+                    for j, args in enumerate(subtasks):
+                        pending[self.submit(work, *args, priority=(*priority_key(priorities[i]), j),
+                                            time_limit=time_limit)] = (i, j)
+
+        if on_result is not None:
+            return None
+
+        return results
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop workers once queued tasks are done, or if not 'wait', drop queued tasks
+        and stop running ones at their next check_cancelled()"""
+
+        with self._condition:
+            self._shutdown = True
+            if not wait:
+                for _, _, task in self._queue:
+                    task.future.cancel()
+                self._queue.clear()
+                for task in self._running:
+                    task.cancelled = True
+            self._condition.notify_all()
+
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+
+def task_stopped(future: Future, item=None) -> bool:
+    """Return whether a finished task raised, was cancelled or was stopped at its time limit,
+    saying why and for which item"""
+
+    name = '' if item is None else f' {item}'
+    if future.cancelled():
+        print(f'Task{name} stopped: cancelled')
+        return True
+
+    error = future.exception()
+    if isinstance(error, TaskCancelled):
+        print(f'Task{name} stopped: {error}')
+        return True
+    if isinstance(error, Exception):
+        print(f'Task{name} failed: {type(error).__name__}: {error}')
+        return True
+
+    return False
+
+
+def task_result(future: Future, item=None):
+    """Return result of a finished task, None if it raised or was stopped"""
+
+    return None if task_stopped(future, item) else future.result()
+
+
+def collect_into(results: list[dict]) -> Callable[[int, dict], None]:
+    """Return result callback merging the centres with bookings of each result into the dict
+    of its index"""
+
+    def collect(index: int, result: dict) -> None:
+        results[index].update({k: v for k, v in result.items() if v['Activity']})
+
+    return collect
+
+
+def get_scheduler(max_workers: int = 4) -> Scheduler:
+    """Return the process wide scheduler, its size is set by the first call"""
+
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler(max_workers)
+            atexit.register(close_scheduler)
+
+        return _scheduler
+
+
+def close_scheduler() -> None:
+    """Shut down the process wide scheduler"""
+
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            _scheduler.shutdown(wait=False)
+            _scheduler = None
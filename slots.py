@@ -0,0 +1,196 @@
+"""Compact typed representation of bookable slots shared by every provider
+
+The slots of an activity are one NumPy structured array (a row per slot, ordered by start)
+holding parsed start and end times, the price in pounds and the number of spaces left.
+Unknown prices are NaN and unknown spaces are UNKNOWN_SPACES."""
+
+import datetime
+import re
+
+import numpy as np
+
+SLOT_DTYPE = np.dtype([('start', 'datetime64[m]'), ('end', 'datetime64[m]'),
+                       ('price', 'float32'), ('spaces', 'int16')])
+UNKNOWN_SPACES = -1
+
+MONTHS = {m: i + 1 for i, m in enumerate(['jan', 'feb', 'mar', 'apr', 'may', 'jun',
+                                          'jul', 'aug', 'sep', 'oct', 'nov', 'dec'])}
+
+TIME_PATTERN = re.compile(r'(\d{1,2})(?:[:.](\d{2}))?\s*([ap]\.?m\.?)?', re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+
+def parse_date(date: str, today: datetime.date | None = None) -> datetime.date | None:
+    """Parse dates as shown by the booking sites, e.g. '2024-05-01', '01/05/2024',
+    'Wed 01/05' or 'Wed 1 May'. Dates without a year are placed in the first year
+    that puts them no more than a month in the past. Return None if the date cannot be read"""
+
+    today = today or datetime.date.today()
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.datetime.strptime(date.strip(), fmt).date()
+        except ValueError:
+            pass
+
+    match = re.search(r'(\d{1,2})(?:st|nd|rd|th)?[/\s-]+(\d{1,2}|[a-z]{3})', date.lower())
+    if match is None:
+        return None
+
+    day = int(match.group(1))
+    month = MONTHS.get(match.group(2)) if match.group(2).isalpha() else int(match.group(2))
+    for year in (today.year, today.year + 1):
+        try:
+            parsed = datetime.date(year, month, day)
+        except (ValueError, TypeError):
+            return None
+        if parsed >= today - datetime.timedelta(days=31):
+            return parsed
+
+    return None
+
+
+def parse_times(text: str) -> tuple[datetime.time | None, datetime.time | None]:
+    """Return start and end of a time range such as '18:00 - 19:00' or '6pm-7.30pm',
+    end is None when only a start time is shown"""
+
+    found = []
+    for hours, minutes, meridiem in TIME_PATTERN.findall(text):
+        if not minutes and not meridiem:
+            continue
+        hour = int(hours)
+        if meridiem:
+            hour = hour % 12 + (12 if meridiem.lower().startswith('p') else 0)
+        try:
+            found.append(datetime.time(hour, int(minutes or 0)))
+        except ValueError:
+            continue
+
+    return (found[0] if found else None), (found[1] if len(found) > 1 else None)
+
+
+def parse_price(text) -> float:
+    """Return price in pounds from text such as '£7.50', '7.50' or 'Free', NaN if not shown"""
+
+    if isinstance(text, (int, float)):
+        return float(text)
+
+    if 'free' in str(text).lower():
+        return 0.0
+
+    match = NUMBER_PATTERN.search(str(text))
+
+    return float(match.group()) if match else float('nan')
+
+
+def parse_spaces(text) -> int:
+    """Return spaces left from text such as '3' or '3 spaces', UNKNOWN_SPACES if not shown"""
+
+    if isinstance(text, (int, np.integer)):
+        return int(text)
+
+    match = re.search(r'\d+', str(text))
+
+    return int(match.group()) if match else UNKNOWN_SPACES
+
+
+def empty_slots() -> np.ndarray:
+    """Return slots array without any slot"""
+
+    return np.empty(0, dtype=SLOT_DTYPE)
+
+
+def slots_from_columns(date: str | datetime.date, times: list[str], prices: list | None = None,
+                       spaces: list | None = None) -> np.ndarray:
+    """Return slots of one date from the time, price and spaces text scraped for it.
+    Slots whose time cannot be read are dropped"""
+
+    day = parse_date(date) if isinstance(date, str) else date
+    if day is None:
+        return empty_slots()
+
+    prices = prices if prices is not None else [None] * len(times)
+    spaces = spaces if spaces is not None else [None] * len(times)
+
+    rows = []
+    for time_text, price, space in zip(times, prices, spaces):
+        start, end = parse_times(time_text)
+        if start is None:
+            continue
+        rows.append((datetime.datetime.combine(day, start),
+                     datetime.datetime.combine(day, end) if end is not None else None,
+                     parse_price(price), parse_spaces(space)))
+
+    return np.sort(np.array(rows, dtype=SLOT_DTYPE), order='start', kind='stable')
+
+
+def available(slots: np.ndarray) -> np.ndarray:
+    """Return slots that are not fully booked"""
+
+    return slots[slots['spaces'] != 0]
+
+
+def merge_slots(*all_slots: np.ndarray) -> np.ndarray:
+    """Return slots of several arrays as one, ordered by start"""
+
+    return np.sort(np.concatenate([empty_slots(), *all_slots]), order='start', kind='stable')
+
+
+def slot_days(slots: np.ndarray) -> list[datetime.date]:
+    """Return days that have slots, in order"""
+
+    return [x.item() for x in np.unique(slots['start'].astype('datetime64[D]'))]
+
+
+def centre_activities(activity_dict: dict[str, np.ndarray | None]) -> dict:
+    """Return the 'Activity' of a centre dict, the sessions with free slots, and its 'Unread',
+    the sessions whose slots (None) could not all be read, if there are any"""
+
+    info = {'Activity': {k: v for k, v in activity_dict.items() if v is not None and len(v)}}
+    unread = [k for k, v in activity_dict.items() if v is None]
+    if unread:
+        info['Unread'] = unread
+
+    return info
+
+
+def slots_on(slots: np.ndarray, day: datetime.date) -> np.ndarray:
+    """Return slots starting on day"""
+
+    return slots[slots['start'].astype('datetime64[D]') == np.datetime64(day, 'D')]
+
+
+def format_time_range(slot) -> str:
+    """Return slot times as 'HH:MM - HH:MM'"""
+
+    start = slot['start'].item()
+    if np.isnat(slot['end']):
+        return f"{start:%H:%M}"
+
+    return f"{start:%H:%M} - {slot['end'].item():%H:%M}"
+
+
+def format_price(price: float) -> str:
+    """Return price as '£7.50', 'N/A' if unknown"""
+
+    return 'N/A' if np.isnan(price) else f"£{price:.2f}"
+
+
+def format_spaces(spaces: int) -> str:
+    """Return spaces left, 'N/A' if unknown"""
+
+    return 'N/A' if spaces == UNKNOWN_SPACES else str(spaces)
+
+
+def slots_to_json(slots: np.ndarray) -> list[list]:
+    """Return slots as JSON serialisable [start, end, price, spaces] rows"""
+
+    return [[str(x['start']), None if np.isnat(x['end']) else str(x['end']),
+             None if np.isnan(x['price']) else float(x['price']), int(x['spaces'])]
+            for x in slots]
+
+
+def slots_from_json(rows: list[list]) -> np.ndarray:
+    """Return slots saved with slots_to_json"""
+
+    return np.array([(start, end or 'NaT', np.nan if price is None else price, spaces)
+                     for start, end, price, spaces in rows], dtype=SLOT_DTYPE).reshape(-1)
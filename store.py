@@ -0,0 +1,240 @@
+"""Indexed store of every available slot found, kept across runs, so availability can be
+queried without re-reading reports or scraping again
+
+Run with:  python store.py --activity badminton --after 18:00 --days weekdays --within 5
+"""
+
+from os import environ as ENV
+import datetime
+import argparse
+import sqlite3
+import time
+import os
+
+import numpy as np
+
+from cache import connect
+from slots import format_price, format_spaces
+
+STORE_PATH = ENV.get('SCRAPER_STORE',
+                     os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  '.cache', 'availability.sqlite'))
+
+DAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+DAY_GROUPS = {'weekdays': (0, 1, 2, 3, 4), 'weekends': (5, 6)}
+
+# One row per slot of a session found for a (postcode, activity) query. 'activity' is the
+# activity searched for, 'session' the provider's name for what matched it
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS slots (
+    provider TEXT NOT NULL,
+    centre TEXT NOT NULL,
+    address TEXT,
+    postcode TEXT NOT NULL,
+    activity TEXT NOT NULL,
+    session TEXT NOT NULL,
+    date TEXT NOT NULL,
+    weekday INTEGER NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT,
+    price REAL,
+    spaces INTEGER NOT NULL,
+    distance REAL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (provider, centre, postcode, activity, session, date, start));
+CREATE INDEX IF NOT EXISTS slots_activity ON slots (activity, date, start);
+CREATE INDEX IF NOT EXISTS slots_date ON slots (date, start);
+CREATE INDEX IF NOT EXISTS slots_start ON slots (start);
+CREATE INDEX IF NOT EXISTS slots_distance ON slots (distance);
+CREATE INDEX IF NOT EXISTS slots_provider ON slots (provider, centre);
+"""
+
+UPSERT_SQL = """
+INSERT INTO slots (provider, centre, address, postcode, activity, session, date, weekday,
+                   start, end, price, spaces, distance, updated)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (provider, centre, postcode, activity, session, date, start) DO UPDATE SET
+    address = excluded.address, end = excluded.end, price = excluded.price,
+    spaces = excluded.spaces, distance = excluded.distance, updated = excluded.updated
+"""
+
+
+def get_store(path: str = STORE_PATH) -> sqlite3.Connection:
+    """Return a connection to the availability store, one per thread and process"""
+
+    return connect(path, STORE_SCHEMA)
+
+
+def clean_postcode(postcode: str) -> str:
+    """Return postcode in the form it is stored under, e.g. 'SW1A 1AA' for 'sw1a1aa',
+    with a single space before the three character inward code"""
+
+    compact = ''.join(postcode.upper().split())
+    if len(compact) <= 3:
+        return compact
+
+    return f'{compact[:-3]} {compact[-3:]}'
+
+
+def slot_rows(postcode: str, activity: str, centre_name: str, centre_info: dict,
+              updated: float) -> list[tuple]:
+    """Return store rows of every slot of a centre dict entry"""
+
+    rows = []
+    for session, slots in centre_info['Activity'].items():
+        for slot in slots:
+            start = slot['start'].item()
+            rows.append((centre_info['Company'], centre_name, centre_info.get('Address'),
+                         postcode, activity, session, f'{start:%Y-%m-%d}', start.weekday(),
+                         f'{start:%H:%M}',
+                         None if np.isnat(slot['end']) else f"{slot['end'].item():%H:%M}",
+                         None if np.isnan(slot['price']) else float(slot['price']),
+                         int(slot['spaces']), centre_info.get('Distance'), updated))
+
+    return rows
+
+
+def save_centres(postcode: str, activity: str, centre_dict: dict | None,
+                 path: str = STORE_PATH) -> int:
+    """Upsert slots of a {name: centre info} dict found for a query and return how many were
+    written. Each centre was just searched, so its upcoming slots for the query that were not
+    found again have been booked and are removed, all of them for a centre whose 'Activity'
+    is empty. Slots of the sessions listed in a centre's 'Unread' are kept, as they could not
+    all be read"""
+
+    if not centre_dict:
+        return 0
+
+    postcode, activity = clean_postcode(postcode), activity.lower()
+    updated, today = time.time(), f'{datetime.date.today():%Y-%m-%d}'
+    conn = get_store(path)
+    written = 0
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for centre_name, centre_info in centre_dict.items():
+            rows = slot_rows(postcode, activity, centre_name, centre_info, updated)
+            conn.executemany(UPSERT_SQL, rows)
+            unread = centre_info.get('Unread', [])
+            conn.execute('DELETE FROM slots WHERE provider = ? AND centre = ? AND postcode = ? '
+                         'AND activity = ? AND date >= ? AND updated < ? '
+                         f"AND session NOT IN ({', '.join('?' * len(unread))})",
+                         (centre_info['Company'], centre_name, postcode, activity, today, updated,
+                          *unread))
+            written += len(rows)
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+    return written
+
+
+def parse_days(text: str) -> list[int]:
+    """Return weekday numbers (Monday is 0) of text such as 'weekdays', 'sat,sun' or 'mon-wed'"""
+
+    days = []
+    for part in text.lower().replace(' ', '').split(','):
+        if part in DAY_GROUPS:
+            days.extend(DAY_GROUPS[part])
+            continue
+
+        first, _, last = part.partition('-')
+        if first[:3] not in DAY_NAMES or (last and last[:3] not in DAY_NAMES):
+            raise ValueError(f"Unknown day {part}, expected weekdays, weekends or days like 'mon-fri'")
+        start, end = DAY_NAMES.index(first[:3]), DAY_NAMES.index((last or first)[:3])
+        days.extend((start + i) % 7 for i in range((end - start) % 7 + 1))
+
+    return sorted(set(days))
+
+
+def query_slots(activity: str | None = None, postcode: str | None = None,
+                providers: list[str] | None = None, centre: str | None = None,
+                date_from: str | None = None, date_to: str | None = None,
+                after: str | None = None, before: str | None = None,
+                days: list[int] | None = None, within: float | None = None,
+                max_price: float | None = None, min_spaces: int | None = None,
+                max_age: float | None = None, limit: int | None = None,
+                path: str = STORE_PATH) -> list[dict]:
+    """Return stored slots matching every filter given, ordered by date, start and distance.
+    Times are 'HH:MM', dates 'YYYY-MM-DD' (date_from defaults to today), 'after' and 'before'
+    bound the start time, 'within' the distance in km and 'max_age' the seconds since a slot
+    was last seen. Activity, provider and centre names match case-insensitively"""
+
+    clauses, params = ['date >= ?'], [date_from or f'{datetime.date.today():%Y-%m-%d}']
+    filters = (('activity = ?', activity and activity.lower()),
+               ('postcode = ?', postcode and clean_postcode(postcode)),
+               ('centre LIKE ?', centre and f'%{centre}%'),
+               ('date <= ?', date_to), ('start >= ?', after), ('start < ?', before),
+               ('distance <= ?', within), ('price <= ?', max_price),
+               ('spaces >= ?', min_spaces),
+               ('updated >= ?', max_age and time.time() - max_age))
+    for clause, value in filters:
+        if value is not None:
+            clauses.append(clause)
+            params.append(value)
+
+    for column, values in (('provider COLLATE NOCASE', providers), ('weekday', days)):
+        if values:
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+
+    sql = (f"SELECT * FROM slots WHERE {' AND '.join(clauses)} "
+           'ORDER BY date, start, distance IS NULL, distance')
+    if limit is not None:
+        sql += f' LIMIT {int(limit)}'
+
+    cursor = get_store(path).execute(sql, params)
+    columns = [x[0] for x in cursor.description]
+
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def format_slot(slot: dict) -> str:
+    """Return one line describing a stored slot"""
+
+    day = datetime.date.fromisoformat(slot['date'])
+    times = f"{slot['start']} - {slot['end']}" if slot['end'] else slot['start']
+    distance = 'N/A' if slot['distance'] is None else f"{slot['distance']:.1f}km"
+    price = format_price(float('nan') if slot['price'] is None else slot['price'])
+
+    return (f"{day:%a %d %b}  {times:<13}  {price:>7}  {format_spaces(slot['spaces']):>4}  "
+            f"{distance:>8}  {slot['centre']} ({slot['provider']}, {slot['session']})")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--activity', help="activity searched for, e.g. 'badminton'")
+    parser.add_argument('--postcode', help='postcode searched from')
+    parser.add_argument('--providers', help="comma separated companies, e.g. 'BETTER,Everyone Active'")
+    parser.add_argument('--centre', help='part of a centre name')
+    parser.add_argument('--from', dest='date_from', metavar='DATE', help='first date, YYYY-MM-DD (default today)')
+    parser.add_argument('--to', dest='date_to', metavar='DATE', help='last date, YYYY-MM-DD')
+    parser.add_argument('--after', metavar='HH:MM', help='earliest start time')
+    parser.add_argument('--before', metavar='HH:MM', help='start times before this')
+    parser.add_argument('--days', help="days of the week, e.g. 'weekdays', 'weekends' or 'mon,wed-fri'")
+    parser.add_argument('--within', type=float, metavar='KM', help='maximum distance in km')
+    parser.add_argument('--max-price', type=float, metavar='POUNDS')
+    parser.add_argument('--min-spaces', type=int)
+    parser.add_argument('--max-age', type=float, metavar='HOURS',
+                        help='only slots seen in the last HOURS hours')
+    parser.add_argument('--limit', type=int)
+    options = parser.parse_args()
+
+    try:
+        weekdays = parse_days(options.days) if options.days else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    start_time = time.perf_counter()
+    found = query_slots(options.activity, options.postcode,
+                        options.providers and [x.strip() for x in options.providers.split(',')],
+                        options.centre, options.date_from, options.date_to, options.after,
+                        options.before, weekdays, options.within, options.max_price,
+                        options.min_spaces, options.max_age and options.max_age * 3600,
+                        options.limit)
+
+    for row in found:
+        print(format_slot(row))
+    print(f'{len(found)} slots found in {(time.perf_counter() - start_time) * 1000:.1f}ms')
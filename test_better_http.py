@@ -0,0 +1,56 @@
+"""Tests of the browserless BETTER backend against the fixture server"""
+
+import os
+
+import pytest
+
+import better_http
+from fixture_server import serve_fixtures, FIXTURES_DIR
+
+ACTIVITY_PATH = ('better', 'location', 'test-leisure-centre', 'sports-hall-activities', 'badminton-40min')
+FIRST_DAY = (['07:00 - 07:40', '18:20 - 19:00', '19:00 - 19:40'], ['10.50', '14.00', '14.00'], ['3', '0', '1'])
+
+
+@pytest.fixture(name='base_url', scope='module')
+def fixture_base_url():
+    """Serve the fixtures and point the backend's API at them"""
+
+    server, base_url = serve_fixtures()
+    api_url = better_http.BETTER_API_URL
+    better_http.BETTER_API_URL = f'{base_url}/better/api/activities'
+
+    yield base_url
+
+    better_http.BETTER_API_URL = api_url
+    server.shutdown()
+
+
+def date_link(base_url: str, date: str) -> str:
+    """Return link of a fixture date page"""
+
+    return f"{base_url}/{'/'.join(ACTIVITY_PATH)}/{date}/by-time"
+
+
+def test_fetch_dates(base_url):
+    dates = ['2026-10-19', '2026-10-20', '2026-10-21', '2026-10-22']
+
+    found = better_http.fetch_dates([date_link(base_url, x) for x in dates], timeout=5)
+
+    assert found == [
+        FIRST_DAY,  # server rendered page
+        ([], [], []),  # page saying there is nothing that day
+        (['18:00 - 18:40', '18:40 - 19:20'], ['14.00', '14.00'], ['2', '0']),  # times API
+        None,  # page that needs JavaScript
+    ]
+
+
+def test_fetch_dates_missing_page(base_url):
+    assert better_http.fetch_dates([date_link(base_url, '2026-12-25')], timeout=5) == [None]
+    assert not better_http.fetch_dates([], timeout=5)
+
+
+def test_parse_date_page():
+    with open(os.path.join(FIXTURES_DIR, *ACTIVITY_PATH, '2026-10-19', 'by-time.html'), encoding='utf-8') as f:
+        assert better_http.parse_date_page(f.read()) == FIRST_DAY
+
+    assert better_http.parse_date_page('<html><body><div id="root"></div></body></html>') is None
@@ -0,0 +1,40 @@
+"""Tests of the saved centre directories"""
+
+import pytest
+
+import directory
+from directory import add_search_results, nearest_centres
+
+HOME = (51.5, -0.1)
+
+
+@pytest.fixture(autouse=True)
+def fixture_cache(monkeypatch):
+    """Keep directories in memory instead of the on-disk cache"""
+
+    saved = {}
+    monkeypatch.setattr(directory, 'cache_get', lambda namespace, key: saved.get((namespace, key)))
+    monkeypatch.setattr(directory, 'cache_set',
+                        lambda namespace, key, value, ttl: saved.__setitem__((namespace, key), value))
+    monkeypatch.setattr(directory, '_indexes', {})
+
+
+def centre(name: str, km_north: float) -> dict:
+    return {'name': name, 'lat': HOME[0] + km_north / directory.KM_PER_DEGREE, 'lon': HOME[1]}
+
+
+def test_search_vouches_for_its_centres():
+    add_search_results('Test', HOME, [centre('a', 1), centre('b', 2), centre('c', 3)])
+
+    assert [x['name'] for x, _ in nearest_centres('Test', HOME, 2)] == ['a', 'b']
+
+
+def test_search_stops_vouching_at_skipped_centre(capsys):
+    # 'x' was listed between 'a' and 'b' but could not be geocoded
+    add_search_results('Test', HOME, [centre('a', 1), centre('b', 2), centre('c', 3)],
+                       skipped={'x': 1})
+
+    assert 'x' in capsys.readouterr().out
+    assert [x['name'] for x, _ in nearest_centres('Test', HOME, 1)] == ['a']
+    # 'x' may be closer than 'b', so the next lookup searches again
+    assert nearest_centres('Test', HOME, 2) is None
@@ -0,0 +1,19 @@
+"""Tests of the Everyone Active centre directory"""
+
+from EA import centre_directory, extract_coords_from_link, parse_coords
+
+
+def test_parse_coords():
+    link = 'https://www.google.com/maps/dir//51.5,-0.1'
+    assert parse_coords(f'[{extract_coords_from_link(link)}]') == [51.5, -0.1]
+    assert parse_coords('[, ]') is None
+    assert parse_coords('[51.5]') is None
+    assert parse_coords('not coordinates') is None
+
+
+def test_centre_directory_skips_centres_without_coordinates():
+    names = ['Centre A', 'Centre B', 'Centre C']
+    coords = ['[51.5, -0.1]', '[, ]', '[52.0, -1.5]']
+
+    assert centre_directory(names, coords) == [{'name': 'Centre A', 'lat': 51.5, 'lon': -0.1},
+                                               {'name': 'Centre C', 'lat': 52.0, 'lon': -1.5}]
@@ -0,0 +1,97 @@
+"""Tests of the circuit breaker around page loads"""
+
+import time
+
+import pytest
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+import resilience
+from resilience import CircuitBreaker, open_page, retry_page
+
+URL = 'http://127.0.0.1/page'  # no rate limit for local hosts
+
+
+class FakeDriver:
+    """Driver whose page loads fail while 'failing' is set"""
+
+    def __init__(self):
+        self.failing = True
+        self.loaded = []
+        self.current_url = URL
+
+    def get(self, url: str) -> None:
+        if self.failing:
+            raise WebDriverException('page did not load')
+        self.loaded.append(url)
+
+    def refresh(self) -> None:
+        self.get(self.current_url)
+
+
+@pytest.fixture(name='breaker')
+def fixture_breaker(monkeypatch) -> CircuitBreaker:
+    """Breaker of the local host that opens after 2 failures and lets a call through after 50ms"""
+
+    breaker = CircuitBreaker('127.0.0.1', failure_threshold=2, open_seconds=0.05)
+    monkeypatch.setattr(resilience, '_breakers', {'127.0.0.1': breaker})
+    monkeypatch.setattr(resilience, 'BACKOFF_BASE', 0.001)
+
+    return breaker
+
+
+def test_open_page_closes_circuit_after_successful_trial(breaker):
+    driver = FakeDriver()
+
+    for _ in range(2):
+        with pytest.raises(WebDriverException):
+            open_page(driver, URL)
+    assert breaker.opened is not None
+
+    # Open: the call waits for the circuit to let a trial through, and closes it
+    driver.failing = False
+    started = time.monotonic()
+    open_page(driver, URL)
+    assert time.monotonic() - started >= 0.04
+    assert breaker.opened is None
+    assert breaker.failures == 0
+
+    # Closed: every call goes through again
+    open_page(driver, URL)
+    open_page(driver, URL)
+    assert driver.loaded == [URL] * 3
+
+
+def test_open_page_failed_trial_keeps_circuit_open(breaker):
+    driver = FakeDriver()
+
+    for _ in range(3):
+        with pytest.raises(WebDriverException):
+            open_page(driver, URL)
+
+    assert breaker.opened is not None
+    assert breaker.reopens_in() > 0
+
+
+def test_retry_page_read_timeouts_do_not_open_circuit(breaker):
+    driver = FakeDriver()
+    driver.failing = False
+
+    def read(_):
+        raise TimeoutException('element not shown')
+
+    assert retry_page(driver, read, retries=5, default=[]) == []
+    assert breaker.opened is None
+    assert len(driver.loaded) == 5
+
+
+def test_retry_page_failed_reloads_count_against_host(breaker):
+    driver = FakeDriver()
+
+    def read(_):
+        raise TimeoutException('element not shown')
+
+    with pytest.raises(WebDriverException):
+        retry_page(driver, read, retries=5)
+    with pytest.raises(WebDriverException):
+        retry_page(driver, read, retries=5)
+    assert breaker.opened is not None
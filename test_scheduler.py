@@ -0,0 +1,60 @@
+"""Tests of the shared task scheduler"""
+
+import threading
+
+import pytest
+
+from scheduler import Scheduler, check_cancelled
+
+
+@pytest.fixture(name='scheduler')
+def fixture_scheduler():
+    """Scheduler of two workers, shut down after the test"""
+
+    scheduler = Scheduler(2)
+    yield scheduler
+    scheduler.shutdown(wait=False)
+
+
+def fail_on(value: int, bad: int) -> int:
+    if value == bad:
+        raise ValueError(f'cannot do {value}')
+    return value * 10
+
+
+def test_map_failed_item_gives_none(scheduler, capsys):
+    assert scheduler.map(fail_on, [1, 2, 3], [2] * 3) == [10, None, 30]
+    assert 'Task 2 failed: ValueError: cannot do 2' in capsys.readouterr().out
+
+
+def test_map_split_failed_subtask_cancels_siblings(scheduler, capsys):
+    started = threading.Event()
+    stopped = []
+
+    def split(name: str, count: int):
+        return name, [(name, j) for j in range(count)]
+
+    def work(name: str, j: int) -> int:
+        if name == 'bad' and j == 0:
+            started.wait(5)
+            raise ValueError('page did not load')
+        if name == 'bad':
+            # Sibling keeps running until told to stop
+            started.set()
+            try:
+                while True:
+                    check_cancelled()
+                    threading.Event().wait(0.01)
+            except BaseException:
+                stopped.append(j)
+                raise
+        return j
+
+    results = scheduler.map_split(split, work, lambda x, outputs: (x, outputs),
+                                  ['good', 'bad'], [3, 4], time_limit=None)
+
+    assert results == [('good', [0, 1, 2]), None]
+    # Returning at all means the endless siblings were stopped, queued ones never started
+    assert stopped and set(stopped) <= {1, 2, 3}
+    out = capsys.readouterr().out
+    assert 'Task bad failed: ValueError: page did not load' in out
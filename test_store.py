@@ -0,0 +1,52 @@
+"""Tests of the availability store"""
+
+import datetime
+
+import pytest
+
+from slots import centre_activities, slots_from_columns
+from store import clean_postcode, query_slots, save_centres
+
+DAY = datetime.date.today() + datetime.timedelta(days=1)
+
+
+@pytest.fixture(name='path')
+def fixture_path(tmp_path) -> str:
+    return str(tmp_path / 'availability.sqlite')
+
+
+def centre_dict(activity_dict: dict) -> dict:
+    return {'Test Centre': {'Address': 'N/A', 'Distance': 1.0, 'Company': 'Everyone Active',
+                            **centre_activities(activity_dict)}}
+
+
+def sessions(path: str) -> list[tuple[str, str]]:
+    return [(x['session'], x['start']) for x in query_slots('badminton', path=path)]
+
+
+def test_clean_postcode():
+    assert clean_postcode('sw1a1aa') == 'SW1A 1AA'
+    assert clean_postcode(' SW1A  1AA ') == 'SW1A 1AA'
+
+
+def test_centre_searched_again_removes_booked_slots(path):
+    save_centres('sw1a 1aa', 'Badminton', centre_dict({
+        'Badminton 40': slots_from_columns(DAY, ['07:00 - 07:40', '18:00 - 18:40']),
+        'Badminton 60': slots_from_columns(DAY, ['19:00 - 20:00'])}), path)
+
+    save_centres('SW1A1AA', 'badminton', centre_dict({
+        'Badminton 40': slots_from_columns(DAY, ['18:00 - 18:40'])}), path)
+
+    assert sessions(path) == [('Badminton 40', '18:00')]
+
+
+def test_unread_sessions_keep_their_slots(path):
+    save_centres('SW1A 1AA', 'badminton', centre_dict({
+        'Badminton 40': slots_from_columns(DAY, ['07:00 - 07:40']),
+        'Badminton 60': slots_from_columns(DAY, ['19:00 - 20:00'])}), path)
+
+    # The search of 'Badminton 60' timed out, it may still have its slot
+    save_centres('SW1A 1AA', 'badminton', centre_dict({'Badminton 40': slots_from_columns(DAY, []),
+                                                       'Badminton 60': None}), path)
+
+    assert sessions(path) == [('Badminton 60', '19:00')]
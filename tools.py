@@ -1,5 +1,11 @@
-import math
+from functools import partial
+from typing import Any, Callable
+import threading
+import time
 
+from selenium.common.exceptions import (NoSuchElementException, StaleElementReferenceException,
+                                        ElementClickInterceptedException, ElementNotInteractableException,
+                                        WebDriverException)
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.remote.webdriver import WebDriver
@@ -7,10 +13,59 @@ from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.common.by import By
 
 from geopy.geocoders import Nominatim
+from geopy.exc import GeocoderRateLimited, GeocoderTimedOut, GeocoderUnavailable
 from difflib import SequenceMatcher
+import numpy as np
+
+from cache import cache_get, cache_set, MISSING
+from instrument import add_span, count, span
+from scheduler import check_cancelled
+from resilience import retry_call
+
+GEOCODE_TTL = 30 * 24 * 3600  # seconds, addresses rarely move
+GEOCODE_NEGATIVE_TTL = 24 * 3600  # seconds, retry failed lookups daily
+NOMINATIM_HOST = 'nominatim.openstreetmap.org'
+
+EARTH_RADIUS_KM = 6371.0088  # mean radius
+WGS84_A_KM = 6378.137  # ellipsoid semi-major axis
+WGS84_F = 1 / 298.257223563  # ellipsoid flattening
+
+POLL_INTERVAL = 0.05  # seconds before the first re-check of a polled wait
+MAX_POLL_INTERVAL = 0.5  # polled waits back off up to this interval
+POLL_BACKOFF = 1.5
+
+_geolocator = None
+
+WAIT_STATS = {}
+_wait_stats_lock = threading.Lock()
+
+# Resolves with [key, element] of the first selector (optionally with text prefix) present in the
+# document, checking again on every DOM mutation, or with null once the timeout expires
+WAIT_FOR_SELECTORS_JS = """
+const [selectors, timeoutMs, done] = arguments;
+const match = () => {
+    for (const [key, selector, prefix] of selectors) {
+        for (const element of document.querySelectorAll(selector)) {
+            if (prefix === null || element.textContent.trim().toLowerCase().startsWith(prefix)) {
+                return [key, element];
+            }
+        }
+    }
+    return null;
+};
+let found = match();
+if (found) { done(found); return; }
+const observer = new MutationObserver(() => {
+    found = match();
+    if (found) { observer.disconnect(); clearTimeout(timer); done(found); }
+});
+const timer = setTimeout(() => { observer.disconnect(); done(null); }, timeoutMs);
+observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+"""
 
 
 def webwait_all(driver: WebDriver, type_: str, name: str, timeout: int) -> list[WebElement]:
+    check_cancelled()
     return WebDriverWait(driver, timeout).until(
         EC.presence_of_all_elements_located(
             (By.__getattribute__(By, type_), name))
@@ -18,6 +73,7 @@ def webwait_all(driver: WebDriver, type_: str, name: str, timeout: int) -> list[
 
 
 def webwait(driver: WebDriver, type_: str, name: str, timeout: int) -> WebElement:
+    check_cancelled()
     return WebDriverWait(driver, timeout).until(
         EC.presence_of_element_located((By.__getattribute__(By, type_), name))
     )
@@ -38,32 +94,251 @@ def scroll_into_view(driver: WebDriver, element: WebElement) -> None:
     wait_until_element_seen(driver, element)
 
 
-def get_coordinates(postcode: str) -> tuple[int, int]:
-    """Return longitude and latitude of a given postcode"""
+def record_wait(name: str, seconds: float, polls: int, timed_out: bool) -> None:
+    """Add the outcome of a wait to WAIT_STATS"""
 
-    geolocator = Nominatim(user_agent="aaaa")
-    home = geolocator.geocode(postcode)
+    add_span(f'wait.{name}', time.perf_counter() - seconds, seconds, category='wait',
+             args={'polls': polls, 'timed_out': timed_out})
+    if timed_out:
+        count('timeouts')
 
-    return home.latitude, home.longitude
+    with _wait_stats_lock:
+        stats = WAIT_STATS.setdefault(name, {'calls': 0, 'timeouts': 0, 'polls': 0,
+                                             'total': 0.0, 'max': 0.0})
+        stats['calls'] += 1
+        stats['timeouts'] += timed_out
+        stats['polls'] += polls
+        stats['total'] += seconds
+        stats['max'] = max(stats['max'], seconds)
 
 
-def get_distance_between_coords(lat_lon1: tuple[float, float], lat_lon2: tuple[float, float]) -> float:
-    lat1, lon1 = lat_lon1
-    lat2, lon2 = lat_lon2
+def reset_wait_stats() -> None:
+    """Forget all recorded wait timings"""
+
+    with _wait_stats_lock:
+        WAIT_STATS.clear()
+
+
+def wait_stats_summary() -> str:
+    """Return table of recorded wait timings, slowest total first"""
+
+    lines = [f"{'wait':<28}{'calls':>7}{'timeouts':>10}{'polls':>8}{'mean s':>9}{'max s':>8}"]
+    with _wait_stats_lock:
+        for name, stats in sorted(WAIT_STATS.items(), key=lambda x: -x[1]['total']):
+            lines.append(f"{name:<28}{stats['calls']:>7}{stats['timeouts']:>10}{stats['polls']:>8}"
+                         f"{stats['total'] / stats['calls']:>9.3f}{stats['max']:>8.3f}")
+
+    return '\n'.join(lines)
+
+
+def wait_for_any(driver: WebDriver, conditions: dict[str, Callable[[WebDriver], Any]], timeout: float,
+                 name: str = 'wait') -> tuple[str | None, Any]:
+    """Poll conditions in order, backing off between rounds, until one returns a truthy value.
+    Return key and value of the first condition met, or (None, None) on timeout.
+    Elements going missing, stale or being covered count as the condition not being met"""
+
+    start = time.time()
+    interval = POLL_INTERVAL
+    polls = 0
+    while True:
+        check_cancelled()
+        polls += 1
+        for key, condition in conditions.items():
+            try:
+                value = condition(driver)
+            except (NoSuchElementException, StaleElementReferenceException,
+                    ElementClickInterceptedException, ElementNotInteractableException):
+                value = None
+
+            if value:
+                record_wait(name, time.time() - start, polls, False)
+                return key, value
+
+        remaining = timeout - (time.time() - start)
+        if remaining <= 0:
+            record_wait(name, time.time() - start, polls, True)
+            return None, None
+
+        time.sleep(min(interval, remaining))
+        interval = min(interval * POLL_BACKOFF, MAX_POLL_INTERVAL)
+
+
+def selector_condition(selector: str, prefix: str | None = None) -> Callable[[WebDriver], WebElement | None]:
+    """Return condition met by the first element matching the css selector
+    (and whose text starts with prefix, if given)"""
+
+    def condition(driver: WebDriver) -> WebElement | None:
+        for element in driver.find_elements(By.CSS_SELECTOR, selector):
+            if prefix is None or element.text.strip().lower().startswith(prefix):
+                return element
+        return None
+
+    return condition
+
+
+def wait_for_any_selector(driver: WebDriver, selectors: dict[str, str | tuple[str, str]], timeout: float,
+                          name: str = 'wait') -> tuple[str | None, WebElement | None]:
+    """Wait inside the page, with a MutationObserver, for the first of several css selectors to match.
+    A selector may be given as (selector, text_prefix) to also require the element text to start
+    with text_prefix. Return key and element of the first match, or (None, None) on timeout.
+    Falls back to polling if the page navigates away while waiting"""
+
+    selectors = {k: (v, None) if isinstance(v, str) else v for k, v in selectors.items()}
+
+    check_cancelled()
+    start = time.time()
+    try:
+        driver.set_script_timeout(timeout + 5)
+        found = driver.execute_async_script(
+            WAIT_FOR_SELECTORS_JS,
+            [[k, selector, prefix] for k, (selector, prefix) in selectors.items()],
+            int(timeout * 1000))
+    except WebDriverException:
+        remaining = max(0.0, timeout - (time.time() - start))
+        return wait_for_any(driver, {k: selector_condition(*v) for k, v in selectors.items()},
+                            remaining, name)
+
+    record_wait(name, time.time() - start, 1, found is None)
+    if found is None:
+        return None, None
+
+    return found[0], found[1]
+
+
+def get_geolocator() -> Nominatim:
+    """Return the geolocator shared by every lookup in this process"""
+
+    global _geolocator
+    if _geolocator is None:
+        _geolocator = Nominatim(user_agent="aaaa")
+
+    return _geolocator
+
+
+def geocode(address: str) -> tuple[float, float] | None:
+    """Return latitude and longitude of an address, or None if it cannot be found.
+    Results (including misses) are kept in the on-disk cache"""
+
+    key = ' '.join(address.replace('\n', ', ').lower().split())
+    cached = cache_get('geocode', key, MISSING)
+    if cached is not MISSING:
+        return None if cached is None else tuple(cached)
+
+    with span('geocode', address=key):
+        location = retry_call(partial(get_geolocator().geocode, address.replace('\n', ', ')),
+                              NOMINATIM_HOST, retry_on=(GeocoderRateLimited, GeocoderTimedOut,
+                                                        GeocoderUnavailable), name='geocode')
+    if location is None:
+        cache_set('geocode', key, None, GEOCODE_NEGATIVE_TTL)
+        return None
+
+    coords = (location.latitude, location.longitude)
+    cache_set('geocode', key, coords, GEOCODE_TTL)
+
+    return coords
+
 
-    R = 6371e3  # metres
-    psi1 = lat1 * math.pi / 180  # psi, lambda in radians
-    psi2 = lat2 * math.pi / 180
-    delta_psi = (lat2 - lat1) * math.pi / 180
-    delta_lambda = (lon2 - lon1) * math.pi / 180
+def get_coordinates(postcode: str) -> tuple[float, float]:
+    """Return latitude and longitude of a given postcode"""
 
-    a = (math.sin(delta_psi / 2) * math.sin(delta_psi / 2) +
-         math.cos(psi1) * math.cos(psi2) *
-         math.sin(delta_lambda / 2) * math.sin(delta_lambda / 2))
+    coords = geocode(postcode)
+    if coords is None:
+        raise ValueError(f'Could not find coordinates for {postcode}')
 
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    d = R * c  # in metres
-    return d
+    return coords
+
+
+def as_coords(coords) -> np.ndarray:
+    """Return coordinates as a (N, 2) float array of [lat, lon] in degrees"""
+
+    return np.asarray(coords, dtype=float).reshape(-1, 2)
+
+
+def haversine_km(origins, points) -> np.ndarray:
+    """Return (M, N) great circle distances in km between M origins and N points"""
+
+    origins, points = np.radians(as_coords(origins)), np.radians(as_coords(points))
+    lat1, lon1 = origins[:, 0, None], origins[:, 1, None]
+    lat2, lon2 = points[None, :, 0], points[None, :, 1]
+
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def vincenty_km(origins, points, tolerance: float = 1e-12, max_iterations: int = 200) -> np.ndarray:
+    """Return (M, N) distances in km on the WGS-84 ellipsoid between M origins and N points
+    using Vincenty's inverse formula. Nearly antipodal pairs, where it does not converge,
+    fall back to the great circle distance"""
+
+    origins, points = np.radians(as_coords(origins)), np.radians(as_coords(points))
+    a, f = WGS84_A_KM, WGS84_F
+    b = a * (1 - f)
+
+    u1 = np.arctan((1 - f) * np.tan(origins[:, 0, None]))
+    u2 = np.arctan((1 - f) * np.tan(points[None, :, 0]))
+    lon_diff = points[None, :, 1] - origins[:, 1, None]
+    sin_u1, cos_u1, sin_u2, cos_u2 = np.sin(u1), np.cos(u1), np.sin(u2), np.cos(u2)
+
+    lam = lon_diff
+    converged = np.zeros(np.broadcast(u1, u2).shape, dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for _ in range(max_iterations):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0,
+                                    cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            c = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            lam_prev = lam
+            lam = lon_diff + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+            converged = np.abs(lam - lam_prev) < tolerance
+            if converged.all():
+                break
+
+        u_sq = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+        big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = big_b * sin_sigma * (cos_2sigma_m + big_b / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+            big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+        distances = b * big_a * (sigma - delta_sigma)
+
+    if not converged.all():
+        distances = np.where(converged, distances, haversine_km(np.degrees(origins),
+                                                                np.degrees(points)))
+
+    return distances
+
+
+def distance_matrix_km(origins, points, method: str = 'haversine') -> np.ndarray:
+    """Return (M, N) distances in km between M origins and N points,
+    method is 'haversine' (fast, ~0.5% error) or 'vincenty' (ellipsoid, mm accuracy)"""
+
+    if method == 'haversine':
+        return haversine_km(origins, points)
+
+    if method == 'vincenty':
+        return vincenty_km(origins, points)
+
+    raise ValueError(f"Unknown method {method}, expected 'haversine' or 'vincenty'")
+
+
+def distances_km(origin: tuple[float, float], points, method: str = 'haversine') -> np.ndarray:
+    """Return (N,) distances in km between one origin and N points"""
+
+    return distance_matrix_km([origin], points, method)[0]
+
+
+def get_distance_between_coords(lat_lon1: tuple[float, float], lat_lon2: tuple[float, float]) -> float:
+    """Return great circle distance in metres between two coordinates"""
+
+    return float(haversine_km([lat_lon1], [lat_lon2])[0, 0]) * 1000
 
 
 def similar(a: str, b: str) -> float:
@@ -82,4 +357,46 @@ def return_similar_strings(case: str, string_list: list[str], threshold: float)
         if similarity_score >= threshold:
             similar_strings.append((string, similarity_score))
 
-    return sorted(similar_strings, key=lambda x: similar(x, case), reverse=True)
+    return sorted(similar_strings, key=lambda x: x[1], reverse=True)
+
+
+def trigrams(string: str) -> set[str]:
+    """Return set of 3 letter sequences in the words of string, padded so word
+    starts and ends count too. Word order and repeated spaces are ignored"""
+
+    grams = set()
+    for word in string.lower().split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    return grams
+
+
+class FuzzyIndex:
+    """Trigram index over a list of strings, built once and queried for the
+    most similar strings without comparing the query against every string"""
+
+    def __init__(self, strings: list[str]):
+        self.strings = list(strings)
+        self.sizes = []
+        self.postings = {}
+        for i, string in enumerate(self.strings):
+            grams = trigrams(string)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(i)
+
+    def top(self, query: str, k: int = 5, threshold: float = 0.0) -> list[tuple[str, float]]:
+        """Return up to k (string, score) pairs scoring at least threshold, most similar first.
+        Score is the Dice coefficient of the trigram sets, from 0 to 1"""
+
+        grams = trigrams(query)
+        shared = {}
+        for gram in grams:
+            for i in self.postings.get(gram, []):
+                shared[i] = shared.get(i, 0) + 1
+
+        scores = [(i, 2 * n / (len(grams) + self.sizes[i])) for i, n in shared.items()]
+        scores = sorted((x for x in scores if x[1] >= threshold), key=lambda x: (-x[1], x[0]))
+
+        return [(self.strings[i], score) for i, score in scores[:k]]
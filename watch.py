@@ -0,0 +1,212 @@
+"""Long-running search that keeps browsers, sessions and centre lists warm between polls
+and reports only the slots that opened or went since the previous poll
+
+Run with:  python watch.py --interval 60 --file changes.jsonl --webhook https://example.com/hook
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+from os import environ as ENV
+from multiprocessing import cpu_count
+from functools import partial
+from typing import Callable
+import threading
+import argparse
+import datetime
+import json
+import time
+
+from dotenv import load_dotenv
+
+import cache
+from main import read_queries
+from providers import Provider, get_providers
+from scheduler import get_scheduler
+from store import save_centres
+from resilience import host_of, retry_call
+from slots import slots_to_json, format_price, format_spaces
+
+# Scraped results of the next day go stale after a minute and of the next week after ten,
+# so each poll re-reads the near dates and only now and then the later ones
+WATCH_RESULT_TTLS = ((1, 60), (7, 10 * 60))
+WATCH_RESULT_TTL_FAR = 60 * 60
+WEBHOOK_RETRIES = 3
+WEBHOOK_TIMEOUT = 10  # seconds to wait for the webhook to answer
+
+
+def slot_states(index: int, query: tuple[str, str], centre_dict: dict) -> dict[tuple, dict]:
+    """Return every slot of a centre dict found for a query, keyed by (query index, provider,
+    centre, session, start)"""
+
+    states = {}
+    for centre_name, centre_info in centre_dict.items():
+        for session, slots in centre_info['Activity'].items():
+            for start, end, price, spaces in slots_to_json(slots):
+                states[(index, centre_info['Company'], centre_name, session, start)] = {
+                    'postcode': query[0], 'activity': query[1], 'provider': centre_info['Company'],
+                    'centre': centre_name, 'session': session, 'start': start, 'end': end,
+                    'price': price, 'spaces': spaces, 'distance': centre_info['Distance']}
+
+    return states
+
+
+def diff_states(previous: dict[tuple, dict], current: dict[tuple, dict]) -> list[dict]:
+    """Return 'opened' events of slots only in current and 'gone' events of slots only
+    in previous, ordered by start"""
+
+    seen = datetime.datetime.now().isoformat(timespec='seconds')
+    events = [{'event': 'opened', 'seen': seen, **current[x]} for x in current.keys() - previous.keys()]
+    events += [{'event': 'gone', 'seen': seen, **previous[x]} for x in previous.keys() - current.keys()]
+
+    return sorted(events, key=lambda x: (x['start'], x['centre'], x['event']))
+
+
+def format_event(event: dict) -> str:
+    """Return one line describing an opened or gone slot"""
+
+    start = datetime.datetime.fromisoformat(event['start'])
+    end = f" - {datetime.datetime.fromisoformat(event['end']):%H:%M}" if event['end'] else ''
+    price = format_price(float('nan') if event['price'] is None else event['price'])
+
+    return (f"{event['event'].upper():<7}{start:%a %d %b %H:%M}{end}  {price}  "
+            f"{format_spaces(event['spaces'])} spaces  {event['centre']} "
+            f"({event['provider']}, {event['session']})")
+
+
+def notify_stdout(events: list[dict]) -> None:
+    """Print events, one per line"""
+
+    for event in events:
+        print(format_event(event))
+
+
+def notify_file(path: str, events: list[dict]) -> None:
+    """Append events to a JSONL file"""
+
+    with open(path, 'a', encoding='utf-8') as f:
+        for event in events:
+            f.write(json.dumps(event) + '\n')
+
+
+def post_json(url: str, data: dict) -> None:
+    """POST data as JSON to url"""
+
+    request = Request(url, json.dumps(data).encode('utf-8'), method='POST',
+                      headers={'Content-Type': 'application/json'})
+    with urlopen(request, timeout=WEBHOOK_TIMEOUT) as response:
+        response.read()
+
+
+def notify_webhook(url: str, events: list[dict]) -> None:
+    """POST {'events': events} to a webhook, retried with backoff. A webhook that keeps
+    failing is reported and skipped, the watch goes on"""
+
+    try:
+        retry_call(partial(post_json, url, {'events': events}), host_of(url), WEBHOOK_RETRIES,
+                   (URLError, OSError), 'webhook')
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        print(f'Webhook {url} failed: {e}')
+
+
+def poll(providers: list[Provider], queries: list[tuple[str, str]], max_centres: int,
+         cpu_cores: int, timeout: int) -> tuple[dict[tuple, dict], set[tuple], set[tuple]]:
+    """Search every query with every provider once, saving results to the store.
+    Return slots found, as slot_states, (query index, provider, centre) of every centre
+    searched, with or without free slots, and (query index, provider, centre, session) of
+    the sessions of those centres that could not be read"""
+
+    states, searched, unread, lock = {}, set(), set(), threading.Lock()
+
+    def on_result(index: int, centre_dict: dict) -> None:
+        save_centres(*queries[index], centre_dict)
+        with lock:
+            states.update(slot_states(index, queries[index], centre_dict))
+            for name, centre_info in centre_dict.items():
+                searched.add((index, centre_info['Company'], name))
+                unread.update((index, centre_info['Company'], name, x)
+                              for x in centre_info.get('Unread', []))
+
+    with ThreadPoolExecutor(len(providers), thread_name_prefix='provider') as executor:
+        futures = {executor.submit(x.fetch, queries, max_centres=max_centres, cpu_cores=cpu_cores,
+                                   timeout=timeout, on_result=on_result): x for x in providers}
+        for future, provider in futures.items():
+            try:
+                future.result()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                print(f'{provider.company} poll failed: {type(e).__name__}: {e}')
+
+    return states, searched, unread
+
+
+def watch(providers: list[Provider], queries: list[tuple[str, str]],
+          notifiers: list[Callable[[list[dict]], None]], interval: float, max_centres: int = 5,
+          cpu_cores: int = 4, timeout: int = 10, stop: threading.Event | None = None) -> None:
+    """Poll every 'interval' seconds until stopped, passing slots that opened or went since
+    the previous poll to every notifier. The first poll only sets the baseline. Slots of
+    centres that were not searched this time (they failed, were stopped or their provider
+    failed) and of sessions that could not be read are carried over, so they do not show
+    as gone and then open again"""
+
+    stop = stop or threading.Event()
+    cache.RESULT_TTLS, cache.RESULT_TTL_FAR = WATCH_RESULT_TTLS, WATCH_RESULT_TTL_FAR
+    get_scheduler(cpu_cores)
+
+    previous = None
+    while not stop.is_set():
+        started = time.monotonic()
+        current, searched, unread = poll(providers, queries, max_centres, cpu_cores, timeout)
+
+        if previous is not None:
+            current = {k: v for k, v in previous.items()
+                       if k[:3] not in searched or k[:4] in unread} | current
+            events = diff_states(previous, current)
+            if events:
+                for notify in notifiers:
+                    notify(events)
+        previous = current
+
+        print(f'Poll took {time.monotonic() - started:.1f}s, {len(current)} slots open')
+        stop.wait(max(0.0, interval - (time.monotonic() - started)))
+
+
+if __name__ == '__main__':
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch', metavar='FILE',
+                        help="csv file of 'postcode,activity' queries to watch, "
+                             "instead of POSTCODE and ACTIVITY from the environment")
+    parser.add_argument('--providers', metavar='NAMES', default=ENV.get('PROVIDERS'),
+                        help='comma separated providers to watch, from better, ea and places')
+    parser.add_argument('--interval', type=float, default=float(ENV.get('WATCH_INTERVAL', 60)),
+                        help='seconds from the start of one poll to the next (default 60)')
+    parser.add_argument('--centres', type=int, default=5, help='closest centres to watch per query')
+    parser.add_argument('--timeout', type=int, default=10, help='seconds to wait for page elements')
+    parser.add_argument('--webhook', metavar='URL', default=ENV.get('WATCH_WEBHOOK'),
+                        help='POST changes as JSON to URL')
+    parser.add_argument('--file', metavar='FILE', help='append changes as JSON lines to FILE')
+    parser.add_argument('--quiet', action='store_true', help='do not print changes')
+    args = parser.parse_args()
+
+    try:
+        selected = get_providers(args.providers)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.batch:
+        watched = read_queries(args.batch)
+    else:
+        watched = [(ENV['POSTCODE'], ENV['ACTIVITY'])]
+
+    sinks = [] if args.quiet else [notify_stdout]
+    if args.file:
+        sinks.append(partial(notify_file, args.file))
+    if args.webhook:
+        sinks.append(partial(notify_webhook, args.webhook))
+
+    try:
+        watch(selected, watched, sinks, args.interval, args.centres, cpu_count(), args.timeout)
+    except KeyboardInterrupt:
+        print('Stopped watching')